@@ -1,34 +1,114 @@
+import logging
 import os
 import sys
+import time
 
 import quizcomp.args
+import quizcomp.project
 import quizcomp.quiz
 import quizcomp.uploader.canvas
 
 DEFAULT_BASE_URL = 'https://canvas.ucsc.edu'
+DEFAULT_QUIZ_JOBS = 2
 
 def run(args):
     if (not os.path.exists(args.path)):
         raise ValueError(f"Provided path '{args.path}' does not exist.")
 
-    if (not os.path.isfile(args.path)):
-        raise ValueError(f"Provided path '{args.path}' is not a file.")
+    if (args.jobs < 1):
+        raise ValueError("Number of jobs must be at least 1, found %d." % (args.jobs))
 
-    quiz = quizcomp.quiz.Quiz.from_path(args.path)
-    canvas_instance = quizcomp.uploader.canvas.InstanceInfo(args.base_url, args.course_id, args.token)
+    canvas_instance = quizcomp.uploader.canvas.InstanceInfo(args.base_url, args.course_id, args.token, jobs = args.jobs)
+    uploader = quizcomp.uploader.canvas.CanvasUploader(canvas_instance, force = args.force, sync = args.sync)
+
+    if (os.path.isdir(args.path)):
+        return _run_batch(args, uploader)
 
-    uploader = quizcomp.uploader.canvas.CanvasUploader(canvas_instance, force = args.force)
+    quiz = quizcomp.quiz.Quiz.from_path(args.path)
     uploader.upload_quiz(quiz)
 
     return 0
 
+def _run_batch(args, uploader):
+    """
+    Upload all the quizzes in a project dir, and output a summary.
+    Returns a non-zero status if any quiz failed to load or upload.
+    """
+
+    if (args.quiz_jobs < 1):
+        raise ValueError("Number of quiz jobs must be at least 1, found %d." % (args.quiz_jobs))
+
+    if (args.load_jobs < 1):
+        raise ValueError("Number of load jobs must be at least 1, found %d." % (args.load_jobs))
+
+    start_time = time.time()
+
+    project = quizcomp.project.Project.from_path(args.path)
+    quiz_paths, _ = project.find_resources()
+
+    if (len(quiz_paths) == 0):
+        logging.warning("No quizzes found in '%s'.", args.path)
+        return 0
+
+    logging.info("Loading %d quizzes.", len(quiz_paths))
+    load_results = quizcomp.quiz.load_paths(quiz_paths, jobs = args.load_jobs)
+
+    quizzes = [quiz for (quiz, _) in load_results if (quiz is not None)]
+
+    logging.info("Uploading %d quizzes.", len(quizzes))
+    upload_results = iter(uploader.upload_quizzes(quizzes, jobs = args.quiz_jobs))
+
+    # [(path, status, seconds, message), ...]
+    rows = []
+    for (path, (quiz, error)) in zip(quiz_paths, load_results):
+        if (quiz is None):
+            rows.append((path, 'load-failed', None, error))
+            continue
+
+        result = next(upload_results)
+        if (result['error'] is not None):
+            rows.append((path, 'failed', result['seconds'], result['error']))
+        elif (result['uploaded']):
+            rows.append((path, 'uploaded', result['seconds'], None))
+        else:
+            rows.append((path, 'skipped', result['seconds'], 'A quiz with the same title exists (use --sync or --force to replace it).'))
+
+    _print_summary(rows, time.time() - start_time)
+
+    failed_count = len([row for row in rows if (row[1] in ['load-failed', 'failed'])])
+    if (failed_count > 0):
+        return 1
+
+    return 0
+
+def _print_summary(rows, total_seconds):
+    counts = {}
+    for row in rows:
+        counts[row[1]] = counts.get(row[1], 0) + 1
+
+    print("Uploaded %d of %d quizzes in %.2f seconds (%d skipped, %d failed)." % (
+            counts.get('uploaded', 0), len(rows), total_seconds,
+            counts.get('skipped', 0), counts.get('failed', 0) + counts.get('load-failed', 0)))
+
+    for (path, status, seconds, message) in rows:
+        time_text = '-'
+        if (seconds is not None):
+            time_text = "%.2fs" % (seconds)
+
+        line = "    %-12s %8s  %s" % (status, time_text, path)
+        if (message is not None):
+            line += " -- " + message
+
+        print(line)
+
 def _get_parser():
     parser = quizcomp.args.Parser(description =
-        "Parse a quiz and upload the quiz to Canvas.")
+        "Parse a quiz and upload the quiz to Canvas."
+        + " If the path is a project dir, then all the quizzes in the project will be uploaded.")
 
     parser.add_argument('path', metavar = 'PATH',
         type = str,
-        help = 'The path to a quiz json file.')
+        help = 'The path to a quiz json file or a project dir.')
 
     parser.add_argument('--course', dest = 'course_id',
         action = 'store', type = str, required = True,
@@ -46,6 +126,24 @@ def _get_parser():
         action = 'store_true', default = False,
         help = 'Override (delete) any exiting quiz with the same name.')
 
+    parser.add_argument('--sync', dest = 'sync',
+        action = 'store_true', default = False,
+        help = 'Update any existing quiz with the same name in-place, only changing what is different'
+            + ' (takes precedence over --force) (default: %(default)s).')
+
+    parser.add_argument('--jobs', dest = 'jobs',
+        action = 'store', type = int, default = quizcomp.uploader.canvas.DEFAULT_JOBS,
+        help = 'The maximum number of requests to make to Canvas at the same time (default: %(default)s).')
+
+    parser.add_argument('--quiz-jobs', dest = 'quiz_jobs',
+        action = 'store', type = int, default = DEFAULT_QUIZ_JOBS,
+        help = 'When uploading a project, the number of quizzes to upload at the same time'
+            + ' (all quizzes still share the --jobs limit on requests) (default: %(default)s).')
+
+    parser.add_argument('--load-jobs', dest = 'load_jobs',
+        action = 'store', type = int, default = 1,
+        help = 'When uploading a project, the number of quizzes to load in parallel (default: %(default)s).')
+
     return parser
 
 def main():
@@ -6,6 +6,7 @@ import quizcomp.args
 import quizcomp.converter.convert
 import quizcomp.constants
 import quizcomp.quiz
+import quizcomp.watch
 
 def run(args):
     if (not os.path.exists(args.path)):
@@ -18,15 +19,23 @@ def run(args):
     if (seed is None):
         seed = random.randint(0, 2**64)
 
+    if (args.watch):
+        quizcomp.watch.watch(args.path, lambda quiz: _output(quiz, args, seed),
+                interval = args.watch_interval, flatten_groups = args.flatten_groups)
+        return 0
+
     quiz = quizcomp.quiz.Quiz.from_path(args.path, flatten_groups = args.flatten_groups)
+    _output(quiz, args, seed)
+
+    return 0
+
+def _output(quiz, args, seed):
     variant = quiz.create_variant(all_questions = args.flatten_groups, seed = seed)
     content = quizcomp.converter.convert.convert_variant(variant, format = args.format,
             constructor_args = {'answer_key': args.answer_key})
 
     print(content)
 
-    return 0
-
 def _get_parser():
     parser = quizcomp.args.Parser(description =
         "Parse a single quiz and output the results of the parse.")
@@ -52,6 +61,8 @@ def _get_parser():
         action = 'store', type = int, default = None,
         help = 'The random seed to use (defaults to a random seed).')
 
+    quizcomp.watch.set_cli_args(parser)
+
     return parser
 
 def main():
@@ -6,9 +6,15 @@ import sys
 
 import quizcomp.args
 import quizcomp.pdf
+import quizcomp.watch
 
 def run(args):
-    quizcomp.pdf.make_with_args(args)
+    # The made variants are not needed, so they are not kept around.
+    if (args.watch):
+        quizcomp.pdf.watch_with_args(args, keep_variants = False)
+    else:
+        quizcomp.pdf.make_with_args(args, keep_variants = False)
+
     return 0
 
 def _get_parser():
@@ -16,6 +22,7 @@ def _get_parser():
         "Create a PDF quiz.")
 
     quizcomp.pdf.set_cli_args(parser)
+    quizcomp.watch.set_cli_args(parser)
 
     return parser
 
@@ -10,7 +10,7 @@ import quizcomp.project
 def run(args):
     project = quizcomp.project.Project.from_path(args.path)
 
-    quizzes, questions = project.load_resources()
+    quizzes, questions = project.load_resources(save_index = args.save_index)
 
     print("Found %d quizzes." % (len(quizzes)))
     for (path, quiz) in quizzes:
@@ -41,6 +41,11 @@ def _get_parser():
         action = 'store', type = str, default = None,
         help = 'Save the project to this directory.')
 
+    parser.add_argument('--save-index', dest = 'save_index',
+        action = 'store_true', default = False,
+        help = 'Store the project\'s index of quizzes and questions (in its cache dir),'
+            + ' so later runs only need to search the dirs that changed (default: %(default)s).')
+
     return parser
 
 def main():
@@ -5,6 +5,7 @@ import quizcomp.args
 import quizcomp.converter.qti
 import quizcomp.quiz
 import quizcomp.util.cli
+import quizcomp.watch
 
 def run(args):
     if (not os.path.exists(args.path)):
@@ -13,15 +14,21 @@ def run(args):
     if (not os.path.isfile(args.path)):
         raise ValueError(f"Provided path '{args.path}' is not a file.")
 
+    if (args.watch):
+        quizcomp.watch.watch(args.path, lambda quiz: _convert(quiz, args), interval = args.watch_interval)
+        return 0
+
     quiz = quizcomp.quiz.Quiz.from_path(args.path)
+    _convert(quiz, args)
+
+    return 0
 
+def _convert(quiz, args):
     out_path = quizcomp.util.cli.resolve_out_arg(args.out, f'{quiz.title}.qti.zip')
 
     converter = quizcomp.converter.qti.QTITemplateConverter(canvas = args.canvas)
     converter.convert_quiz(quiz, out_path = out_path)
 
-    return 0
-
 def _get_parser():
     parser = quizcomp.args.Parser(description =
         "Parse a quiz and upload the quiz to Canvas.")
@@ -35,6 +42,7 @@ def _get_parser():
         help = 'Create the QTI with Canvas-specific tweaks (default: %(default)s).')
 
     quizcomp.util.cli.add_out_arg(parser, '<title>.qti.zip')
+    quizcomp.watch.set_cli_args(parser)
 
     return parser
 
@@ -20,3 +20,31 @@ class QuizValidationError(ValueError):
 class QuestionValidationError(QuizValidationError):
     def __init__(self, question, message, **kwargs):
         super().__init__(message, ids = question.ids, **kwargs)
+
+def get_error_message(ex):
+    """
+    Get a message for an error that includes all the errors chained to it (the innermost has the most specific ids).
+    Useful when the error itself cannot be kept (e.g., it is sent between processes).
+    """
+
+    messages = [str(ex)]
+    while (ex.__cause__ is not None):
+        ex = ex.__cause__
+        messages.append(str(ex))
+
+    return ' -- '.join(messages)
+
+class QuestionLoadErrors(QuizValidationError):
+    """
+    Errors from loading several questions at once.
+    All the errors are kept in |errors| as: [(path, message), ...].
+    """
+
+    def __init__(self, errors, **kwargs):
+        self.errors = errors
+
+        lines = ["Failed to load %d question(s):" % (len(errors))]
+        for (path, message) in errors:
+            lines.append("    '%s': %s" % (path, message))
+
+        super().__init__("\n".join(lines), **kwargs)
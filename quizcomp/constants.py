@@ -10,6 +10,9 @@ QUIZ_FILENAME = 'quiz.json'
 QUESTION_FILENAME = 'question.json'
 PROMPT_FILENAME = 'prompt.md'
 
+# The default directory for persistent caches (e.g., compiled questions and project indexes).
+CACHE_DIRNAME = '.quizcomp-cache'
+
 FORMAT_CANVAS = 'canvas'
 FORMAT_HTML = 'html'
 FORMAT_JSON = 'json'
@@ -17,7 +17,7 @@ class HTMLTemplateConverter(quizcomp.converter.template.TemplateConverter):
         super().__init__(format, template_dir, **kwargs)
 
     def clean_solution_content(self, document):
-        return document.to_text()
+        return self._format_doc(document, doc_format = quizcomp.constants.FORMAT_TEXT, format_options = {})
 
 class CanvasTemplateConverter(HTMLTemplateConverter):
     def __init__(self,
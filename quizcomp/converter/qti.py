@@ -93,7 +93,9 @@ class QTITemplateConverter(quizcomp.converter.template.TemplateConverter):
         os.makedirs(quiz_dir, exist_ok = True)
 
         if (self.canvas):
+            # Images are stored (again) for each quiz.
             self.image_base_dir = os.path.join(temp_dir, OUT_DIR_IMAGES)
+            self.image_paths = {}
             os.makedirs(self.image_base_dir)
 
         path = os.path.join(quiz_dir, OUT_FILENAME_QUIZ)
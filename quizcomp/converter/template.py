@@ -1,8 +1,9 @@
+import logging
 import math
 import os
-import random
 import re
 import string
+import weakref
 
 import quizcomp.constants
 import quizcomp.converter.converter
@@ -61,6 +62,17 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         # Remove any temp image directories.
         self.cleanup_images = cleanup_images
 
+        # Rendered documents, so that each (document, format, options) is only rendered once for the life of this converter.
+        # Keyed (weakly) on the document itself, so entries go away with their documents.
+        # Renders with side effects (storing images) are not cached (see _format_doc()).
+        # {document: {(format, frozen options): text, ...}, ...}
+        self._render_cache = weakref.WeakKeyDictionary()
+        self._render_cache_hits = 0
+        self._render_cache_misses = 0
+
+        # The number of times that _store_images() has been called.
+        self._store_images_count = 0
+
         self.jinja_options = DEFAULT_JINJA_OPTIONS.copy()
         self.jinja_options.update(jinja_options)
 
@@ -115,6 +127,8 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         template = self.env.get_template(TEMPLATE_FILENAME_QUIZ)
         text = template.render(**context)
 
+        logging.debug("Document render cache for %s converter: %s.", self.format, self.get_render_cache_stats())
+
         return text
 
     def create_groups(self, quiz):
@@ -228,7 +242,7 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         return text
 
     def create_answers_tf(self, question_id, question_number, question, variant):
-        return question.answers
+        return question.get_ordered_answers()
 
     def create_answers_matching(self, question_id, question_number, question, variant):
         lefts = []
@@ -268,25 +282,19 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         if (len(rights) > len(right_ids)):
             raise ValueError("Too many right-hand values for a matching question. Found: %d, Max %d." % (len(rights) > len(right_ids)))
 
-        if (question.answers.get('shuffle', False)):
-            seed = question.answers.get('shuffle_seed', None)
-            rng = random.Random(seed)
-
-            # Shuffle the left and right options while maintining the match mapping.
-            left_indexes = list(range(len(lefts)))
-            right_indexes = list(range(len(rights)))
+        if (question.answer_order is not None):
+            # Reorder the left and right options while maintining the match mapping.
+            left_indexes = question.answer_order['lefts']
+            right_indexes = question.answer_order['rights']
 
-            rng.shuffle(left_indexes)
-            rng.shuffle(right_indexes)
+            lefts = [lefts[index] for index in left_indexes]
+            rights = [rights[index] for index in right_indexes]
 
-            new_lefts = [lefts[index] for index in left_indexes]
-            lefts = new_lefts
+            # {old_index: new_index, ...}
+            new_left_indexes = {old_index: new_index for (new_index, old_index) in enumerate(left_indexes)}
+            new_right_indexes = {old_index: new_index for (new_index, old_index) in enumerate(right_indexes)}
 
-            new_rights = [rights[index] for index in right_indexes]
-            rights = new_rights
-
-            new_matches = {left_indexes.index(old_left_index): right_indexes.index(old_right_index) for (old_left_index, old_right_index) in matches.items()}
-            matches = new_matches
+            matches = {new_left_indexes[old_left_index]: new_right_indexes[old_right_index] for (old_left_index, old_right_index) in matches.items()}
 
         # Augment the left and rights with more information for the template.
         for left_index in range(len(lefts)):
@@ -329,7 +337,7 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         return RIGHT_IDS
 
     def create_answers_mcq(self, question_id, question_number, question, variant):
-        return self._create_answers_mcq_list(question.answers)
+        return self._create_answers_mcq_list(question.get_ordered_answers())
 
     def _create_answers_mcq_list(self, answers):
         choices = []
@@ -373,7 +381,7 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
     def create_answers_mdd(self, question_id, question_number, question, variant):
         answers = []
 
-        for key, items in question.answers.items():
+        for key, items in question.get_ordered_answers().items():
             answers.append({
                 'label': self._format_doc(items['key'].document),
                 'initial_label': items['key'].text,
@@ -384,7 +392,7 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         return answers
 
     def create_answers_ma(self, question_id, question_number, question, variant):
-        return self._create_answers_mcq_list(question.answers)
+        return self._create_answers_mcq_list(question.get_ordered_answers())
 
     def create_answers_fimb(self, question_id, question_number, question, variant):
         answers = {}
@@ -440,6 +448,23 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
 
         return result
 
+    def get_render_cache_stats(self):
+        """
+        Get stats on the document render cache (mainly for debugging).
+        """
+
+        total = self._render_cache_hits + self._render_cache_misses
+        hit_rate = 0.0
+        if (total > 0):
+            hit_rate = self._render_cache_hits / total
+
+        return {
+            'hits': self._render_cache_hits,
+            'misses': self._render_cache_misses,
+            'size': sum([len(entries) for entries in self._render_cache.values()]),
+            'hit_rate': hit_rate,
+        }
+
     def _format_doc(self, doc, doc_format = None, format_options = None):
         if (doc_format is None):
             doc_format = self.format
@@ -447,9 +472,34 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         if (format_options is None):
             format_options = self.parser_format_options
 
-        return doc.to_format(doc_format, **format_options)
+        try:
+            key = (doc_format, _freeze(format_options))
+            hash(key)
+        except TypeError:
+            # Options that cannot be frozen cannot be cached.
+            return doc.to_format(doc_format, **format_options)
+
+        entries = self._render_cache.setdefault(doc, {})
+
+        text = entries.get(key, None)
+        if (text is not None):
+            self._render_cache_hits += 1
+            return text
+
+        self._render_cache_misses += 1
+
+        store_images_count = self._store_images_count
+        text = doc.to_format(doc_format, **format_options)
+
+        # A cached render would skip storing its images (which may be stored in a different place next time).
+        if (store_images_count == self._store_images_count):
+            entries[key] = text
+
+        return text
 
     def _store_images(self, link, base_dir):
+        self._store_images_count += 1
+
         if (self.image_base_dir is None):
             self.image_base_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-images-', rm = self.cleanup_images)
 
@@ -475,3 +525,19 @@ class TemplateConverter(quizcomp.converter.converter.Converter):
         self.image_paths[image_id] = out_path
 
         return out_path
+
+def _freeze(value):
+    """
+    Convert a value (usually format options) into a hashable form.
+    """
+
+    if (isinstance(value, dict)):
+        return tuple(sorted([(key, _freeze(item)) for (key, item) in value.items()]))
+
+    if (isinstance(value, (list, tuple))):
+        return tuple([_freeze(item) for item in value])
+
+    if (isinstance(value, set)):
+        return frozenset([_freeze(item) for item in value])
+
+    return value
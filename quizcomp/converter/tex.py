@@ -22,20 +22,30 @@ JINJA_OPTIONS = {
 class TexTemplateConverter(quizcomp.converter.template.TemplateConverter):
     def __init__(self, template_dir = DEFAULT_TEMPLATE_DIR,
             cleanup_images = False,
+            write_positions = True,
+            jinja_globals = {},
             **kwargs):
+        """
+        If |write_positions| is false, then the positions of answer boxes will not be recorded.
+        Positions are only needed to grade a quiz (e.g., in GradeScope), and not recording them saves a pdflatex pass.
+        """
+
+        jinja_globals = dict(jinja_globals)
+        jinja_globals['write_positions'] = write_positions
+
         super().__init__(quizcomp.constants.FORMAT_TEX, template_dir,
                 cleanup_images = cleanup_images,
                 parser_format_options = {
                     'image_path_callback': self._store_images,
                 },
-                jinja_options = JINJA_OPTIONS, **kwargs)
+                jinja_options = JINJA_OPTIONS, jinja_globals = jinja_globals, **kwargs)
 
     def clean_solution_content(self, document):
-        tex = document.to_format(quizcomp.constants.FORMAT_TEX)
+        tex = self._format_doc(document, doc_format = quizcomp.constants.FORMAT_TEX, format_options = {})
         if ('\\' not in tex):
             return tex
 
-        content = document.to_format(quizcomp.constants.FORMAT_TEXT)
+        content = self._format_doc(document, doc_format = quizcomp.constants.FORMAT_TEXT, format_options = {})
         content = content.replace('\\', '\\textbackslash{}')
 
         return content
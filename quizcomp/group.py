@@ -1,9 +1,11 @@
-import glob
+import copy
 import logging
 import os
+import random
 
 import quizcomp.common
 import quizcomp.constants
+import quizcomp.index
 import quizcomp.question.base
 import quizcomp.util.serial
 
@@ -73,6 +75,20 @@ class Group(quizcomp.util.serial.JSONSerializer):
                     self.name, self.pick_count, len(self.questions)))
             self.pick_count = len(self.questions)
 
+    def copy_for_variant(self, questions):
+        """
+        Get a copy of this group (for use in a variant) with the given questions.
+        All other group information (names, hints, etc) is shared with this group.
+        """
+
+        group = copy.copy(self)
+
+        group.questions = questions
+        group._used_question_indexes = set()
+        group._validated_classes = self._validated_classes.copy()
+
+        return group
+
     def collect_file_paths(self):
         paths = []
 
@@ -93,11 +109,11 @@ class Group(quizcomp.util.serial.JSONSerializer):
 
         paths = list(sorted(set(paths)))
 
-        questions = []
+        question_paths = []
         for path in paths:
-            questions += _parse_questions(path)
+            question_paths += _find_question_paths(path)
 
-        group_info['questions'] = questions
+        group_info['questions'] = quizcomp.question.base.load_paths(question_paths)
 
         return Group(**group_info, ids = ids)
 
@@ -148,17 +164,13 @@ class Group(quizcomp.util.serial.JSONSerializer):
         if (not with_replacement):
             self._used_question_indexes |= set(indexes)
 
-        return [self.questions[index].copy() for index in indexes]
+        return [self.questions[index].copy_for_variant() for index in indexes]
 
-def _parse_questions(path):
+def _find_question_paths(path):
     if (not os.path.exists(path)):
         raise quizcomp.common.QuizValidationError(f"Question path does not exist: '{path}'.")
 
     if (os.path.isfile(path)):
-        return [quizcomp.question.base.Question.from_path(path)]
-
-    questions = []
-    for subpath in sorted(glob.glob(os.path.join(path, '**', quizcomp.constants.QUESTION_FILENAME), recursive = True)):
-        questions.append(quizcomp.question.base.Question.from_path(subpath))
+        return [path]
 
-    return questions
+    return quizcomp.index.find_resources(path, quizcomp.constants.TYPE_QUESTION)
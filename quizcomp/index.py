@@ -0,0 +1,325 @@
+"""
+A persistent index of the resources (quizzes and questions) in a directory tree.
+
+Instead of a recursive glob on every load, the index remembers the listing of every directory
+(keyed by the directory's mtime, which changes whenever an entry is added, removed, or renamed).
+So a refresh only needs to stat each directory, and only re-lists the directories that have changed.
+For each resource, the index also keeps its mtime, size, content hash, and dependencies
+(the other files it is loaded from, e.g., prompts and the questions in a quiz).
+
+Like recursive globs, hidden files and directories (starting with '.') are skipped.
+
+Indexes can be registered (see register()), so that anything resolving resources in a directory
+(e.g., question groups) can use a registered index instead of scanning the directory.
+Lookups through a registered index still check the stored directory mtimes (see find_resources()),
+so they never return stale results, but only an explicit refresh() stores the index.
+"""
+
+import glob
+import logging
+import os
+
+import quizcomp
+import quizcomp.constants
+import quizcomp.util.hash
+import quizcomp.util.json
+
+INDEX_FILENAME = 'index.json'
+
+RESOURCE_FILENAMES = {
+    quizcomp.constants.QUIZ_FILENAME: quizcomp.constants.TYPE_QUIZ,
+    quizcomp.constants.QUESTION_FILENAME: quizcomp.constants.TYPE_QUESTION,
+}
+
+# {base dir: ResourceIndex, ...}
+_indexes = {}
+
+class ResourceIndex(object):
+    def __init__(self, base_dir, path = None):
+        """
+        Create an index for |base_dir| that is stored at |path|
+        (by default, in the cache dir inside of |base_dir|).
+        A path of False means the index will not be stored.
+        """
+
+        self.base_dir = os.path.abspath(base_dir)
+
+        if (path is None):
+            path = os.path.join(self.base_dir, quizcomp.constants.CACHE_DIRNAME, INDEX_FILENAME)
+
+        self.path = path
+
+        # {dir relpath: {'mtime_ns': int, 'dirs': [name, ...], 'resources': {name: type, ...}}, ...}
+        self._dirs = {}
+
+        # {resource relpath: {'type': str, 'mtime_ns': int, 'size': int, 'hash': str, 'dependencies': [relpath, ...]}, ...}
+        self._resources = {}
+
+        self._load()
+
+    def refresh(self, dir = None, save = True):
+        """
+        Bring the index up-to-date with the filesystem (and store it if |save| is true).
+        If |dir| is given, then only that part of the index is brought up-to-date.
+        Returns the number of directories that had to be listed.
+        """
+
+        start_relpath = self._get_relpath(dir)
+        if (start_relpath is None):
+            return 0
+
+        # Create the cache dir first, so creating it does not change the listing of the base dir after the scan.
+        if (save and (self.path is not False)):
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            except OSError:
+                pass
+
+        # Keep everything outside of the part being refreshed.
+        dirs = {relpath: entry for (relpath, entry) in self._dirs.items() if (not _is_inside(relpath, start_relpath))}
+        resources = {relpath: resource for (relpath, resource) in self._resources.items() if (not _is_inside(relpath, start_relpath))}
+        scan_count = 0
+
+        stack = [start_relpath]
+        while (len(stack) > 0):
+            dir_relpath = stack.pop()
+
+            try:
+                stat = os.stat(os.path.join(self.base_dir, dir_relpath))
+            except FileNotFoundError:
+                continue
+
+            entry = self._dirs.get(dir_relpath, None)
+            if ((entry is None) or (entry['mtime_ns'] != stat.st_mtime_ns)):
+                entry = self._scan_dir(dir_relpath, stat)
+                scan_count += 1
+
+            dirs[dir_relpath] = entry
+
+            for name in entry['dirs']:
+                stack.append(os.path.join(dir_relpath, name))
+
+            for (name, resource_type) in entry['resources'].items():
+                relpath = os.path.join(dir_relpath, name)
+
+                resource = self._refresh_resource(relpath, resource_type)
+                if (resource is not None):
+                    resources[relpath] = resource
+
+        self._dirs = dirs
+        self._resources = resources
+
+        logging.debug("Refreshed index for '%s' (listed %d of %d dirs).", os.path.join(self.base_dir, start_relpath), scan_count, len(dirs))
+
+        if (save):
+            self._save()
+
+        return scan_count
+
+    def find(self, resource_type, dir = None):
+        """
+        Get the (sorted) paths of all resources of a type (optionally only those inside of |dir|).
+        Returns None if |dir| is not inside of this index.
+        """
+
+        prefix = self._get_relpath(dir)
+        if (prefix is None):
+            return None
+
+        if (prefix != ''):
+            prefix += os.sep
+
+        paths = []
+        for (relpath, resource) in self._resources.items():
+            if ((resource['type'] == resource_type) and relpath.startswith(prefix)):
+                paths.append(os.path.join(self.base_dir, relpath))
+
+        return list(sorted(paths))
+
+    def _get_relpath(self, dir):
+        """
+        Get the path of |dir| relative to the base dir ('' for the base dir itself or None),
+        or None if it is not covered by this index.
+        """
+
+        if (dir is None):
+            return ''
+
+        relpath = os.path.relpath(os.path.abspath(dir), self.base_dir)
+        if ((relpath == os.pardir) or relpath.startswith(os.pardir + os.sep)):
+            return None
+
+        if (relpath == os.curdir):
+            return ''
+
+        # Hidden dirs are not indexed.
+        if (any([part.startswith('.') for part in relpath.split(os.sep) if (part != '')])):
+            return None
+
+        return relpath
+
+    def get(self, path):
+        """
+        Get the index entry for a resource (or None if the path is not an indexed resource).
+        """
+
+        relpath = os.path.relpath(os.path.abspath(path), self.base_dir)
+        return self._resources.get(relpath, None)
+
+    def _scan_dir(self, dir_relpath, stat):
+        entry = {
+            'mtime_ns': stat.st_mtime_ns,
+            'dirs': [],
+            'resources': {},
+        }
+
+        with os.scandir(os.path.join(self.base_dir, dir_relpath)) as dirents:
+            for dirent in dirents:
+                if (dirent.name.startswith('.')):
+                    continue
+
+                if (dirent.is_dir()):
+                    entry['dirs'].append(dirent.name)
+                elif (dirent.name in RESOURCE_FILENAMES):
+                    entry['resources'][dirent.name] = RESOURCE_FILENAMES[dirent.name]
+
+        entry['dirs'].sort()
+
+        return entry
+
+    def _refresh_resource(self, relpath, resource_type):
+        path = os.path.join(self.base_dir, relpath)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        old_resource = self._resources.get(relpath, None)
+        if ((old_resource is not None)
+                and (old_resource['mtime_ns'] == stat.st_mtime_ns)
+                and (old_resource['size'] == stat.st_size)):
+            return old_resource
+
+        return {
+            'type': resource_type,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': quizcomp.util.hash.sha256_file(path),
+            'dependencies': self._get_dependencies(path, resource_type),
+        }
+
+    def _get_dependencies(self, path, resource_type):
+        """
+        Get the relative paths to the files (or dirs) that a resource is loaded from (not including itself).
+        """
+
+        base_dir = os.path.dirname(path)
+
+        try:
+            data = quizcomp.util.json.load_path(path)
+        except Exception:
+            # Invalid resources will be reported when they are loaded.
+            return []
+
+        if (not isinstance(data, dict)):
+            return []
+
+        paths = []
+
+        if (resource_type == quizcomp.constants.TYPE_QUESTION):
+            prompt_path = data.get('prompt_path', None)
+            if (not isinstance(prompt_path, str)):
+                prompt_path = quizcomp.constants.PROMPT_FILENAME
+
+            paths.append(prompt_path)
+        elif (resource_type == quizcomp.constants.TYPE_QUIZ):
+            description_filename = os.path.splitext(os.path.basename(path))[0] + '.md'
+            paths.append(description_filename)
+
+            for group in data.get('groups', []):
+                if (not isinstance(group, dict)):
+                    continue
+
+                paths += [question_path for question_path in group.get('questions', []) if isinstance(question_path, str)]
+
+        dependencies = []
+        for dependency in paths:
+            dependency = os.path.join(base_dir, dependency)
+            if (os.path.exists(dependency)):
+                dependencies.append(os.path.relpath(os.path.abspath(dependency), self.base_dir))
+
+        return list(sorted(set(dependencies)))
+
+    def _load(self):
+        if ((self.path is False) or (not os.path.exists(self.path))):
+            return
+
+        try:
+            data = quizcomp.util.json.load_path(self.path)
+        except Exception as ex:
+            logging.debug("Ignoring unreadable index '%s': '%s'.", self.path, ex)
+            return
+
+        if (data.get('version', None) != quizcomp.__version__):
+            return
+
+        self._dirs = data.get('dirs', {})
+        self._resources = data.get('resources', {})
+
+    def _save(self):
+        if (self.path is False):
+            return
+
+        data = {
+            'version': quizcomp.__version__,
+            'dirs': self._dirs,
+            'resources': self._resources,
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+            quizcomp.util.json.dump_path(data, self.path, sort_keys = True)
+        except OSError as ex:
+            logging.debug("Could not save index '%s': '%s'.", self.path, ex)
+
+def register(index):
+    """
+    Register an index so that find_resources() can use it.
+    """
+
+    _indexes[index.base_dir] = index
+
+def unregister(index):
+    _indexes.pop(index.base_dir, None)
+
+def find_resources(dir, resource_type):
+    """
+    Get the (sorted) paths of all resources of a type inside of |dir|.
+    A registered index that covers |dir| will be used if there is one
+    (after making sure that part of the index is up-to-date, which only needs to list the dirs that changed),
+    otherwise the directory will be searched.
+    Registered indexes are not stored by lookups.
+    """
+
+    for index in _indexes.values():
+        index.refresh(dir = dir, save = False)
+        paths = index.find(resource_type, dir = dir)
+        if (paths is not None):
+            return paths
+
+    filename = None
+    for (name, name_type) in RESOURCE_FILENAMES.items():
+        if (name_type == resource_type):
+            filename = name
+
+    if (filename is None):
+        raise ValueError(f"Unknown resource type: '{resource_type}'.")
+
+    return list(sorted(glob.glob(os.path.join(dir, '**', filename), recursive = True)))
+
+def _is_inside(relpath, dir_relpath):
+    if (dir_relpath == ''):
+        return True
+
+    return ((relpath == dir_relpath) or relpath.startswith(dir_relpath + os.sep))
@@ -1,31 +1,139 @@
+"""
+Render equations with KaTeX.
+
+KaTeX is a NodeJS package, so rendering is done by a long-lived NodeJS worker process
+(one per working directory, since that is where the `katex` package is resolved from).
+The worker speaks a line-delimited JSON protocol over stdin/stdout:
+each request line holds a batch of expressions,
+and each response line holds the rendered results for that batch (in the same order).
+Workers are started lazily, restarted if they crash, and stopped on exit (see shutdown()).
+
+Rendered equations can also be kept in a persistent on-disk cache (see set_cache_dir()),
+so that equations only need to be rendered once across runs.
+"""
+
+import atexit
+import json
 import logging
 import os
 import shutil
 import subprocess
+import threading
 
+import quizcomp.util.cache
 import quizcomp.util.encoding
 
+# The number of times a request will be attempted (the worker is restarted between attempts).
+MAX_REQUEST_ATTEMPTS = 2
+
+# Mirror the options used by the KaTeX CLI (`katex --format mathml`).
+# Like the CLI, a newline is added to the end of all output.
+WORKER_SCRIPT = r"""
+const readline = require('readline');
+const katex = require('katex');
+
+const OPTIONS = {
+    output: 'mathml',
+    displayMode: false,
+    throwOnError: true,
+};
+
+function render(text) {
+    try {
+        return {html: katex.renderToString(text, OPTIONS) + "\n"};
+    } catch (error) {
+        return {error: String(error)};
+    }
+}
+
+const lines = readline.createInterface({input: process.stdin, terminal: false});
+lines.on('line', function(line) {
+    const request = JSON.parse(line);
+    const response = {
+        id: request.id,
+        results: request.texts.map(render),
+    };
+
+    process.stdout.write(JSON.stringify(response) + "\n");
+});
+
+process.stdout.write(JSON.stringify({ready: true, version: katex.version}) + "\n");
+"""
+
 _node_bin_dir = None
 
+_cache = None
+
+# {cwd: KatexWorker, ...}
+_workers = {}
+_workers_lock = threading.Lock()
+
 def set_node_bin_dir(path):
     global _node_bin_dir
     _node_bin_dir = path
 
+def set_cache_dir(path, max_size_bytes = quizcomp.util.cache.DEFAULT_MAX_SIZE_BYTES):
+    """
+    Set the directory for the rendered equation cache.
+    A path of None disables the cache.
+    """
+
+    global _cache
+
+    if (path is None):
+        _cache = None
+        return
+
+    _cache = quizcomp.util.cache.DiskCache(path, max_size_bytes = max_size_bytes)
+
+def get_cache():
+    """
+    Get the rendered equation cache (a quizcomp.util.cache.DiskCache),
+    or None if there is no cache.
+    """
+
+    return _cache
+
+def _get_bin_path(command):
+    if (_node_bin_dir is not None):
+        return os.path.join(_node_bin_dir, command)
+
+    return command
+
 def _has_command(command, cwd = '.'):
     result = subprocess.run(["which", command], cwd = cwd, capture_output = True)
     return (result.returncode == 0)
 
 def _has_package(package, cwd = '.'):
-    bin_path = 'npm'
-    if (_node_bin_dir is not None):
-        bin_path = os.path.join(_node_bin_dir, bin_path)
-
-    result = subprocess.run([bin_path, "list", package], cwd = cwd, capture_output = True)
+    result = subprocess.run([_get_bin_path('npm'), "list", package], cwd = cwd, capture_output = True)
     return (result.returncode == 0)
 
+def get_installed_version(cwd = '.'):
+    """
+    Get the version of the `katex` package that NodeJS would load from |cwd| without starting NodeJS,
+    by reading the package's package.json from the closest node_modules dir (like NodeJS resolves packages).
+    Returns None if the package could not be found.
+    """
+
+    dir = os.path.abspath(cwd)
+    while (True):
+        path = os.path.join(dir, 'node_modules', 'katex', 'package.json')
+        if (os.path.isfile(path)):
+            try:
+                with open(path, 'r') as file:
+                    return json.load(file).get('version', None)
+            except (OSError, ValueError, AttributeError):
+                return None
+
+        parent = os.path.dirname(dir)
+        if (parent == dir):
+            return None
+
+        dir = parent
+
 def is_available(cwd = '.'):
-    if ((_node_bin_dir is None) and (shutil.which('npx') is None)):
-        logging.warning("Could not find `npx` (usually installed with `npm`), cannot use katex equations.")
+    if ((_node_bin_dir is None) and (shutil.which('node') is None)):
+        logging.warning("Could not find `node` (NodeJS), cannot use katex equations.")
         return False
 
     if (not _has_package('katex', cwd = cwd)):
@@ -34,31 +142,170 @@ def is_available(cwd = '.'):
 
     return True
 
-def to_html(text, cwd = '.'):
-    bin_path = 'npx'
-    if (_node_bin_dir is not None):
-        bin_path = os.path.join(_node_bin_dir, bin_path)
+class KatexWorker(object):
+    """
+    A handle on a single NodeJS process that renders KaTeX.
+    All communication with the process is serialized with a lock, so a worker can be shared between threads.
+    """
+
+    def __init__(self, cwd = '.'):
+        self.cwd = os.path.abspath(cwd)
+        self.version = None
+
+        self._process = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def render(self, texts):
+        """
+        Render a batch of expressions and return a list of results (in the same order as the input).
+        Any expression that fails to render will raise a ValueError.
+        """
+
+        if (len(texts) == 0):
+            return []
+
+        with self._lock:
+            results = self._request(texts)
 
-    result = subprocess.run([bin_path, "katex", "--format", "mathml"], cwd = cwd,
-        input = text, encoding = quizcomp.util.encoding.DEFAULT_ENCODING,
-        capture_output = True)
+        output = []
+        for (text, result) in zip(texts, results):
+            if ('error' in result):
+                raise ValueError("KaTeX failed to render '%s': '%s'." % (text, result['error']))
 
-    if (result.returncode != 0):
-        raise ValueError("KaTeX did not exit cleanly. Stdout: '%s', Stderr: '%s'" % (result.stdout, result.stderr))
+            output.append(result['html'])
 
-    return result.stdout
+        return output
+
+    def get_version(self):
+        with self._lock:
+            self._ensure_started()
+            return self.version
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+    def _request(self, texts):
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            self._ensure_started()
+
+            request_id = self._next_id
+            self._next_id += 1
+
+            try:
+                self._write({'id': request_id, 'texts': texts})
+                response = self._read()
+            except (OSError, ValueError) as ex:
+                if (attempt == (MAX_REQUEST_ATTEMPTS - 1)):
+                    raise ValueError("KaTeX worker failed after %d attempts." % (MAX_REQUEST_ATTEMPTS)) from ex
+
+                logging.warning("KaTeX worker failed (%s), restarting.", ex)
+                self._stop()
+                continue
+
+            if ((response.get('id') != request_id) or (len(response.get('results', [])) != len(texts))):
+                self._stop()
+                raise ValueError("KaTeX worker returned a mismatched response (request id: %d)." % (request_id))
+
+            return response['results']
+
+    def _ensure_started(self):
+        if ((self._process is not None) and (self._process.poll() is None)):
+            return
+
+        self._stop()
+
+        logging.debug("Starting KaTeX worker in '%s'.", self.cwd)
+        self._process = subprocess.Popen([_get_bin_path('node'), '-e', WORKER_SCRIPT], cwd = self.cwd,
+                stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL,
+                encoding = quizcomp.util.encoding.DEFAULT_ENCODING, bufsize = 1)
+
+        try:
+            handshake = self._read()
+        except ValueError as ex:
+            self._stop()
+            raise ValueError("KaTeX worker failed to start in '%s'." % (self.cwd)) from ex
+
+        self.version = handshake.get('version', None)
+
+    def _write(self, data):
+        self._process.stdin.write(json.dumps(data) + "\n")
+        self._process.stdin.flush()
+
+    def _read(self):
+        line = self._process.stdout.readline()
+        if (line == ''):
+            raise ValueError("KaTeX worker exited unexpectedly (exit status: %s)." % (self._process.poll()))
+
+        return json.loads(line)
+
+    def _stop(self):
+        if (self._process is None):
+            return
+
+        process = self._process
+        self._process = None
+
+        try:
+            process.stdin.close()
+            process.wait(timeout = 5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+        process.stdout.close()
+
+def get_worker(cwd = '.'):
+    cwd = os.path.abspath(cwd)
+
+    with _workers_lock:
+        if (cwd not in _workers):
+            _workers[cwd] = KatexWorker(cwd = cwd)
+
+        return _workers[cwd]
+
+def shutdown():
+    """
+    Stop all running KaTeX workers.
+    Workers will be automatically restarted if they are used again.
+    """
+
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+
+    for worker in workers:
+        worker.stop()
+
+atexit.register(shutdown)
+
+def to_html(text, cwd = '.'):
+    return to_html_batch([text], cwd = cwd)[0]
+
+def to_html_batch(texts, cwd = '.'):
+    return get_worker(cwd).render(list(texts))
 
 def set_cli_args(parser):
     parser.add_argument('--nodejs-bin-dir', dest = 'node_bin_dir',
         action = 'store', type = str, default = None,
-        help = ('A NodeJS binary directory that includes `npm` and `npx`.'
+        help = ('A NodeJS binary directory that includes `node` and `npm`.'
                 + ' If not specified, $PATH will be searched.'
                 + ' Used for HTML equations.'))
 
+    parser.add_argument('--math-cache-dir', dest = 'math_cache_dir',
+        action = 'store', type = str, default = None,
+        help = ('A directory to cache rendered HTML equations in.'
+                + ' The cache is kept across runs, so only new equations need to be rendered.'
+                + ' If not specified, equations will not be cached.'))
+
     return parser
 
 def init_from_args(args):
     if (args.node_bin_dir is not None):
         set_node_bin_dir(args.node_bin_dir)
 
+    if (args.math_cache_dir is not None):
+        set_cache_dir(args.math_cache_dir)
+
     return args
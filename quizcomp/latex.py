@@ -1,13 +1,27 @@
+import atexit
+import contextlib
 import logging
 import os
 import shutil
 import subprocess
+import threading
 
 _pdflatex_bin_path = None
 _pdflatex_use_docker = False
+_pdflatex_docker_persistent = False
+
+# The active persistent container (see docker_session()).
+_docker_container = None
+_docker_container_lock = threading.Lock()
 
 DOCKER_IMAGE = "ghcr.io/edulinq/pdflatex-docker:1.0.0"
 
+# The directory that output is mounted to inside of Docker containers.
+DOCKER_WORK_DIR = '/work'
+
+# The most pdflatex passes that will be run when compiling locally (or in a persistent container).
+DEFAULT_MAX_PASSES = 3
+
 def set_pdflatex_bin_path(path):
     global _pdflatex_bin_path
     _pdflatex_bin_path = path
@@ -16,6 +30,10 @@ def set_pdflatex_use_docker(pdflatex_use_docker):
     global _pdflatex_use_docker
     _pdflatex_use_docker = pdflatex_use_docker
 
+def set_pdflatex_docker_persistent(pdflatex_docker_persistent):
+    global _pdflatex_docker_persistent
+    _pdflatex_docker_persistent = pdflatex_docker_persistent
+
 def is_available():
     if (_pdflatex_use_docker):
         if (not _is_docker_available()):
@@ -33,6 +51,29 @@ def is_available():
 
     return True
 
+def get_version():
+    """
+    Get a string that identifies the pdflatex that will be used to compile PDFs,
+    or None if it cannot be determined.
+    """
+
+    if (_pdflatex_use_docker):
+        return DOCKER_IMAGE
+
+    bin_path = "pdflatex"
+    if (_pdflatex_bin_path is not None):
+        bin_path = _pdflatex_bin_path
+
+    try:
+        result = subprocess.run([bin_path, '--version'], capture_output = True, text = True)
+    except OSError:
+        return None
+
+    if ((result.returncode != 0) or (result.stdout.strip() == '')):
+        return None
+
+    return result.stdout.strip().splitlines()[0]
+
 def _is_docker_available():
     if (shutil.which('docker') is None):
         return False
@@ -40,7 +81,7 @@ def _is_docker_available():
     result = subprocess.run(["docker", "info"], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
     return (result.returncode == 0)
 
-def compile(path):
+def compile(path, max_passes = DEFAULT_MAX_PASSES, positions = True):
     """
     Compile a LaTeX file to PDF in its containing directory.
 
@@ -48,14 +89,24 @@ def compile(path):
     This directory should contain all necessary resources (e.g., images) and no non-relevant files.
     Compilation may generate additional files (e.g., .aux, .log) in this directory,
     and permissions may be modified as needed.
+
+    When compiling locally (or in a persistent container),
+    pdflatex will be run until its output converges (up to |max_passes| times).
+    If |positions| is false, then the document is assumed to not record any positions
+    (see quizcomp.converter.tex.TexTemplateConverter) and only one pass will be run.
     """
 
-    if (_pdflatex_use_docker is True):
-        _compile_docker(path)
+    if (_pdflatex_use_docker is not True):
+        _compile_local(path, max_passes = max_passes, positions = positions)
+        return
+
+    container = _docker_container
+    if ((container is not None) and container.contains(path)):
+        container.compile(path, max_passes = max_passes, positions = positions)
     else:
-        _compile_local(path)
+        _compile_docker(path)
 
-def _compile_local(path):
+def _compile_local(path, max_passes = DEFAULT_MAX_PASSES, positions = True):
     bin_path = "pdflatex"
     if (_pdflatex_bin_path is not None):
         bin_path = _pdflatex_bin_path
@@ -63,19 +114,172 @@ def _compile_local(path):
     tex_filename = os.path.basename(path)
     out_dir = os.path.dirname(path)
 
-    # Need to compile twice to get positioning information.
-    for _ in range(2):
-        result = subprocess.run([bin_path, '-interaction=nonstopmode', tex_filename],
-                                cwd = out_dir, capture_output = True)
+    _run_passes(path, [bin_path, '-interaction=nonstopmode', tex_filename], out_dir,
+            max_passes = max_passes, positions = positions)
+
+def _run_passes(path, command, cwd, max_passes = DEFAULT_MAX_PASSES, positions = True):
+    """
+    Run a pdflatex command (for the TeX file at |path|) until its output converges.
+    """
+
+    # Positions are the only thing that is read back from a previous pass.
+    if (not positions):
+        max_passes = 1
+
+    # Positioning information is written to the .aux file and read back in on the next pass,
+    # and the positions file (.pos) is written using the positions read from the .aux file.
+    # So once a pass reads the same .aux file that it writes, all output (including the .pos file) is stable.
+    # If an earlier compile left an up-to-date .aux file, then a single pass is enough.
+    aux_path = os.path.splitext(path)[0] + '.aux'
+
+    for i in range(max_passes):
+        previous_aux = _read_bytes(aux_path)
+
+        result = subprocess.run(command, cwd = cwd, capture_output = True)
         if (result.returncode != 0):
             raise ValueError("pdflatex did not exit cleanly. Stdout: '%s', Stderr: '%s'" % (result.stdout, result.stderr))
 
+        if (_read_bytes(aux_path) == previous_aux):
+            logging.debug("pdflatex output for '%s' converged after %d pass(es).", path, i + 1)
+            return
+
+    if (positions):
+        logging.debug("pdflatex output for '%s' did not converge after %d pass(es).", path, max_passes)
+
+def _read_bytes(path):
+    if (not os.path.exists(path)):
+        return None
+
+    with open(path, 'rb') as file:
+        return file.read()
+
+class DockerContainer(object):
+    """
+    A long-lived pdflatex container with a root directory mounted.
+    Compiles are run inside the container (via `docker exec`),
+    so they do not each pay for starting a new container.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = os.path.abspath(root_dir)
+        self.id = None
+
+        # Only the process that started the container should stop it (not any forked workers).
+        self._owner_pid = None
+
+    def start(self):
+        docker_cmd = [
+            "docker", "run", "--rm", "--detach",
+        ] + _get_docker_user_args() + [
+            "-v", f"{self.root_dir}:{DOCKER_WORK_DIR}",
+            "--entrypoint", "sleep",
+            DOCKER_IMAGE,
+            "infinity",
+        ]
+
+        result = subprocess.run(docker_cmd, capture_output = True, text = True)
+        if (result.returncode != 0):
+            raise ValueError("Failed to start Docker container with exit code '%s'. Stdout: '%s', Stderr: '%s'" % (result.returncode, result.stdout, result.stderr))
+
+        self.id = result.stdout.strip()
+        self._owner_pid = os.getpid()
+
+        logging.debug("Started pdflatex Docker container '%s' for '%s'.", self.id, self.root_dir)
+
+    def stop(self):
+        if ((self.id is None) or (self._owner_pid != os.getpid())):
+            return
+
+        container_id = self.id
+        self.id = None
+
+        result = subprocess.run(["docker", "rm", "--force", container_id], capture_output = True, text = True)
+        if (result.returncode != 0):
+            logging.warning("Failed to remove Docker container '%s': '%s'.", container_id, result.stderr.strip())
+            return
+
+        logging.debug("Removed pdflatex Docker container '%s'.", container_id)
+
+    def contains(self, path):
+        path = os.path.abspath(path)
+        return (os.path.commonpath([self.root_dir, path]) == self.root_dir)
+
+    def compile(self, path, max_passes = DEFAULT_MAX_PASSES, positions = True):
+        path = os.path.abspath(path)
+        tex_filename = os.path.basename(path)
+
+        relpath = os.path.relpath(os.path.dirname(path), self.root_dir)
+        work_dir = DOCKER_WORK_DIR
+        if (relpath != '.'):
+            work_dir = '/'.join([DOCKER_WORK_DIR] + relpath.split(os.sep))
+
+        docker_cmd = [
+            "docker", "exec",
+        ] + _get_docker_user_args() + [
+            "--workdir", work_dir,
+            self.id,
+            "pdflatex", '-interaction=nonstopmode', tex_filename,
+        ]
+
+        _run_passes(path, docker_cmd, os.path.dirname(path), max_passes = max_passes, positions = positions)
+
+@contextlib.contextmanager
+def docker_session(root_dir):
+    """
+    If persistent Docker compilation is enabled (see set_pdflatex_docker_persistent()),
+    then start a container for all compiles under |root_dir| that is removed when the session ends (or on exit).
+    Otherwise, this does nothing.
+    """
+
+    global _docker_container
+
+    if ((not _pdflatex_use_docker) or (not _pdflatex_docker_persistent) or (_docker_container is not None)):
+        yield
+        return
+
+    container = DockerContainer(root_dir)
+    container.start()
+
+    with _docker_container_lock:
+        _docker_container = container
+
+    try:
+        yield
+    finally:
+        stop_docker_container()
+
+def get_docker_container():
+    return _docker_container
+
+def set_docker_container(container):
+    """
+    Use an existing container (e.g., one started by a parent process).
+    """
+
+    global _docker_container
+
+    with _docker_container_lock:
+        _docker_container = container
+
+def stop_docker_container():
+    global _docker_container
+
+    with _docker_container_lock:
+        container = _docker_container
+        _docker_container = None
+
+    if (container is not None):
+        container.stop()
+
+atexit.register(stop_docker_container)
+
 def _compile_docker(path):
     tex_filename = os.path.basename(path)
     out_dir_path = os.path.abspath(os.path.dirname(path))
 
     docker_cmd = [
         "docker", "run", "--rm",
+    ] + _get_docker_user_args() + [
         "-v", f"{out_dir_path}:/work",
         DOCKER_IMAGE,
         tex_filename
@@ -85,6 +289,17 @@ def _compile_docker(path):
     if (result.returncode != 0):
         raise ValueError("Docker compilation failed with exit code '%s'. Stdout: '%s', Stderr: '%s'" % (result.returncode, result.stdout, result.stderr))
 
+def _get_docker_user_args():
+    """
+    Run as the current user inside of containers,
+    so that the files written to the mounted dir are owned by the current user (instead of root).
+    """
+
+    if (not hasattr(os, 'getuid')):
+        return []
+
+    return ["--user", "%d:%d" % (os.getuid(), os.getgid())]
+
 def set_cli_args(parser):
     parser.add_argument('--pdflatex-bin-path', dest = 'pdflatex_bin_path',
         action = 'store', type = str, default = None,
@@ -97,12 +312,20 @@ def set_cli_args(parser):
         help = ('Use Docker to compile PDFs with pdflatex.'
                 + " The Docker image '%s' will be used." % (DOCKER_IMAGE)))
 
+    parser.add_argument('--pdflatex-docker-persistent', dest = 'pdflatex_docker_persistent',
+        action = 'store_true', default = False,
+        help = ('When using Docker to compile PDFs, use a single long-lived container for all PDFs in a build'
+                + ' (instead of a new container for each PDF).'))
+
     return parser
 
 def init_from_args(args):
     if (args.pdflatex_use_docker):
         set_pdflatex_use_docker(args.pdflatex_use_docker)
 
+    if (args.pdflatex_docker_persistent):
+        set_pdflatex_docker_persistent(args.pdflatex_docker_persistent)
+
     if (args.pdflatex_bin_path is not None):
         set_pdflatex_bin_path(args.pdflatex_bin_path)
 
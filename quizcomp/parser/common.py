@@ -6,6 +6,7 @@ ENCODING = 'utf-8'
 BASE_DIR_KEY = 'base_dir'
 
 CONTEXT_ENV_KEY = 'qg_context'
+AST_ENV_KEY = 'qg_ast'
 CONTEXT_KEY_STYLE = 'style'
 CONTEXT_KEY_IMAGE_CALLBACK = 'image_path_callback'
 CONTEXT_KEY_FORCE_RAW_IMAGE_SRC = 'force_raw_image_src'
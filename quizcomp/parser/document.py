@@ -9,9 +9,30 @@ import quizcomp.parser.render
 import quizcomp.parser.common
 import quizcomp.util.json
 
+# Formats whose renderers modify tokens in place (e.g., to attach style or image sources).
+MUTATING_FORMATS = {
+    quizcomp.constants.FORMAT_CANVAS,
+    quizcomp.constants.FORMAT_HTML,
+}
+
+# Formats whose renderers work with an AST instead of tokens.
+AST_FORMATS = {
+    quizcomp.constants.FORMAT_TEX,
+    quizcomp.constants.FORMAT_TEXT,
+}
+
 class ParsedDocument(object):
+    """
+    A parsed document.
+    The tokens of a document should be treated as immutable, since they may be shared with other documents
+    (see quizcomp.parser.public.parse_text()).
+    Any rendering that needs to modify tokens will work on a private copy.
+    The AST is built lazily and reused until the tokens are changed (see set_tokens()).
+    """
+
     def __init__(self, tokens, base_dir = '.'):
         self._tokens = tokens
+        self._ast = None
         self._context = {
             quizcomp.parser.common.BASE_DIR_KEY: base_dir,
         }
@@ -19,6 +40,10 @@ class ParsedDocument(object):
     def set_context_value(self, key, value):
         self._context[key] = value
 
+    def set_tokens(self, tokens):
+        self._tokens = tokens
+        self._ast = None
+
     def to_canvas(self, **kwargs):
         return self._render(quizcomp.constants.FORMAT_CANVAS, **kwargs)
 
@@ -37,7 +62,15 @@ class ParsedDocument(object):
     def _render(self, format, **kwargs):
         context = quizcomp.parser.common.prep_context(self._context, options = kwargs)
         env = {quizcomp.parser.common.CONTEXT_ENV_KEY: context}
-        return quizcomp.parser.render.render(format, self._tokens, env = env, **kwargs)
+
+        if (format in AST_FORMATS):
+            env[quizcomp.parser.common.AST_ENV_KEY] = self.get_ast()
+
+        tokens = self._tokens
+        if (format in MUTATING_FORMATS):
+            tokens = copy_tokens(tokens)
+
+        return quizcomp.parser.render.render(format, tokens, env = env, **kwargs)
 
     def to_pod(self, include_metadata = True, **kwargs):
         data = {
@@ -110,6 +143,29 @@ class ParsedDocument(object):
     def get_ast(self):
         """
         Get a represetation of this document's AST.
+        The AST is shared (it is only built once), so it should not be modified.
         """
 
-        return quizcomp.parser.ast.build(self._tokens)
+        if (self._ast is None):
+            self._ast = quizcomp.parser.ast.build(self._tokens)
+
+        return self._ast
+
+def copy_tokens(tokens):
+    """
+    Copy a list of tokens (and their children) deep enough that the copies can be safely modified by a renderer.
+    This is much cheaper than a full deep copy.
+    """
+
+    if (tokens is None):
+        return None
+
+    results = []
+    for token in tokens:
+        results.append(token.copy(
+            attrs = dict(token.attrs),
+            meta = dict(token.meta),
+            children = copy_tokens(token.children),
+        ))
+
+    return results
@@ -6,12 +6,19 @@ import quizcomp.parser.common
 
 _katex_available = None
 
+# The version of KaTeX used by this process (resolved once, see _get_katex_version()).
+_katex_version = None
+_katex_installed_version_checked = False
+
+# The env key that holds pre-rendered HTML equations: {(text, inline): html, ...}.
+HTML_ENV_KEY = 'qg_math_html'
+
 def render(format, inline, tokens, idx, options, env):
     context = env.get(quizcomp.parser.common.CONTEXT_ENV_KEY, {})
     text = tokens[idx].content
 
     if (format == quizcomp.constants.FORMAT_HTML):
-        return _render_html(text, inline, context)
+        return _render_html(text, inline, context, prerendered = env.get(HTML_ENV_KEY, {}))
     elif (format == quizcomp.constants.FORMAT_MD):
         return _render_md(text, inline, context)
     elif (format == quizcomp.constants.FORMAT_TEX):
@@ -30,20 +37,138 @@ def _render_tex(text, inline, context):
 
     return f"$$\n{text}\n$$"
 
-def _render_html(text, inline, context):
+def prerender_html(tokens, env):
+    """
+    Render all the equations in a token stream with a single KaTeX request,
+    instead of making a request for each equation.
+    The results are placed in the env (under HTML_ENV_KEY) to be picked up by render().
+    """
+
+    items = list(dict.fromkeys(_collect_html_items(tokens)))
+    if (len(items) == 0):
+        return
+
+    # Equations that are all in the cache do not need KaTeX (or NodeJS) at all.
+    results = _get_cached_html(items)
+    if (results is None):
+        if (not _check_katex()):
+            return
+
+        results = _katex_to_html(items)
+
+    env[HTML_ENV_KEY] = dict(zip(items, results))
+
+def _collect_html_items(tokens):
+    """
+    Get all the equations in a token stream as: [(text, inline), ...].
+    """
+
+    items = []
+
+    if (tokens is None):
+        return items
+
+    for token in tokens:
+        if (token.type == 'math_inline'):
+            items.append((token.content.strip(), True))
+        elif (token.type == 'math_block'):
+            items.append((token.content, False))
+
+        items += _collect_html_items(token.children)
+
+    return items
+
+def _katex_to_html(items):
+    """
+    Render equations ([(text, inline), ...]) with KaTeX,
+    using the rendered equation cache (if there is one).
+    """
+
+    cache = quizcomp.katex.get_cache()
+    if (cache is None):
+        return quizcomp.katex.to_html_batch([text for (text, _) in items])
+
+    keys = _get_cache_keys(items, _get_katex_version())
+    results = [cache.get(key) for key in keys]
+
+    missing_indexes = [i for i in range(len(results)) if (results[i] is None)]
+    if (len(missing_indexes) == 0):
+        return results
+
+    contents = quizcomp.katex.to_html_batch([items[i][0] for i in missing_indexes])
+    for (i, content) in zip(missing_indexes, contents):
+        cache.put(keys[i], content)
+        results[i] = content
+
+    return results
+
+def _get_cached_html(items):
+    """
+    Get the rendered equations from the cache without using KaTeX,
+    or None if there is no cache, the KaTeX version is not known without NodeJS,
+    or any of the equations are not in the cache.
+    """
+
+    cache = quizcomp.katex.get_cache()
+    if (cache is None):
+        return None
+
+    version = _get_katex_version(start_worker = False)
+    if (version is None):
+        return None
+
+    results = [cache.get(key) for key in _get_cache_keys(items, version)]
+    if (any([(result is None) for result in results])):
+        return None
+
+    return results
+
+def _get_katex_version(start_worker = True):
+    """
+    Get the KaTeX version that cached equations are keyed on (resolved once per process).
+    The version is read from the installed package (which does not need NodeJS),
+    and only if the package could not be found is the worker started (when |start_worker| is true) to ask it.
+    """
+
+    global _katex_version, _katex_installed_version_checked
+
+    if ((_katex_version is None) and (not _katex_installed_version_checked)):
+        _katex_installed_version_checked = True
+        _katex_version = quizcomp.katex.get_installed_version()
+
+    if ((_katex_version is None) and start_worker):
+        _katex_version = quizcomp.katex.get_worker().get_version()
+
+    return _katex_version
+
+def _get_cache_keys(items, version):
+    return [[quizcomp.constants.FORMAT_HTML, inline, version, text] for (text, inline) in items]
+
+def _check_katex():
     global _katex_available
 
     if (_katex_available is None):
         _katex_available = quizcomp.katex.is_available()
 
+    return _katex_available
+
+def _render_html(text, inline, context, prerendered = {}):
     if (inline):
         text = text.strip()
 
-    if (_katex_available):
-        content = quizcomp.katex.to_html(text)
-    else:
-        text = html.escape(text)
-        content = f"<code>{text}</code>"
+    content = prerendered.get((text, inline), None)
+
+    if (content is None):
+        cached = _get_cached_html([(text, inline)])
+        if (cached is not None):
+            content = cached[0]
+
+    if (content is None):
+        if (_check_katex()):
+            content = _katex_to_html([(text, inline)])[0]
+        else:
+            text = html.escape(text)
+            content = f"<code>{text}</code>"
 
     element = 'span'
     attributes = 'style="margin-left: 0.25em; margin-right: 0.25em"'
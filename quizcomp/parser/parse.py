@@ -1,4 +1,5 @@
 import re
+import threading
 
 import markdown_it
 import mdit_py_plugins.container
@@ -9,6 +10,7 @@ import quizcomp.util.json
 
 _parser = None
 _options = None
+_parser_lock = threading.Lock()
 
 EXTRA_OPTIONS = [
     'table',
@@ -25,18 +27,43 @@ HTML_TOKENS = {
 }
 
 def _get_parser():
-    _parser = markdown_it.MarkdownIt('commonmark')
+    """
+    Get the shared (parser, options).
+    The parser is built once (on first use) and reused for all parsing and rendering.
+    """
+
+    global _parser, _options
+
+    if (_parser is not None):
+        return _parser, _options
 
-    for option in EXTRA_OPTIONS:
-        _parser.enable(option)
+    with _parser_lock:
+        if (_parser is None):
+            parser = markdown_it.MarkdownIt('commonmark')
 
-    for (plugin, options) in PLUGINS:
-        _parser.use(plugin, **options)
+            for option in EXTRA_OPTIONS:
+                parser.enable(option)
 
-    _options = _parser.options
+            for (plugin, options) in PLUGINS:
+                parser.use(plugin, **options)
+
+            _options = parser.options
+            _parser = parser
 
     return _parser, _options
 
+def _reset_parser():
+    """
+    Drop the shared parser so the next call to _get_parser() builds a new one.
+    Mainly for testing.
+    """
+
+    global _parser, _options
+
+    with _parser_lock:
+        _parser = None
+        _options = None
+
 def _clean_text(text):
     # Remove carriage returns.
     text = text.replace("\r", '')
@@ -46,8 +73,15 @@ def _clean_text(text):
 
     return text
 
-# Returns (transformed text, tokens).
+# Returns (transformed text, document).
 def _parse_text(text, base_dir):
+    text, tokens = _parse_tokens(text)
+    document = quizcomp.parser.document.ParsedDocument(tokens, base_dir = base_dir)
+
+    return (text, document)
+
+# Returns (transformed text, tokens).
+def _parse_tokens(text):
     text = _clean_text(text)
 
     parser, _ = _get_parser()
@@ -55,9 +89,7 @@ def _parse_text(text, base_dir):
     tokens = parser.parse(text)
     tokens = _post_process(tokens)
 
-    document = quizcomp.parser.document.ParsedDocument(tokens, base_dir = base_dir)
-
-    return (text.strip(), document)
+    return (text.strip(), tokens)
 
 def _post_process(tokens):
     """
@@ -66,10 +98,7 @@ def _post_process(tokens):
     """
 
     tokens = _add_root_block(tokens)
-    tokens = _process_placeholders(tokens)
-    tokens = _process_style(tokens)
-    tokens = _process_html(tokens)
-    tokens = _remove_empty_tokens(tokens)
+    tokens, _ = _process_tokens(tokens)
 
     return tokens
 
@@ -91,178 +120,174 @@ def _add_root_block(tokens):
 
     return [open_token] + tokens + [close_token]
 
-def _process_style(tokens, containing_block = None):
+def _process_tokens(tokens, containing_block = None):
     """
-    Locate any style nodes, parse them, remove them, and hoist their content to the containing block.
+    Process a list of tokens (and recursively, their children) in a single pass.
+    Returns a new list of the processed tokens,
+    and the number of tokens that were left after HTML processing (but before removing empty tokens).
+
+    For each token (in order), this will:
+     - Replace placeholder HTML tags with a placeholder token (see _process_html_token()).
+     - Parse and remove style nodes, and hoist their content to the containing block (see _process_html_token()).
+     - Remove or replace all other HTML tags (see _process_html_token()).
+     - Remove any inline's without text or blocks without children.
     """
 
-    remove_indexes = []
-    for i in range(len(tokens)):
+    results = []
+    html_processed_count = 0
+
+    # Use a non-standard loop so that we can manually advance the index within the loop.
+    i = -1
+    while (i < (len(tokens) - 1)):
+        i += 1
         token = tokens[i]
 
         # If this is a block, then mark it as the current block.
         # Any discovered style get's hoisted to the containing block.
         if (token.type == 'container_block_open'):
             containing_block = token
-        elif ((token.type in HTML_TOKENS) and (token.content.strip().startswith('<style>'))):
-            # Style nodes are HTML with a 'style' tag.
-
-            if (containing_block is None):
-                raise ValueError("Found a style node that does not have a containing block.")
+        elif (token.type in HTML_TOKENS):
+            token, i = _process_html_token(tokens, i, containing_block)
+            if (token is None):
+                continue
 
-            style = _process_style_content(token.content)
-            containing_block.meta[quizcomp.parser.common.TOKEN_META_KEY_STYLE] = style
+        html_processed_count += 1
 
-            # Mark this token for removal.
-            remove_indexes.append(i)
+        # Remove empty leaf content nodes.
+        if ((token.type in quizcomp.parser.common.CONTENT_NODES) and (token.content == '')):
+            continue
 
-        # Check all children.
+        # Process children, and remove nodes that have been emptied out.
+        # Note that nodes whose children were all HTML are not considered emptied out (they are kept with no children).
         if (_has_children(token)):
-            token.children = _process_style(token.children, containing_block = containing_block)
-
-    for remove_index in sorted(list(set(remove_indexes)), reverse = True):
-        tokens.pop(remove_index)
-
-    return tokens
-
-def _process_style_content(raw_content):
-    raw_content = raw_content.strip()
-
-    # Get content without tags ('<style>', '</style>').
-    content = re.sub(r'\s+', ' ', raw_content)
-    content = re.sub(r'^<style>(.*)</style>$', r'\1', content).strip()
-
-    # Ignore empty style.
-    if (len(content) == 0):
-        return {}
+            token.children, child_count = _process_tokens(token.children, containing_block = containing_block)
+            if ((child_count > 0) and (len(token.children) == 0)):
+                continue
 
-    # If the content does not start with a '{', then assume the braces were left out and add them.
-    # We will also ignore content that starts with a '[' (a JSON list), that will be handled later.
-    if (content[0] not in ['{', '[']):
-        content = "{%s}" % (content)
+        # Remove empty containers.
+        # Look for this token being the close, and the last kept token being the open.
+        if (_closes_empty_container(results, token)):
+            results.pop()
+            continue
 
-    try:
-        style = quizcomp.util.json.loads(content)
-        if (not isinstance(style, dict)):
-            raise ValueError("Style is not a JSON object, found: '%s'." % (type(style)))
-    except Exception as ex:
-        raise ValueError(('Failed to load style tag.'
-                + ' Style content must be a JSON object (start/end braces may be omitted).'
-                + " Original exception message: '%s'." % (ex)
-                + " Found:\n---\n%s\n---" % (raw_content)))
+        results.append(token)
 
-    return style
+    return results, html_processed_count
 
-def _remove_empty_tokens(tokens):
-    """
-    Remove any inline's without text or blocks without children.
+def _process_html_token(tokens, index, containing_block):
     """
+    Process the HTML token at the given index.
+    Returns the token that should replace it (or None if it should be removed),
+    and the index of the last token that was consumed.
 
-    # Keep looping until nothing is removed.
-    while True:
-        remove_indexes = []
-        for i in range(len(tokens)):
-            token = tokens[i]
+    Placeholder tags must either be an HTML block or inline with the same parent.
+    Style nodes are HTML with a 'style' tag.
+    Line breaks will be replaced with hard breaks, and all other HTML will be removed.
+    """
 
-            # Remove empty leaf content nodes.
-            if ((token.type in quizcomp.parser.common.CONTENT_NODES) and (token.content == '')):
-                remove_indexes.append(i)
+    token = tokens[index]
+    content = token.content.strip()
 
-            # Check children for removal.
-            if (_has_children(token)):
-                token.children = _remove_empty_tokens(token.children)
+    if (content.startswith('<placeholder')):
+        if (token.type == 'html_block'):
+            return _create_placeholder_token(token), index
 
-                # Remove nodes that have been emptied out.
-                if (len(token.children) == 0):
-                    remove_indexes.append(i)
+        return _process_inline_placeholder(tokens, index)
 
-            # Check for empty containers.
-            # Look for this token being the open, and the next token being the close.
-            if ((i < (len(tokens) - 1)) and (token.type.endswith('_open')) and (tokens[i + 1].type.endswith('_close'))):
-                next_token = tokens[i + 1]
-                base_type = re.sub('_open$', '', token.type)
-                next_base_type = re.sub('_close$', '', next_token.type)
+    if (content.startswith('<style>')):
+        if (containing_block is None):
+            raise ValueError("Found a style node that does not have a containing block.")
 
-                # Remove if types match and neither has any kids (close should never have kids).
-                if ((base_type == next_base_type) and (not _has_children(token)) and (not _has_children(next_token))):
-                    remove_indexes += [i, i + 1]
+        style = _process_style_content(token.content)
+        containing_block.meta[quizcomp.parser.common.TOKEN_META_KEY_STYLE] = style
 
-        for remove_index in sorted(list(set(remove_indexes)), reverse = True):
-            tokens.pop(remove_index)
+        return None, index
 
-        if (len(remove_indexes) == 0):
-            break
+    if (content.startswith('<br')):
+        return markdown_it.token.Token(type = 'hardbreak', tag = 'br', nesting = 0, map = token.map), index
 
-    return tokens
+    return None, index
 
-def _process_placeholders(tokens):
+def _process_inline_placeholder(tokens, open_tag_index):
     """
-    Find any placeholder HTML tags and replace them with a placeholder token.
-    plceholder tags must either be an HTML block or inline with the same parent.
+    Replace an inline placeholder (open tag, text, close tag) with a single placeholder token.
+    Returns the placeholder token and the index of the close tag.
     """
 
-    remove_indexes = []
+    close_tag_index = None
 
-    # Use a non-standard loop so that we can manually advance the index within the loop.
-    i = -1
-    while (i < (len(tokens) - 1)):
-        i += 1
-        token = tokens[i]
+    # Look for the close tag at this same level (under the same parent).
+    for j in range(open_tag_index + 1, len(tokens)):
+        other_token = tokens[j]
+        if (other_token.type != 'html_inline'):
+            continue
 
-        if (token.type == 'html_block'):
-            if ((not token.content) or (not token.content.strip().startswith('<placeholder'))):
-                continue
+        if ((not other_token.content) or (not other_token.content.strip() == '</placeholder>')):
+            continue
 
-            # Replace the HTML block token with a placeholder token.
-            tokens[i] = _create_placeholder_token(token)
-        elif (token.type == 'html_inline'):
-            if ((not token.content) or (not token.content.strip().startswith('<placeholder'))):
-                continue
+        close_tag_index = j
+        break
+
+    if (close_tag_index is None):
+        raise ValueError("Could not find closing tag for <placeholder>.")
 
-            open_tag_index = i
-            close_tag_index = None
+    if ((close_tag_index - open_tag_index) < 2):
+        raise ValueError("Did not find any content inside a <placeholder> tag.")
 
-            # Look for the close tag at this same level (under the same parent).
-            for j in range(i + 1, len(tokens)):
-                other_token = tokens[j]
-                if (other_token.type != 'html_inline'):
-                    continue
+    if ((close_tag_index - open_tag_index) > 2):
+        raise ValueError("Found too much content inside a <placeholder> tag, it shoud have only plain text.")
 
-                if ((not other_token.content) or (not other_token.content.strip() == '</placeholder>')):
-                    continue
+    text_token = tokens[open_tag_index + 1]
+    if (text_token.type != 'text'):
+        raise ValueError("Found non-text content inside a <placeholder> tag, it shoud have only plain text.")
 
-                close_tag_index = j
-                break
+    return _create_placeholder_token(text_token), close_tag_index
 
-            if (close_tag_index is None):
-                raise ValueError("Could not find closing tag for <placeholder>.")
+def _closes_empty_container(previous_tokens, token):
+    """
+    Check if this token closes a container that has no content,
+    i.e., the previous token is the matching open and neither has any kids (close should never have kids).
+    """
 
-            if ((close_tag_index - open_tag_index) < 2):
-                raise ValueError("Did not find any content inside a <placeholder> tag.")
+    if ((len(previous_tokens) == 0) or (not token.type.endswith('_close'))):
+        return False
 
-            if ((close_tag_index - open_tag_index) > 2):
-                raise ValueError("Found too much content inside a <placeholder> tag, it shoud have only plain text.")
+    open_token = previous_tokens[-1]
+    if (not open_token.type.endswith('_open')):
+        return False
 
-            text_token_index = open_tag_index + 1
-            text_token = tokens[text_token_index]
-            if (text_token.type != 'text'):
-                raise ValueError("Found non-text content inside a <placeholder> tag, it shoud have only plain text.")
+    base_type = re.sub('_open$', '', open_token.type)
+    close_base_type = re.sub('_close$', '', token.type)
 
-            # All tokens (open, content/label, close) are accounted for.
-            # Replace the content node and remove the open/close tags.
-            tokens[text_token_index] = _create_placeholder_token(text_token)
-            remove_indexes += [open_tag_index, close_tag_index]
+    return ((base_type == close_base_type) and (not _has_children(open_token)) and (not _has_children(token)))
 
-            # Advance to the close token.
-            i = close_tag_index
+def _process_style_content(raw_content):
+    raw_content = raw_content.strip()
 
-        if (_has_children(token)):
-            token.children = _process_placeholders(token.children)
+    # Get content without tags ('<style>', '</style>').
+    content = re.sub(r'\s+', ' ', raw_content)
+    content = re.sub(r'^<style>(.*)</style>$', r'\1', content).strip()
 
-    for remove_index in sorted(list(set(remove_indexes)), reverse = True):
-        tokens.pop(remove_index)
+    # Ignore empty style.
+    if (len(content) == 0):
+        return {}
 
-    return tokens
+    # If the content does not start with a '{', then assume the braces were left out and add them.
+    # We will also ignore content that starts with a '[' (a JSON list), that will be handled later.
+    if (content[0] not in ['{', '[']):
+        content = "{%s}" % (content)
+
+    try:
+        style = quizcomp.util.json.loads(content)
+        if (not isinstance(style, dict)):
+            raise ValueError("Style is not a JSON object, found: '%s'." % (type(style)))
+    except Exception as ex:
+        raise ValueError(('Failed to load style tag.'
+                + ' Style content must be a JSON object (start/end braces may be omitted).'
+                + " Original exception message: '%s'." % (ex)
+                + " Found:\n---\n%s\n---" % (raw_content)))
+
+    return style
 
 def _create_placeholder_token(token):
     # Fetch the label in the tag.
@@ -275,32 +300,5 @@ def _create_placeholder_token(token):
             type = 'placeholder', tag = '', nesting = 0,
             map = token.map, content = label)
 
-def _process_html(tokens):
-    """
-    Remove or replacec all HTML tags.
-    This will recursively descend to find all tags.
-    Line breaks will be replaced with hard breaks.
-    """
-
-    remove_indexes = []
-    for i in range(len(tokens)):
-        token = tokens[i]
-
-        if (token.type in HTML_TOKENS):
-            if (token.content.strip().startswith('<br')):
-                tokens[i] = markdown_it.token.Token(
-                        type = 'hardbreak', tag = 'br', nesting = 0,
-                        map = token.map)
-            else:
-                remove_indexes.append(i)
-
-        if (_has_children(token)):
-            token.children = _process_html(token.children)
-
-    for remove_index in sorted(list(set(remove_indexes)), reverse = True):
-        tokens.pop(remove_index)
-
-    return tokens
-
 def _has_children(token):
     return ((token.children is not None) and (len(token.children) > 0))
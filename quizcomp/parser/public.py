@@ -3,8 +3,10 @@ Pieces of the parsing infrastructure that are exposed for public use.
 Code outside this package should generally only use these resources.
 """
 
+import functools
 import os
 
+import quizcomp.parser.document
 import quizcomp.parser.parse
 import quizcomp.util.serial
 import quizcomp.util.dirent
@@ -21,10 +23,49 @@ class ParsedText(quizcomp.util.serial.PODSerializer):
     def to_pod(self, **kwargs):
         return self.text
 
+# The maximum number of parsed texts to keep in the parse cache.
+PARSE_CACHE_SIZE = 4096
+
 def parse_text(text, base_dir = '.'):
-    text, document = quizcomp.parser.parse._parse_text(text, base_dir)
+    """
+    Parse some text.
+    The same text is often parsed many times (e.g., "True", "False", or shared feedback),
+    so parsed tokens are kept in an LRU cache (see get_parse_cache_stats()).
+    The tokens are shared between all documents with the same text,
+    but each call gets its own document (with its own context).
+    """
+
+    text, tokens = _parse_tokens(text)
+    document = quizcomp.parser.document.ParsedDocument(tokens, base_dir = base_dir)
+
     return ParsedText(text, document)
 
+def get_parse_cache_stats():
+    """
+    Get the hits, misses, and current size of the parse cache.
+    """
+
+    info = _parse_tokens.cache_info()
+
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+    }
+
+def clear_parse_cache():
+    _parse_tokens.cache_clear()
+
+@functools.lru_cache(maxsize = PARSE_CACHE_SIZE)
+def _parse_tokens(text):
+    """
+    Returns (cleaned text, tokens).
+    The tokens do not depend on the base dir (it only matters when rendering), so it is not a part of the key.
+    """
+
+    return quizcomp.parser.parse._parse_tokens(text)
+
 def parse_file(path):
     if (not os.path.isfile(path)):
         raise ValueError(f"Path to parse ('{path}') is not a file.")
@@ -11,7 +11,10 @@ class QuizComposerRendererBase(markdown_it.renderer.RendererProtocol, abc.ABC):
         context = env.get(quizcomp.parser.common.CONTEXT_ENV_KEY, {})
 
         # Work with an AST instead of tokens.
-        ast = quizcomp.parser.ast.build(tokens)
+        # Use a pre-built AST if one was passed in (see quizcomp.parser.document.ParsedDocument).
+        ast = env.get(quizcomp.parser.common.AST_ENV_KEY, None)
+        if (ast is None):
+            ast = quizcomp.parser.ast.build(tokens)
 
         return self._render_node(ast, context)
 
@@ -37,6 +37,10 @@ class QuizComposerRendererHTML(markdown_it.renderer.RendererHTML):
     def render(self, tokens, options, env):
         # Override the main rendering function to attatch style.
         self._style_override_helper(tokens)
+
+        # Render all equations at once.
+        quizcomp.parser.math.prerender_html(tokens, env)
+
         return super().render(tokens, options, env)
 
     def _style_override_helper(self, tokens):
@@ -38,7 +38,10 @@ class QuizComposerMDformatExtension(mdformat.plugins.ParserExtensionInterface):
     }
 
 def get_renderer(options):
-    extensions = options.get('parser_extension', [])
+    # The parser options are shared, so work on a copy.
+    options = dict(options)
+
+    extensions = list(options.get('parser_extension', []))
     extensions += [
         mdformat.plugins.PARSER_EXTENSIONS['tables'],
         QuizComposerMDformatExtension(),
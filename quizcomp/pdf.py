@@ -1,35 +1,92 @@
+import collections
+import concurrent.futures
+import contextlib
+import copy
 import datetime
 import logging
 import os
 import random
-import string
+import re
 import traceback
 
 import quizcomp.converter.tex
 import quizcomp.latex
+import quizcomp.log
 import quizcomp.util.dirent
+import quizcomp.util.hash
 import quizcomp.util.json
 import quizcomp.quiz
+import quizcomp.variant
+import quizcomp.watch
 
 OPTIONS_FILENAME = 'options.json'
+MANIFEST_FILENAME = 'manifest.json'
+
+# The number of tasks (per job) that can be waiting in a process pool at once.
+# Variants are only created as tasks are submitted, so this bounds the number of variants in memory.
+MAX_QUEUED_TASKS_PER_JOB = 2
+
+# Task arguments shared by all tasks in a worker process (see _run_tasks()).
+_worker_shared_args = {}
 
 def make_with_args(args, **kwargs):
     """
     Use a standard args object from set_cli_args() to make a PDF quiz.
     """
 
+    return make_with_path(args.path, **_get_options_from_args(args, **kwargs))
+
+def watch_with_args(args, **kwargs):
+    """
+    Like make_with_args(), but keep watching the quiz and remake it whenever it changes (see quizcomp.watch).
+    The args object should also have the arguments from quizcomp.watch.set_cli_args().
+    """
+
+    options = _get_options_from_args(args, **kwargs)
+
+    # Keep the same variants between rebuilds, so only the outputs affected by a change are rebuilt.
+    if (options['seed'] is None):
+        options['seed'] = random.randint(0, 2**64)
+
+    return quizcomp.watch.watch(args.path, lambda quiz: make(quiz, quiz_path = args.path, **options),
+            interval = args.watch_interval)
+
+def _get_options_from_args(args, **kwargs):
+    """
+    Validate a standard args object from set_cli_args() and get the matching keyword arguments for make().
+    """
+
     if (not os.path.exists(args.path)):
         raise ValueError(f"Provided path '{args.path}' does not exist.")
 
     if (not os.path.isfile(args.path)):
         raise ValueError(f"Provided path '{args.path}' is not a file.")
 
-    if ((args.variants < 1) or (args.variants >= len(string.ascii_uppercase))):
-        raise ValueError("Number of variants must be in [1, %d), found %d." % (len(string.ascii_uppercase), args.variants))
+    if (args.variants < 1):
+        raise ValueError("Number of variants must be at least 1, found %d." % (args.variants))
 
-    return make_with_path(args.path, base_out_dir = args.out_dir, seed = args.seed, num_variants = args.variants,
-            skip_key = args.skip_key, skip_tex = args.skip_tex, skip_pdf = args.skip_pdf,
-            **kwargs)
+    if (args.jobs < 1):
+        raise ValueError("Number of jobs must be at least 1, found %d." % (args.jobs))
+
+    variant_ids = None
+    if (args.roster is not None):
+        variant_ids = load_roster(args.roster)
+
+    options = {
+        'base_out_dir': args.out_dir,
+        'seed': args.seed,
+        'num_variants': args.variants,
+        'variant_ids': variant_ids,
+        'skip_key': args.skip_key,
+        'skip_tex': args.skip_tex,
+        'skip_pdf': args.skip_pdf,
+        'jobs': args.jobs,
+        'key_positions': args.key_positions,
+        'rebuild': args.rebuild,
+    }
+    options.update(kwargs)
+
+    return options
 
 def make_with_path(quiz_path, **kwargs):
     quiz = quizcomp.quiz.Quiz.from_path(quiz_path)
@@ -37,9 +94,27 @@ def make_with_path(quiz_path, **kwargs):
 
 def make(quiz,
         quiz_path = None, base_out_dir = None,
-        seed = None, num_variants = 1, write_options = True,
+        seed = None, num_variants = 1, variant_ids = None, write_options = True,
         skip_key = False, skip_tex = False, skip_pdf = False,
+        jobs = 1, key_positions = False, rebuild = False, keep_variants = True,
         **kwargs):
+    """
+    Make PDF variants (and answer keys) for a quiz.
+    If |jobs| is more than one, then variants and keys will be made in parallel (in a process pool).
+    All variants are created in order (in this process), so the output does not depend on the number of jobs
+    and each answer key is made from the same variant as its quiz.
+    Variants are created lazily (see quizcomp.quiz.Quiz.iter_variants()) as they are made,
+    and if |keep_variants| is false, then they are not kept afterwards (and no variants are returned),
+    so memory stays bounded when making many variants (e.g., one for each student in a large roster).
+    If |variant_ids| (e.g., from a class roster, see load_roster()) are given, then one variant is made for each id
+    (instead of |num_variants| variants with letter ids).
+    Answer keys will not record answer box positions (which are only needed for grading) unless |key_positions| is true.
+
+    Builds are incremental: a manifest of the inputs to each TeX file and PDF is kept in the output dir,
+    and any TeX file or PDF whose inputs have not changed since the last build will not be remade.
+    If |rebuild| is true, then everything will be remade.
+    """
+
     if (base_out_dir is None):
         base_out_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp_pdf_', rm = False)
 
@@ -64,46 +139,68 @@ def make(quiz,
     }
 
     logging.info("Using seed %d.", seed)
-    rng = random.Random(seed)
+
+    manifest_path = os.path.join(out_dir, MANIFEST_FILENAME)
+    manifest = {}
+    if (not rebuild):
+        manifest = _load_manifest(manifest_path)
+
+    build_info = _get_build_info(skip_pdf)
+
+    # Arguments that are the same for every task.
+    shared_args = {
+        'out_dir': out_dir,
+        'skip_tex': skip_tex,
+        'skip_pdf': skip_pdf,
+        'manifest': manifest,
+        'build_info': build_info,
+    }
 
     variants = []
-    for i in range(num_variants):
-        variant_id = None
-        if (num_variants > 1):
-            variant_id = string.ascii_uppercase[i]
 
-        variant_seed = rng.randint(0, 2**64)
-        variant = quiz.create_variant(identifier = variant_id, seed = variant_seed)
-        variants.append(variant)
+    def _iter_tasks():
+        """
+        Variants are created here (instead of in the tasks), since choosing questions (without replacement)
+        depends on the variants that were created before.
+        Each variant gets two tasks: the variant itself and its answer key (made from the same variant).
+        """
 
-        out_path = os.path.join(out_dir, "%s.json" % (variant.title))
-        quizcomp.util.dirent.write_file(out_path, variant.to_json())
-
-        make_pdf(variant, out_dir = out_dir, is_key = False, skip_tex = skip_tex, skip_pdf = skip_pdf)
-
-        title = variant.title
-
-        # Always create an answer key.
-        has_key = False
-        if (not skip_key):
-            try:
-                variant.title = "%s -- Answer Key" % (title)
-                make_pdf(variant, out_dir = out_dir, is_key = True, skip_tex = skip_tex, skip_pdf = skip_pdf)
-                has_key = True
-            except Exception as ex:
-                logging.warning("Failed to generate answer key for '%s'.", title)
-                logging.debug(traceback.format_exc())
-            finally:
-                variant.title = title
-
-        options['variants'].append({
-            'id': variant_id,
-            'title': title,
-            'seed': variant_seed,
-            'has_key': has_key,
-        })
+        variant_infos = quizcomp.quiz.iter_variant_infos(num_variants, seed, identifiers = variant_ids)
+        new_variants = quiz.iter_variants(num_variants, seed, identifiers = variant_ids)
 
-        logging.info("Completed variant: '%s'.", title)
+        for ((variant_id, _), variant) in zip(variant_infos, new_variants):
+            if (keep_variants):
+                variants.append(variant)
+
+            yield {'variant': variant, 'variant_id': variant_id, 'is_key': False, 'write_positions': True}
+
+            if (not skip_key):
+                yield {'variant': variant, 'variant_id': variant_id, 'is_key': True, 'write_positions': key_positions}
+
+    # Keep entries for outputs that were not a part of this build.
+    new_manifest = dict(manifest)
+
+    # All compiles can share a single container (when using persistent Docker compilation).
+    session = contextlib.nullcontext()
+    if (not skip_pdf):
+        session = quizcomp.latex.docker_session(out_dir)
+
+    with session:
+        for (result, entries) in _run_tasks(_iter_tasks(), shared_args, jobs):
+            new_manifest.update(entries)
+
+            if (result['is_key']):
+                options['variants'][-1]['has_key'] = result['success']
+                continue
+
+            options['variants'].append({
+                'id': result['id'],
+                'title': result['title'],
+                'seed': result['seed'],
+                'has_key': False,
+            })
+
+    _write_manifest(manifest_path, new_manifest)
 
     if (write_options):
         path = os.path.join(out_dir, OPTIONS_FILENAME)
@@ -112,9 +209,131 @@ def make(quiz,
 
     return (quiz, variants, options)
 
+def _run_tasks(tasks, shared_args, jobs):
+    """
+    Run variant tasks (see _make_variant()) and yield the results (in the same order as the tasks).
+    Each task is called with its own arguments and |shared_args|.
+    Tasks are taken from the |tasks| iterable as they are needed,
+    so only a few tasks (see MAX_QUEUED_TASKS_PER_JOB) are in memory at once.
+    """
+
+    if (jobs <= 1):
+        for task in tasks:
+            yield _make_variant(**shared_args, **task)
+
+        return
+
+    # Workers may not inherit module-level settings (depending on how processes are started), so pass them along.
+    # The shared arguments are also only sent once to each worker (instead of with every task).
+    settings = _get_worker_settings()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = jobs,
+            initializer = _init_worker, initargs = (settings, shared_args)) as executor:
+        futures = collections.deque()
+        for task in tasks:
+            futures.append(executor.submit(_make_worker_variant, task))
+
+            if (len(futures) >= (jobs * MAX_QUEUED_TASKS_PER_JOB)):
+                yield futures.popleft().result()
+
+        while (len(futures) > 0):
+            yield futures.popleft().result()
+
+def _make_worker_variant(task):
+    return _make_variant(**_worker_shared_args, **task)
+
+def _make_variant(variant, variant_id, out_dir, is_key, skip_tex, skip_pdf, write_positions,
+        manifest, build_info):
+    """
+    Make the PDF for a variant (or the PDF for its answer key).
+    Returns (result, new manifest entries).
+    The result only has information about the variant (instead of the variant itself, which may be large):
+    {'id': <variant id>, 'title': <variant title>, 'seed': <variant seed>, 'is_key': bool, 'success': bool}.
+    A variant will raise on failure, but a key that fails to be made will just not be successful.
+    """
+
+    result = {
+        'id': variant_id,
+        'title': variant.title,
+        'seed': variant.seed,
+        'is_key': is_key,
+        'success': True,
+    }
+
+    title = variant.title
+
+    if (is_key):
+        # The variant may be shared with its non-key task.
+        variant = copy.copy(variant)
+        variant.title = "%s -- Answer Key" % (title)
+
+    manifest_entry = dict(manifest.get(variant.title, {}))
+    entries = {variant.title: manifest_entry}
+
+    if (not is_key):
+        out_path = os.path.join(out_dir, "%s.json" % (variant.title))
+        content = variant.to_json()
+
+        # Leave an unchanged file alone (so its mtime does not change).
+        if (quizcomp.util.dirent.read_file_if_exists(out_path, strip = False, rstrip = False) != content):
+            quizcomp.util.dirent.write_file(out_path, content)
+
+        make_pdf(variant, out_dir = out_dir, is_key = False, skip_tex = skip_tex, skip_pdf = skip_pdf,
+                write_positions = write_positions, manifest_entry = manifest_entry, build_info = build_info)
+
+        logging.info("Completed variant: '%s'.", title)
+        return result, entries
+
+    try:
+        make_pdf(variant, out_dir = out_dir, is_key = True, skip_tex = skip_tex, skip_pdf = skip_pdf,
+                write_positions = write_positions, manifest_entry = manifest_entry, build_info = build_info)
+    except Exception as ex:
+        logging.warning("Failed to generate answer key for '%s'.", title)
+        logging.debug(traceback.format_exc())
+
+        result['success'] = False
+        return result, entries
+
+    logging.info("Completed answer key: '%s'.", title)
+    return result, entries
+
+def _get_worker_settings():
+    return {
+        'log_level': logging.getLogger().getEffectiveLevel(),
+        'pdflatex_bin_path': quizcomp.latex._pdflatex_bin_path,
+        'pdflatex_use_docker': quizcomp.latex._pdflatex_use_docker,
+        'docker_container': quizcomp.latex.get_docker_container(),
+    }
+
+def _init_worker(settings, shared_args):
+    global _worker_shared_args
+    _worker_shared_args = shared_args
+
+    quizcomp.log.init(settings['log_level'])
+    quizcomp.latex.set_pdflatex_bin_path(settings['pdflatex_bin_path'])
+    quizcomp.latex.set_pdflatex_use_docker(settings['pdflatex_use_docker'])
+    quizcomp.latex.set_docker_container(settings['docker_container'])
+
 def make_pdf(variant,
         out_dir = None, is_key = False,
-        skip_tex = False, skip_pdf = False):
+        skip_tex = False, skip_pdf = False,
+        write_positions = None,
+        manifest_entry = None, build_info = None):
+    """
+    Make the TeX and PDF for a variant (or its answer key).
+    By default, answer box positions are only written for non-keys (see |write_positions|).
+
+    If a |manifest_entry| (a dict) is passed, then the TeX and PDF will only be made
+    if their inputs have changed since the entry was made.
+    The entry will be updated with the new input hashes.
+    """
+
+    if (build_info is None):
+        build_info = _get_build_info(skip_pdf)
+
+    if (write_positions is None):
+        write_positions = (not is_key)
+
     if (out_dir is None):
         out_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp_pdf_', rm = False)
 
@@ -124,17 +343,152 @@ def make_pdf(variant,
     out_path = os.path.join(out_dir, "%s.tex" % (variant.title))
 
     if (not skip_tex):
-        converter = quizcomp.converter.tex.TexTemplateConverter(answer_key = is_key,
-                image_base_dir = image_dir, image_relative_root = image_relative_root, cleanup_images = True)
-        content = converter.convert_variant(variant)
+        tex_hash = _hash_tex_inputs(variant, is_key, write_positions, build_info)
+
+        outputs = [out_path]
+        if (len(variant.collect_file_paths()) > 0):
+            outputs.append(image_dir)
+
+        if (_is_up_to_date(manifest_entry, 'tex', tex_hash, outputs)):
+            logging.debug("TeX for '%s' is up-to-date.", variant.title)
+        else:
+            converter = quizcomp.converter.tex.TexTemplateConverter(answer_key = is_key,
+                    image_base_dir = image_dir, image_relative_root = image_relative_root, cleanup_images = True,
+                    write_positions = write_positions)
+            content = converter.convert_variant(variant)
 
-        quizcomp.util.dirent.write_file(out_path, content)
+            quizcomp.util.dirent.write_file(out_path, content)
+
+            if (manifest_entry is not None):
+                manifest_entry['tex'] = tex_hash
 
     if (not skip_pdf):
-        quizcomp.latex.compile(out_path)
+        pdf_hash = _hash_pdf_inputs(out_path, image_dir, write_positions, build_info)
+
+        outputs = [os.path.splitext(out_path)[0] + '.pdf']
+        if (write_positions):
+            outputs.append(os.path.splitext(out_path)[0] + '.pos')
+
+        if (_is_up_to_date(manifest_entry, 'pdf', pdf_hash, outputs)):
+            logging.debug("PDF for '%s' is up-to-date.", variant.title)
+        else:
+            # Clear the old hash first, in case compilation fails.
+            if (manifest_entry is not None):
+                manifest_entry.pop('pdf', None)
+
+            quizcomp.latex.compile(out_path, positions = write_positions)
+
+            if (manifest_entry is not None):
+                manifest_entry['pdf'] = pdf_hash
 
     return out_dir
 
+def _is_up_to_date(manifest_entry, key, input_hash, outputs):
+    if ((manifest_entry is None) or (manifest_entry.get(key) != input_hash)):
+        return False
+
+    return all([os.path.exists(path) for path in outputs])
+
+def _get_build_info(skip_pdf):
+    """
+    Get the inputs that are shared by all TeX files/PDFs in a build.
+    """
+
+    info = {
+        'quizcomp': quizcomp.__version__,
+        'template': quizcomp.util.hash.sha256_dir(quizcomp.converter.tex.DEFAULT_TEMPLATE_DIR),
+        'pdflatex': None,
+    }
+
+    if (not skip_pdf):
+        info['pdflatex'] = quizcomp.latex.get_version()
+
+    return info
+
+def _hash_tex_inputs(variant, is_key, write_positions, build_info):
+    images = {}
+    for path in sorted(set(variant.collect_file_paths())):
+        if (os.path.isfile(path)):
+            images[path] = quizcomp.util.hash.sha256_file(path)
+
+    inputs = {
+        'variant': quizcomp.util.hash.sha256(variant.to_json()),
+        'is_key': is_key,
+        'write_positions': write_positions,
+        'images': images,
+        'quizcomp': build_info['quizcomp'],
+        'template': build_info['template'],
+    }
+
+    return quizcomp.util.hash.sha256(quizcomp.util.json.dumps(inputs, sort_keys = True))
+
+def _hash_pdf_inputs(tex_path, image_dir, write_positions, build_info):
+    tex_hash = None
+    if (os.path.isfile(tex_path)):
+        tex_hash = quizcomp.util.hash.sha256_file(tex_path)
+
+    image_hash = None
+    if (os.path.isdir(image_dir)):
+        image_hash = quizcomp.util.hash.sha256_dir(image_dir)
+
+    inputs = {
+        'tex': tex_hash,
+        'images': image_hash,
+        'write_positions': write_positions,
+        'pdflatex': build_info['pdflatex'],
+    }
+
+    return quizcomp.util.hash.sha256(quizcomp.util.json.dumps(inputs, sort_keys = True))
+
+def _load_manifest(path):
+    if (not os.path.isfile(path)):
+        return {}
+
+    try:
+        return quizcomp.util.json.load_path(path)
+    except Exception as ex:
+        logging.warning("Could not load build manifest '%s', everything will be rebuilt: '%s'.", path, ex)
+        return {}
+
+def load_roster(path):
+    """
+    Load variant ids from a roster file (e.g., one student id per line).
+    Blank lines and lines starting with '#' are skipped.
+    Since ids are used in filenames, they may only contain letters, numbers, '-', '_', and '.'.
+    """
+
+    ids = []
+    for line in quizcomp.util.dirent.read_file(path).splitlines():
+        line = line.strip()
+        if ((line == '') or line.startswith('#')):
+            continue
+
+        if (re.search(r'[^\w\-\.]', line) is not None):
+            raise ValueError(f"Roster '{path}' has an id with invalid characters: '{line}'.")
+
+        ids.append(line)
+
+    if (len(ids) == 0):
+        raise ValueError(f"Roster '{path}' has no ids.")
+
+    seen = set()
+    duplicates = set()
+    for id in ids:
+        if (id in seen):
+            duplicates.add(id)
+
+        seen.add(id)
+
+    if (len(duplicates) > 0):
+        duplicates = list(sorted(duplicates))
+        raise ValueError(f"Roster '{path}' has duplicate ids: {duplicates}.")
+
+    return ids
+
+def _write_manifest(path, manifest):
+    with open(path, 'w') as file:
+        quizcomp.util.json.dump(manifest, file, indent = 4, sort_keys = True)
+
 def set_cli_args(parser):
     parser.add_argument('path', metavar = 'PATH',
         type = str,
@@ -144,6 +498,10 @@ def set_cli_args(parser):
         action = 'store', type = int, default = 1,
         help = 'The number of quiz variants to create (default: %(default)s).')
 
+    parser.add_argument('--roster', dest = 'roster',
+        action = 'store', type = str, default = None,
+        help = 'A file with one id per line (e.g., student ids). A variant will be created for each id (instead of using --variants).')
+
     parser.add_argument('--outdir', dest = 'out_dir',
         action = 'store', type = str, default = '.',
         help = 'The directory to put the quiz creation output (which will be another directory) (default: %(default)s).')
@@ -160,6 +518,18 @@ def set_cli_args(parser):
         action = 'store_true', default = False,
         help = 'Skip compiling PDFs from TeX (assumes the PDFs already exist) (default: %(default)s).')
 
+    parser.add_argument('--key-positions', dest = 'key_positions',
+        action = 'store_true', default = False,
+        help = 'Record answer box positions for answer keys (which are not needed for grading) (default: %(default)s).')
+
+    parser.add_argument('--rebuild', dest = 'rebuild',
+        action = 'store_true', default = False,
+        help = 'Remake all TeX files and PDFs, even if their inputs have not changed since the last build (default: %(default)s).')
+
+    parser.add_argument('--jobs', dest = 'jobs',
+        action = 'store', type = int, default = 1,
+        help = 'The number of variants/keys to make in parallel (default: %(default)s).')
+
     parser.add_argument('--seed', dest = 'seed',
         action = 'store', type = int, default = None,
         help = 'The random seed to use (defaults to a random seed).')
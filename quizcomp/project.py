@@ -1,8 +1,8 @@
-import glob
 import os
 
 import quizcomp.common
 import quizcomp.constants
+import quizcomp.index
 import quizcomp.question.base
 import quizcomp.quiz
 import quizcomp.util.dirent
@@ -22,6 +22,7 @@ class Project(quizcomp.util.serial.JSONSerializer):
 
         self.name = name
         self._base_dir = base_dir
+        self._index = None
 
         try:
             self.validate(cls = Project, **kwargs)
@@ -35,27 +36,47 @@ class Project(quizcomp.util.serial.JSONSerializer):
         if (not os.path.isdir(self._base_dir)):
             raise quizcomp.common.QuizValidationError("Base directory '%s' does not exist or is not a directory." % (self._base_dir))
 
-    def find_resources(self):
+    def get_index(self, save = False):
+        """
+        Get this project's resource index (a quizcomp.index.ResourceIndex), refreshed against the filesystem.
+        The index is read from the project's cache dir (if it was stored there before),
+        but is only stored back if |save| is true.
+        The index is registered so that groups loaded after this can resolve their questions against it.
+        """
+
+        if (self._index is None):
+            self._index = quizcomp.index.ResourceIndex(self._base_dir)
+            quizcomp.index.register(self._index)
+
+        self._index.refresh(save = save)
+
+        return self._index
+
+    def find_resources(self, save_index = False):
         """
         Find all the resources associated with this project.
+        The project's index is only stored if |save_index| is true (see get_index()).
         Returns the path to these resources as (quizzes, questions).
         """
 
-        quizzes = sorted(glob.glob(os.path.join(self._base_dir, '**', quizcomp.constants.QUIZ_FILENAME), recursive = True))
-        questions = sorted(glob.glob(os.path.join(self._base_dir, '**', quizcomp.constants.QUESTION_FILENAME), recursive = True))
+        index = self.get_index(save = save_index)
+
+        quizzes = index.find(quizcomp.constants.TYPE_QUIZ)
+        questions = index.find(quizcomp.constants.TYPE_QUESTION)
 
         return (quizzes, questions)
 
-    def load_resources(self, **kwargs):
+    def load_resources(self, save_index = False, **kwargs):
         """
         Load (and validate) all the resources associated with this project.
+        Questions may be loaded in parallel (see quizcomp.question.base.load_paths()).
         Returns: ([(quiz path, quiz object), ...], [(question path, question object), ...])
         """
 
-        quiz_paths, question_paths = self.find_resources()
+        quiz_paths, question_paths = self.find_resources(save_index = save_index)
 
         quizzes = [(path, quizcomp.quiz.Quiz.from_path(path, **kwargs)) for path in quiz_paths]
-        questions = [(path, quizcomp.question.base.Question.from_path(path, **kwargs)) for path in question_paths]
+        questions = list(zip(question_paths, quizcomp.question.base.load_paths(question_paths, **kwargs)))
 
         return (quizzes, questions)
 
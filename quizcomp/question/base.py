@@ -1,23 +1,40 @@
 import abc
+import concurrent.futures
 import copy
 import importlib
 import logging
 import math
 import os
+import pickle
 import pkgutil
 import random
 import re
+import threading
 
+import quizcomp
 import quizcomp.common
 import quizcomp.constants
+import quizcomp.log
 import quizcomp.parser.public
 import quizcomp.question.common
+import quizcomp.util.cache
 import quizcomp.util.dirent
 import quizcomp.util.serial
 
 BASE_MODULE_NAME = 'quizcomp.question'
 THIS_DIR = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 
+# A cache of compiled (parsed and validated) questions, see set_cache_dir().
+_cache = None
+
+# The number of processes to use when loading many questions at once, see load_paths().
+_load_jobs = 1
+
+# The process pool shared by all load_paths() calls, see _get_load_executor().
+_load_executor = None
+_load_executor_key = None
+_load_executor_lock = threading.Lock()
+
 class Question(quizcomp.util.serial.JSONSerializer):
     # {question_type: class, ...}
     _types = {}
@@ -43,12 +60,16 @@ class Question(quizcomp.util.serial.JSONSerializer):
             shuffle_answers = True,
             custom_header = None, skip_numbering = None,
             hints = None, feedback = None,
+            answer_order = None,
             ids = {},
             **kwargs):
         super().__init__(type = type, **kwargs)
 
         self.base_dir = base_dir
 
+        # The file this question was loaded from (if any), see from_path().
+        self._path = None
+
         self.prompt = prompt
         self._prompt_path = prompt_path
 
@@ -64,6 +85,10 @@ class Question(quizcomp.util.serial.JSONSerializer):
 
         self.shuffle_answers = shuffle_answers
 
+        # The order to present the answers in (e.g., after shuffling), see get_ordered_answers().
+        # None means that the answers are presented in their original order.
+        self.answer_order = answer_order
+
         self.custom_header = custom_header
         self.skip_numbering = skip_numbering
 
@@ -83,6 +108,7 @@ class Question(quizcomp.util.serial.JSONSerializer):
         self._validate_prompt()
         self._validate_question_feedback()
         self._validate_answers()
+        self._validate_answer_order()
 
         if (self.hints is None):
             self.hints = {}
@@ -93,6 +119,48 @@ class Question(quizcomp.util.serial.JSONSerializer):
     def _validate_answers(self):
         pass
 
+    def _validate_answer_order(self):
+        if (self.answer_order is None):
+            return
+
+        sizes = self._get_answer_order_sizes()
+        if (sizes is None):
+            raise quizcomp.common.QuestionValidationError(self, "Question type does not support an answer order.")
+
+        self._check_answer_order(self.answer_order, sizes, "'answer_order'")
+
+    def _check_answer_order(self, order, sizes, label):
+        """
+        Check that an answer order has the same shape as its sizes,
+        where every int in the sizes should be a permutation of that length.
+        """
+
+        if (isinstance(sizes, dict)):
+            self._check_type(order, dict, label)
+
+            if (set(order.keys()) != set(sizes.keys())):
+                raise quizcomp.common.QuestionValidationError(self, "%s keys (%s) do not match the expected keys (%s)." % (
+                        label, list(sorted(order.keys())), list(sorted(sizes.keys()))))
+
+            for (key, size) in sizes.items():
+                self._check_answer_order(order[key], size, "%s key '%s'" % (label, key))
+
+            return
+
+        self._check_type(order, list, label)
+
+        if (sorted(order) != list(range(sizes))):
+            raise quizcomp.common.QuestionValidationError(self, "%s is not an ordering of %d answers, found: '%s'." % (label, sizes, order))
+
+    def _get_answer_order_sizes(self):
+        """
+        Get the shape of an answer order for this question (the number of items that each part orders).
+        By default (this method), questions cannot be reordered and None is returned.
+        Children that support shuffling should override this method.
+        """
+
+        return None
+
     def _validate_prompt(self):
         """
         The prompt is allowed to appear (in order of priority):
@@ -188,6 +256,22 @@ class Question(quizcomp.util.serial.JSONSerializer):
     def copy(self):
         return copy.deepcopy(self)
 
+    def copy_for_variant(self):
+        """
+        Get a lightweight copy of this question for use in a variant.
+        The parsed content (prompt, answer text, feedback) is immutable and will be shared with this question,
+        only the state that a variant may change (name, hints, etc) is copied.
+        Shuffling does not modify the answers (see answer_order), so they are also shared.
+        """
+
+        question = copy.copy(self)
+
+        question.hints = self.hints.copy()
+        question.ids = self.ids.copy()
+        question._validated_classes = self._validated_classes.copy()
+
+        return question
+
     def shuffle(self, rng = None):
         if (not self.shuffle_answers):
             return
@@ -199,7 +283,7 @@ class Question(quizcomp.util.serial.JSONSerializer):
 
     def _shuffle(self, rng):
         """
-        Shuffle the answers for this question.
+        Shuffle the answers for this question by setting self.answer_order.
         By default (this method), no shuffling is performed.
         Children can override this method to support shuffling.
         """
@@ -211,7 +295,67 @@ class Question(quizcomp.util.serial.JSONSerializer):
         A shuffle method for question types that are a simple list.
         """
 
-        rng.shuffle(self.answers)
+        self.answer_order = _shuffled_indexes(len(self.answers), rng)
+
+    def get_ordered_answers(self):
+        """
+        Get the answers in the order that they should be presented (i.e., with self.answer_order applied).
+        The answers themselves are never modified.
+        """
+
+        if (self.answer_order is None):
+            return self.answers
+
+        return self._apply_answer_order(self.answers, self.answer_order)
+
+    def _apply_answer_order(self, answers, order):
+        """
+        Apply an answer order for question types that are a simple list.
+        Children with other answer structures should override this method.
+        """
+
+        return [answers[index] for index in order]
+
+    def to_dict(self, **kwargs):
+        data = super().to_dict(**kwargs)
+
+        # Only serialize an answer order if there is one.
+        if (data.get('answer_order', None) is None):
+            data.pop('answer_order', None)
+
+        return data
+
+    @classmethod
+    def from_path(cls, path, **kwargs):
+        """
+        Load a question from a file.
+        If there is a question cache (see set_cache_dir()) and no extra options are given,
+        then the compiled question will be loaded from the cache if none of its files have changed.
+        """
+
+        path = os.path.abspath(path)
+
+        if ((_cache is None) or (len(kwargs) > 0)):
+            question = super().from_path(path, **kwargs)
+            question._path = path
+            return question
+
+        key = ['question', quizcomp.__version__, path]
+
+        question = _load_cached_question(key)
+        if (question is not None):
+            return question
+
+        question = super().from_path(path)
+        question._path = path
+
+        dependencies = [path]
+        if (question._prompt_path is not None):
+            dependencies.append(question._prompt_path)
+
+        _cache_question(key, question, dependencies)
+
+        return question
 
     # Override the class method JSONSerializer.from_dict() with a static method
     # so that we can select the correct child class.
@@ -453,3 +597,225 @@ class Question(quizcomp.util.serial.JSONSerializer):
             output_document_placeholders = list(sorted(document_placeholders))
 
             raise quizcomp.common.QuestionValidationError(self, "Mismatch between the placeholders found in the question prompt (%s) and answers config (%s)." % (output_document_placeholders, output_answer_placeholders))
+
+def _shuffled_indexes(count, rng):
+    """
+    Get a random ordering of [0, count).
+    This consumes the rng exactly as shuffling a list of length count would.
+    """
+
+    indexes = list(range(count))
+    rng.shuffle(indexes)
+    return indexes
+
+def set_load_jobs(jobs):
+    global _load_jobs
+    _load_jobs = jobs
+
+def load_paths(paths, **kwargs):
+    """
+    Load questions from several files (see Question.from_path()) and return them in the same order as the paths.
+    If the number of load jobs (see set_load_jobs()) is more than one, then questions will be loaded in parallel (in a process pool),
+    and all the questions that failed to load will be reported together in a quizcomp.common.QuestionLoadErrors.
+    """
+
+    if ((_load_jobs <= 1) or (len(paths) <= 1)):
+        return [Question.from_path(path, **kwargs) for path in paths]
+
+    executor = _get_load_executor()
+    futures = [executor.submit(_load_path, path, kwargs) for path in paths]
+
+    questions = []
+    errors = []
+
+    for (path, future) in zip(paths, futures):
+        question, error = future.result()
+        if (error is not None):
+            errors.append((path, error))
+
+        questions.append(question)
+
+    if (len(errors) > 0):
+        raise quizcomp.common.QuestionLoadErrors(errors)
+
+    return questions
+
+def _get_load_executor():
+    """
+    Get the process pool for loading questions.
+    Starting a pool costs more than loading a typical group's questions,
+    so a single pool is lazily created and reused by every call (e.g., for each group in each quiz of a project).
+    The pool is replaced if the number of load jobs or the worker settings change.
+    """
+
+    global _load_executor, _load_executor_key
+
+    settings = get_load_worker_settings()
+    key = (_load_jobs, tuple(sorted(settings.items())))
+
+    with _load_executor_lock:
+        if ((_load_executor is not None) and (_load_executor_key != key)):
+            _load_executor.shutdown()
+            _load_executor = None
+
+        if (_load_executor is None):
+            _load_executor = concurrent.futures.ProcessPoolExecutor(max_workers = _load_jobs,
+                    initializer = init_load_worker, initargs = (settings,))
+            _load_executor_key = key
+
+        return _load_executor
+
+def shutdown_load_executor():
+    """
+    Stop the shared process pool for loading questions (if there is one).
+    A new pool will be started by the next parallel load.
+    """
+
+    global _load_executor, _load_executor_key
+
+    with _load_executor_lock:
+        if (_load_executor is not None):
+            _load_executor.shutdown()
+
+        _load_executor = None
+        _load_executor_key = None
+
+def _load_path(path, kwargs):
+    """
+    Load a question in a worker process.
+    Returns: (question, error message).
+    Chained exceptions do not survive being sent between processes, so errors are returned as a message
+    (see quizcomp.common.get_error_message()).
+    """
+
+    try:
+        return Question.from_path(path, **kwargs), None
+    except Exception as ex:
+        return None, quizcomp.common.get_error_message(ex)
+
+def get_load_worker_settings():
+    """
+    Get the settings that a worker process needs to load questions like this process (see init_load_worker()).
+    Workers may not inherit module-level settings (depending on how processes are started), so they are passed along.
+    """
+
+    settings = {
+        'log_level': logging.getLogger().getEffectiveLevel(),
+        'cache_dir': None,
+    }
+
+    if (_cache is not None):
+        settings['cache_dir'] = _cache.base_dir
+        settings['cache_max_size_bytes'] = _cache.max_size_bytes
+
+    return settings
+
+def init_load_worker(settings):
+    """
+    Initialize a worker process with settings from get_load_worker_settings().
+    Workers load their questions serially.
+    """
+
+    global _load_executor, _load_executor_key
+
+    quizcomp.log.init(settings['log_level'])
+    set_load_jobs(1)
+
+    # A forked worker may have a copy of the parent's pool, which is not its own to use.
+    _load_executor = None
+    _load_executor_key = None
+
+    if (settings['cache_dir'] is not None):
+        set_cache_dir(settings['cache_dir'], max_size_bytes = settings['cache_max_size_bytes'])
+
+def set_cache_dir(path, max_size_bytes = quizcomp.util.cache.DEFAULT_MAX_SIZE_BYTES):
+    """
+    Set the directory for the compiled question cache.
+    A path of None disables the cache.
+    """
+
+    global _cache
+
+    if (path is None):
+        _cache = None
+        return
+
+    _cache = quizcomp.util.cache.DiskCache(path, max_size_bytes = max_size_bytes)
+
+def get_cache():
+    """
+    Get the compiled question cache (a quizcomp.util.cache.DiskCache),
+    or None if there is no cache.
+    """
+
+    return _cache
+
+def _load_cached_question(key):
+    data = _cache.get(key, binary = True)
+    if (data is None):
+        return None
+
+    try:
+        entry = pickle.loads(data)
+    except Exception as ex:
+        logging.debug("Ignoring unreadable question cache entry for '%s': '%s'.", key[-1], ex)
+        return None
+
+    # The entry is stale if any of the files it was loaded from have changed.
+    for (path, stat_info) in entry['dependencies'].items():
+        if (_get_stat_info(path) != stat_info):
+            return None
+
+    return entry['question']
+
+def _cache_question(key, question, dependencies):
+    entry = {
+        'dependencies': {path: _get_stat_info(path) for path in dependencies},
+        'question': question,
+    }
+
+    try:
+        data = pickle.dumps(entry)
+    except Exception as ex:
+        logging.debug("Could not cache question '%s': '%s'.", key[-1], ex)
+        return
+
+    _cache.put(key, data)
+
+def _get_stat_info(path):
+    """
+    Get the information used to tell if a file has changed: [mtime (ns), size],
+    or None if the file does not exist.
+    """
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+def set_cli_args(parser):
+    parser.add_argument('--question-cache-dir', dest = 'question_cache_dir',
+        action = 'store', type = str, default = None, nargs = '?', const = quizcomp.constants.CACHE_DIRNAME,
+        help = ('A directory to cache compiled (parsed and validated) questions in'
+                + " (if given without a value, then '%s' will be used)." % (quizcomp.constants.CACHE_DIRNAME)
+                + ' Questions are only reloaded from their files when the files change.'
+                + ' If not specified, questions will not be cached.'))
+
+    parser.add_argument('--question-load-jobs', dest = 'question_load_jobs',
+        action = 'store', type = int, default = 1,
+        help = 'The number of questions to load in parallel (default: %(default)s).')
+
+    return parser
+
+def init_from_args(args):
+    if (args.question_cache_dir is not None):
+        set_cache_dir(args.question_cache_dir)
+
+    if (args.question_load_jobs < 1):
+        raise ValueError("Number of question load jobs must be at least 1, found %d." % (args.question_load_jobs))
+
+    set_load_jobs(args.question_load_jobs)
+
+    return args
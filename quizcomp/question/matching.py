@@ -1,10 +1,13 @@
+import random
+
 import quizcomp.common
 import quizcomp.constants
 import quizcomp.question.base
 
 class Matching(quizcomp.question.base.Question, question_type = quizcomp.constants.QUESTION_TYPE_MATCHING):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+    def __init__(self, answers = None, answer_order = None, **kwargs):
+        answers, answer_order = _migrate_legacy_shuffle(answers, answer_order)
+        super().__init__(answers = answers, answer_order = answer_order, **kwargs)
 
     def _validate_answers(self):
         self._check_type(self.answers, dict, "'answers' key")
@@ -57,6 +60,50 @@ class Matching(quizcomp.question.base.Question, question_type = quizcomp.constan
         self.answers['distractors'] = new_distractors
 
     def _shuffle(self, rng):
-        # Shuffling matching is special because it requires additional shuffling support at the converter level.
-        self.answers['shuffle'] = True
-        self.answers['shuffle_seed'] = rng.randint(0, 2 ** 64)
+        self.answer_order = _get_shuffled_order(self._get_answer_order_sizes(), rng.randint(0, 2 ** 64))
+
+    def _get_answer_order_sizes(self):
+        return _get_answer_order_sizes(self.answers)
+
+    def _apply_answer_order(self, answers, order):
+        # Matching answers keep their structure (left/right pairs), converters apply the order (see lefts/rights).
+        return answers
+
+def _migrate_legacy_shuffle(answers, answer_order):
+    """
+    Older variants stored a seed in the answers ('shuffle' and 'shuffle_seed') instead of an answer order.
+    Return the answers (a copy without the legacy keys) and the answer order that the seed gives.
+    Answers without the legacy keys (or that are not valid, see Matching._validate_answers()) are returned as-is.
+    """
+
+    if ((not isinstance(answers, dict)) or (('shuffle' not in answers) and ('shuffle_seed' not in answers))):
+        return answers, answer_order
+
+    answers = answers.copy()
+    seed = answers.pop('shuffle_seed', None)
+    shuffle = answers.pop('shuffle', False)
+
+    if ((not shuffle) or (answer_order is not None)):
+        return answers, answer_order
+
+    if ((not isinstance(answers.get('matches', None), list)) or (not isinstance(answers.get('distractors', []), list))):
+        return answers, answer_order
+
+    return answers, _get_shuffled_order(_get_answer_order_sizes(answers), seed)
+
+def _get_shuffled_order(sizes, seed):
+    rng = random.Random(seed)
+
+    return {
+        'lefts': quizcomp.question.base._shuffled_indexes(sizes['lefts'], rng),
+        'rights': quizcomp.question.base._shuffled_indexes(sizes['rights'], rng),
+    }
+
+def _get_answer_order_sizes(answers):
+    matches = answers['matches']
+    distractors = answers.get('distractors', [])
+
+    return {
+        'lefts': len(matches),
+        'rights': len(matches) + len(distractors),
+    }
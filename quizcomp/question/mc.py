@@ -10,3 +10,6 @@ class MC(quizcomp.question.base.Question, question_type = quizcomp.constants.QUE
 
     def _shuffle(self, rng):
         self._shuffle_answers_list(rng)
+
+    def _get_answer_order_sizes(self):
+        return len(self.answers)
@@ -28,5 +28,18 @@ class MDD(quizcomp.question.base.Question, question_type = quizcomp.constants.QU
         self._check_placeholders(self.answers.keys())
 
     def _shuffle(self, rng):
-        for key in self.answers:
-            rng.shuffle(self.answers[key]['values'])
+        self.answer_order = {key: quizcomp.question.base._shuffled_indexes(len(item['values']), rng) for (key, item) in self.answers.items()}
+
+    def _get_answer_order_sizes(self):
+        return {key: len(item['values']) for (key, item) in self.answers.items()}
+
+    def _apply_answer_order(self, answers, order):
+        new_answers = {}
+
+        for (key, item) in answers.items():
+            new_answers[key] = {
+                'key': item['key'],
+                'values': [item['values'][index] for index in order[key]],
+            }
+
+        return new_answers
@@ -1,12 +1,15 @@
+import concurrent.futures
 import datetime
 import logging
 import os
 import random
+import string
 
 import quizcomp.common
 import quizcomp.constants
 import quizcomp.group
 import quizcomp.parser.public
+import quizcomp.question.base
 import quizcomp.uploader.canvas
 import quizcomp.util.dirent
 import quizcomp.util.git
@@ -164,6 +167,27 @@ class Quiz(quizcomp.util.serial.JSONSerializer):
 
         return count
 
+    def collect_file_paths(self):
+        paths = list(self.description.document.collect_file_paths(self.base_dir))
+
+        for group in self.groups:
+            paths += group.collect_file_paths()
+
+        return paths
+
+    def iter_variants(self, count, seed = None, all_questions = False, identifiers = None):
+        """
+        Lazily create |count| variants (only one variant is created at a time).
+        Each variant gets its own seed (see iter_variant_infos()),
+        so a seed will always give the same variants (the same ones that quizcomp.pdf.make() makes with that seed).
+        """
+
+        if (seed is None):
+            seed = self._rng.randint(0, 2**64)
+
+        for (identifier, variant_seed) in iter_variant_infos(count, seed, identifiers = identifiers):
+            yield self.create_variant(identifier = identifier, seed = variant_seed, all_questions = all_questions)
+
     def create_variant(self, identifier = None, seed = None, all_questions = False):
         if (seed is None):
             seed = self._rng.randint(0, 2**64)
@@ -176,12 +200,7 @@ class Quiz(quizcomp.util.serial.JSONSerializer):
             questions = group.choose_questions(all_questions = all_questions, rng = rng,
                     with_replacement = self.pick_with_replacement)
 
-            group_data = group.__dict__.copy()
-            group_data['questions'] = questions
-            # Skip validation.
-            group_data['_skip_all_validation'] = True
-
-            new_groups.append(quizcomp.group.Group(**group_data))
+            new_groups.append(group.copy_for_variant(questions))
 
         if (self.shuffle_answers):
             for group in new_groups:
@@ -206,3 +225,66 @@ class Quiz(quizcomp.util.serial.JSONSerializer):
         data['_skip_class_validations'] = [Quiz]
 
         return quizcomp.variant.Variant(**data)
+
+def load_paths(paths, jobs = 1, **kwargs):
+    """
+    Load quizzes from several files, with up to |jobs| quizzes being loaded at the same time (in a process pool).
+    Unlike quizcomp.question.base.load_paths(), a quiz that fails to load does not stop the others.
+    Returns: [(quiz, error message), ...] in the same order as the paths
+    (the quiz is None when there is an error, and the error message is None otherwise).
+    """
+
+    if ((jobs <= 1) or (len(paths) <= 1)):
+        return [_load_path(path, kwargs) for path in paths]
+
+    settings = quizcomp.question.base.get_load_worker_settings()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = min(jobs, len(paths)),
+            initializer = quizcomp.question.base.init_load_worker, initargs = (settings,)) as executor:
+        futures = [executor.submit(_load_path, path, kwargs) for path in paths]
+        return [future.result() for future in futures]
+
+def _load_path(path, kwargs):
+    try:
+        return Quiz.from_path(path, **kwargs), None
+    except Exception as ex:
+        return None, quizcomp.common.get_error_message(ex)
+
+def iter_variant_infos(count, seed, identifiers = None):
+    """
+    Get the identifier and seed for each of |count| variants: [(identifier, seed), ...].
+    If |identifiers| (e.g., a class roster) is given, then there will be one variant for each of them (and |count| is ignored).
+    Otherwise, a single variant has no identifier and multiple variants get identifiers from get_variant_identifier().
+    """
+
+    if (identifiers is not None):
+        count = len(identifiers)
+
+    rng = random.Random(seed)
+
+    for i in range(count):
+        identifier = None
+        if (identifiers is not None):
+            identifier = identifiers[i]
+        elif (count > 1):
+            identifier = get_variant_identifier(i)
+
+        yield (identifier, rng.randint(0, 2**64))
+
+def get_variant_identifier(index):
+    """
+    Get the default identifier for the variant at |index|.
+    Identifiers are letters like spreadsheet columns: A, B, ..., Z, AA, AB, ..., ZZ, AAA, ....
+    """
+
+    if (index < 0):
+        raise ValueError("Variant index cannot be negative, found %d." % (index))
+
+    identifier = ''
+    index += 1
+
+    while (index > 0):
+        index, remainder = divmod(index - 1, len(string.ascii_uppercase))
+        identifier = string.ascii_uppercase[remainder] + identifier
+
+    return identifier
@@ -2,21 +2,48 @@
 Upload quizes to Canvas.
 """
 
+import concurrent.futures
+import copy
 import logging
 import os
+import threading
+import time
 import urllib.parse
 import re
 
 import requests
+import requests.adapters
 
 import quizcomp.common
 import quizcomp.constants
 import quizcomp.quiz
 import quizcomp.util.hash
+import quizcomp.util.json
 
-# TODO(eriq): This code assumes there will never be more than a page of items returned.
+# The number of items to ask for in each page of a listing (listings follow all pages, see fetch_all_pages()).
 PAGE_SIZE = 75
 
+# Course listings that are cached in an instance's context (see get_listing()).
+LISTING_QUIZZES = 'quizzes'
+LISTING_ASSIGNMENT_GROUPS = 'assignment_groups'
+LISTING_FOLDERS = 'folders'
+
+# The default number of requests to have in flight at the same time (e.g., when creating questions or uploading files).
+DEFAULT_JOBS = 4
+
+# Canvas gives each token a request "bucket" that refills over time,
+# and reports how much of it is left in this header.
+# When it gets low, we slow down (and if Canvas rejects a request for going over the limit, we wait and retry).
+RATE_LIMIT_HEADER = 'X-Rate-Limit-Remaining'
+RATE_LIMIT_LOW_REMAINING = 100.0
+RATE_LIMIT_WAIT_SECS = 1.0
+RATE_LIMIT_MAX_RETRIES = 5
+
+# The content hashes of what was last uploaded for each quiz (see sync_quiz()),
+# stored in the cache dir next to the quiz.
+SYNC_STATE_FILENAME = 'canvas-sync.json'
+_sync_state_lock = threading.Lock()
+
 CANVAS_QUIZCOMP_BASEDIR = '/quiz-composer'
 CANVAS_QUIZCOMP_QUIZ_DIRNAME = 'quiz'
 
@@ -64,21 +91,129 @@ ALLOWED_VALUES = {
 }
 
 class InstanceInfo(object):
-    def __init__(self, base_url, course_id, token):
+    def __init__(self, base_url, course_id, token,
+            jobs = DEFAULT_JOBS, rate_limit_wait_secs = RATE_LIMIT_WAIT_SECS):
+        """
+        |jobs| is the maximum number of requests that will be made at the same time
+        (and the number of connections that will be kept open),
+        even when several quizzes are being uploaded at once (see upload_quizzes()).
+        """
+
+        if (jobs < 1):
+            raise ValueError("Number of jobs must be at least 1, found %d." % (jobs))
+
         self.base_url = base_url
         self.course_id = course_id
         self.token = token
+        self.jobs = jobs
 
         self.context = {}
 
+        # Guards the context when it is shared between threads (e.g., cached listings).
+        self.context_lock = threading.RLock()
+
+        # {listing name: lock, ...} (see get_listing_lock()).
+        # Kept in a dict, so that it is shared with copies (see copy_for_quiz()).
+        self._listing_locks = {}
+
+        # A single session, so connections are reused (keep-alive) instead of making a new connection for every request.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize = jobs)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._request_slots = threading.BoundedSemaphore(jobs)
+
+        self._rate_limit_wait_secs = rate_limit_wait_secs
+        # Kept in a dict, so that it is shared with copies (see copy_for_quiz()).
+        self._rate_limit = {'remaining': None}
+        self._rate_limit_lock = threading.Lock()
+
+    def copy_for_quiz(self):
+        """
+        Get a copy of this instance that shares its session, request limits, and cached listings,
+        but has its own context for the data of a single quiz upload (e.g., the ids of uploaded files).
+        """
+
+        instance = copy.copy(self)
+
+        with self.context_lock:
+            instance.context = {
+                'listings': self.context.setdefault('listings', {}),
+            }
+
+        return instance
+
+    def get_listing_lock(self, name):
+        """
+        Get the lock for a single cached listing.
+        It is held while the listing is fetched (instead of the context lock),
+        so fetching one listing does not block other listings or the rest of the context.
+        """
+
+        with self.context_lock:
+            return self._listing_locks.setdefault(name, threading.RLock())
+
     def base_headers(self):
         return {
             "Authorization": "Bearer %s" % (self.token),
             "Accept": "application/json+canvas-string-ids",
         }
 
+    def request(self, method, url, **kwargs):
+        """
+        Make a request with this instance's session (the arguments are the same as requests.request()),
+        while respecting Canvas's rate limit.
+        Any files being uploaded are rewound before each attempt, so retries send the whole file again.
+        """
+
+        upload_files = _get_upload_files(kwargs.get('files', None))
+
+        for retry in range(RATE_LIMIT_MAX_RETRIES + 1):
+            for (file, position) in upload_files:
+                file.seek(position)
+
+            self._wait_for_rate_limit()
+
+            with self._request_slots:
+                response = self.session.request(method = method, url = url, **kwargs)
+
+            self._update_rate_limit(response)
+
+            if ((not _is_rate_limited(response)) or (retry == RATE_LIMIT_MAX_RETRIES)):
+                return response
+
+            wait_secs = self._rate_limit_wait_secs * (2 ** retry)
+            logging.debug("Canvas rate limit exceeded, retrying %s '%s' in %.2f seconds.", method, url, wait_secs)
+            time.sleep(wait_secs)
+
+        return response
+
+    def _wait_for_rate_limit(self):
+        with self._rate_limit_lock:
+            remaining = self._rate_limit['remaining']
+
+        if ((remaining is None) or (remaining >= RATE_LIMIT_LOW_REMAINING)):
+            return
+
+        # Wait longer the closer we are to the limit.
+        time.sleep(self._rate_limit_wait_secs * (1.0 - (max(0.0, remaining) / RATE_LIMIT_LOW_REMAINING)))
+
+    def _update_rate_limit(self, response):
+        value = response.headers.get(RATE_LIMIT_HEADER, None)
+        if (value is None):
+            return
+
+        try:
+            remaining = float(value)
+        except ValueError:
+            return
+
+        with self._rate_limit_lock:
+            self._rate_limit['remaining'] = remaining
+
 class CanvasUploader(object):
-    def __init__(self, instance, force = False, **kwargs):
+    def __init__(self, instance, force = False, sync = False, **kwargs):
         super().__init__(**kwargs)
 
         if (instance is None):
@@ -86,9 +221,13 @@ class CanvasUploader(object):
 
         self.instance = instance
         self.force = force
+        self.sync = sync
 
     def upload_quiz(self, quiz, **kwargs):
-        upload_quiz(quiz, self.instance, force = self.force);
+        return upload_quiz(quiz, self.instance, force = self.force, sync = self.sync)
+
+    def upload_quizzes(self, quizzes, jobs = 1, **kwargs):
+        return upload_quizzes(quizzes, self.instance, force = self.force, sync = self.sync, jobs = jobs)
 
 def validate_options(old_options):
     options = DEFAULT_CANVAS_OPTIONS.copy()
@@ -123,15 +262,27 @@ def _validate_allowed_attempts(allowed_attempts):
     return allowed_attempts
 
 
-def upload_quiz(quiz, instance, force = False):
+def upload_quiz(quiz, instance, force = False, sync = False):
     """
     Data may be written into the instance context.
+    If a quiz with the same title exists, then it is updated in-place when |sync| is true (see sync_quiz()),
+    deleted and recreated when |force| is true, and left alone (nothing is uploaded) otherwise.
+    Returns True if anything was uploaded.
     """
 
     if (not isinstance(quiz, quizcomp.quiz.Quiz)):
         raise ValueError("Canvas quiz uploader requires a quizcomp.quiz.Quiz type, found %s." % (type(quiz)))
 
     existing_ids = get_matching_quiz_ids(quiz.title, instance)
+
+    if ((len(existing_ids) > 0) and sync):
+        if (len(existing_ids) > 1):
+            logging.warning("Found %d quizzes with the name '%s', only syncing the first one (%s).",
+                    len(existing_ids), quiz.title, existing_ids[0])
+
+        sync_quiz(quiz, existing_ids[0], instance)
+        return True
+
     if ((len(existing_ids) > 0) and (not force)):
         logging.info("Found a quiz with a matching name '%s', skipping upload.", quiz.title)
         return False
@@ -143,10 +294,50 @@ def upload_quiz(quiz, instance, force = False):
     create_quiz(quiz, instance)
     return True
 
+def upload_quizzes(quizzes, instance, force = False, sync = False, jobs = 1):
+    """
+    Upload several quizzes (up to |jobs| quizzes at the same time).
+    All the uploads share the instance's session and cached listings
+    (and the instance's limit on the number of requests in flight).
+    A quiz that fails to upload does not stop the others.
+    Returns a result for each quiz (in the same order as the quizzes):
+    [{'title': str, 'uploaded': bool, 'error': <message or None>, 'seconds': float}, ...].
+    """
+
+    # Fetch the shared listings first, so that concurrent uploads don't wait on each other for them.
+    for name in [LISTING_QUIZZES, LISTING_ASSIGNMENT_GROUPS, LISTING_FOLDERS]:
+        get_listing(name, instance)
+
+    def _upload(quiz):
+        result = {
+            'title': quiz.title,
+            'uploaded': False,
+            'error': None,
+        }
+
+        start_time = time.time()
+
+        try:
+            result['uploaded'] = upload_quiz(quiz, instance.copy_for_quiz(), force = force, sync = sync)
+        except Exception as ex:
+            logging.error("Failed to upload quiz '%s'.", quiz.title, exc_info = ex)
+            result['error'] = quizcomp.common.get_error_message(ex)
+
+        result['seconds'] = time.time() - start_time
+
+        return result
+
+    return _run_parallel(_upload, quizzes, jobs)
+
 def upload_canvas_files(quiz, instance):
     """
     Canvas requires that images (and other files) be uploaded to their side (instead of embedded),
     so upload all images in one method so we don't upload duplicates.
+
+    Files are named by the hash of their contents,
+    so files that are already in the quiz's folder (with the same size) are not uploaded again
+    (e.g., when a quiz is re-uploaded or an earlier upload was interrupted),
+    and files with the same contents are only uploaded once.
     """
 
     # {path: <canvas file id>, ...}
@@ -156,53 +347,155 @@ def upload_canvas_files(quiz, instance):
     for group in quiz.groups:
         paths += group.collect_file_paths()
 
-    paths = set(paths)
+    paths = list(sorted(set(paths)))
+    if (len(paths) == 0):
+        return file_ids
 
+    # {canvas name: [path, ...], ...}
+    names = {}
     for path in paths:
-        canvas_path = '/'.join([
-            CANVAS_QUIZCOMP_BASEDIR,
-            CANVAS_QUIZCOMP_QUIZ_DIRNAME,
-            quiz.title,
-            quizcomp.util.hash.sha256(path) + os.path.splitext(path)[-1]
-        ])
+        name = quizcomp.util.hash.sha256_file(path) + os.path.splitext(path)[-1]
+        names.setdefault(name, []).append(path)
+
+    canvas_dir = '/'.join([
+        CANVAS_QUIZCOMP_BASEDIR,
+        CANVAS_QUIZCOMP_QUIZ_DIRNAME,
+        quiz.title,
+    ])
+
+    # All files go in the same folder, so make sure it exists (and see what it already has) before uploading.
+    parent_id = get_folder(canvas_dir, instance)
+
+    existing_files = {}
+    if (parent_id is None):
+        parent_id = ensure_folder(canvas_dir, instance)
+    else:
+        existing_files = get_folder_files(parent_id, instance)
+
+    upload_names = []
+    for (name, name_paths) in sorted(names.items()):
+        existing_file = existing_files.get(name, None)
+        if ((existing_file is not None) and (existing_file['size'] == os.path.getsize(name_paths[0]))):
+            logging.debug("Canvas file '%s' (for '%s') already exists, skipping upload.", name, name_paths[0])
+            for path in name_paths:
+                file_ids[path] = existing_file['id']
+
+            continue
+
+        upload_names.append(name)
 
-        file_id = upload_file(path, canvas_path, instance)
-        file_ids[path] = file_id
+    def _upload(name):
+        return upload_file(names[name][0], '/'.join([canvas_dir, name]), instance, parent_id = parent_id)
+
+    for (name, file_id) in zip(upload_names, _run_parallel(_upload, upload_names, instance.jobs)):
+        for path in names[name]:
+            file_ids[path] = file_id
 
     return file_ids
 
-def get_matching_quiz_ids(title, instance):
-    response = requests.request(
-        method = "GET",
-        url = "%s/api/v1/courses/%s/quizzes?per_page=%d" % (instance.base_url, instance.course_id, PAGE_SIZE),
-        headers = instance.base_headers())
-    response.raise_for_status()
+def get_folder_files(folder_id, instance):
+    """
+    Get the files in a folder: {name: {'id': <file id>, 'size': <size>}, ...}.
+    """
+
+    files = {}
+
+    url = "%s/api/v1/folders/%s/files" % (instance.base_url, folder_id)
+    for file in fetch_all_pages(url, instance):
+        files[file['display_name']] = {
+            'id': file['id'],
+            'size': file['size'],
+        }
+
+    return files
+
+def get_listing(name, instance, refresh = False):
+    """
+    Get all the items in one of a course's listings (e.g., LISTING_QUIZZES).
+    Listings are cached in the instance's context (under 'listings'),
+    so uploading many quizzes with the same instance only fetches each listing once.
+    Changes made through this module (e.g., creating or deleting a quiz) are kept up-to-date in the cache.
+    Only the listing's own lock is held while fetching (see InstanceInfo.get_listing_lock()),
+    so concurrent callers wait for the same fetch, but not for fetches of other listings.
+    """
+
+    with instance.get_listing_lock(name):
+        with instance.context_lock:
+            listings = instance.context.setdefault('listings', {})
+            if ((not refresh) and (name in listings)):
+                return listings[name]
+
+        url = "%s/api/v1/courses/%s/%s" % (instance.base_url, instance.course_id, name)
+        listing = fetch_all_pages(url, instance)
+
+        with instance.context_lock:
+            listings[name] = listing
+
+        return listing
+
+def clear_listing(name, instance):
+    with instance.get_listing_lock(name), instance.context_lock:
+        instance.context.get('listings', {}).pop(name, None)
+
+def _add_to_listing(name, item, instance):
+    # Wait for any fetch of the listing, so the change is not lost.
+    with instance.get_listing_lock(name), instance.context_lock:
+        listing = instance.context.get('listings', {}).get(name, None)
+        if (listing is not None):
+            listing.append(item)
+
+def _remove_from_listing(name, id, instance):
+    with instance.get_listing_lock(name), instance.context_lock:
+        listing = instance.context.get('listings', {}).get(name, None)
+        if (listing is not None):
+            listing[:] = [item for item in listing if (item['id'] != id)]
+
+def fetch_all_pages(url, instance):
+    """
+    Fetch every page of a Canvas listing by following the "next" links (from the Link header).
+    """
+
+    items = []
+    params = {'per_page': PAGE_SIZE}
+
+    while (url is not None):
+        response = instance.request(
+            method = "GET",
+            url = url,
+            headers = instance.base_headers(),
+            params = params)
+        response.raise_for_status()
+
+        items += response.json()
+
+        # The next link already has all the query parameters.
+        url = response.links.get('next', {}).get('url', None)
+        params = None
+
+    return items
 
+def get_matching_quiz_ids(title, instance):
     ids = []
-    for quiz in response.json():
+    for quiz in get_listing(LISTING_QUIZZES, instance):
         if (quiz['title'] == title):
             ids.append(quiz['id'])
 
     return ids
 
 def delete_quiz(quiz_id, instance):
-    response = requests.request(
+    response = instance.request(
         method = "DELETE",
         url = "%s/api/v1/courses/%s/quizzes/%s" % (instance.base_url, instance.course_id, quiz_id),
         headers = instance.base_headers())
     response.raise_for_status()
 
+    _remove_from_listing(LISTING_QUIZZES, quiz_id, instance)
+
 def fetch_assignment_group(name, instance):
     if (name is None):
         return None
 
-    response = requests.request(
-        method = "GET",
-        url = "%s/api/v1/courses/%s/assignment_groups?per_page=%d" % (instance.base_url, instance.course_id, PAGE_SIZE),
-        headers = instance.base_headers())
-    response.raise_for_status()
-
-    for assignment in response.json():
+    for assignment in get_listing(LISTING_ASSIGNMENT_GROUPS, instance):
         if (assignment['name'] == name):
             return assignment['id']
 
@@ -212,6 +505,37 @@ def create_quiz(quiz, instance):
     file_ids = upload_canvas_files(quiz, instance)
     instance.context['file_ids'] = file_ids
 
+    data = _create_quiz_json(quiz, instance)
+
+    response = instance.request(
+        method = "POST",
+        url = "%s/api/v1/courses/%s/quizzes" % (instance.base_url, instance.course_id),
+        headers = instance.base_headers(),
+        data = data)
+    response.raise_for_status()
+
+    quiz_id = response.json()['id']
+    _add_to_listing(LISTING_QUIZZES, {'id': quiz_id, 'title': quiz.title}, instance)
+
+    # Remember what was uploaded, so a later sync only has to change what is different.
+    state = _new_sync_state()
+    state['quiz'] = _hash_data(data)
+
+    # Groups are created in order, and then all the questions (which have explicit positions) are created in parallel.
+    questions_data = []
+    for question_group in quiz.groups:
+        group_id = _create_group(quiz_id, question_group, instance)
+        state['groups'].append({'id': group_id, 'hash': _hash_data(_create_group_json(question_group))})
+
+        questions_data += _create_group_questions_json(group_id, question_group, instance)
+
+    question_ids = _run_parallel(lambda data: _post_question(quiz_id, data, instance), questions_data, instance.jobs)
+    for (question_id, data) in zip(question_ids, questions_data):
+        state['questions'][question_id] = _hash_data(data)
+
+    save_sync_state(quiz, quiz_id, state, instance)
+
+def _create_quiz_json(quiz, instance):
     assignment_group_id = fetch_assignment_group(quiz.canvas['assignment_group_name'], instance)
 
     quiz_type = QUIZ_TYPE_ASSIGNMENT
@@ -234,47 +558,295 @@ def create_quiz(quiz, instance):
         'quiz[scoring_policy]': quiz.canvas['scoring_policy'],
     }
 
-    response = requests.request(
-        method = "POST",
-        url = "%s/api/v1/courses/%s/quizzes" % (instance.base_url, instance.course_id),
+    return data
+
+def sync_quiz(quiz, quiz_id, instance):
+    """
+    Update an existing Canvas quiz (|quiz_id|) in-place to match |quiz| (so the quiz keeps its id).
+    Everything is rendered just like when creating a quiz,
+    and the content hashes stored from the last upload (see get_sync_state_path()) are compared with the new content,
+    so requests are only made for the quiz settings, groups, and questions that have changed
+    (existing questions are updated instead of being deleted and recreated).
+    Without stored hashes (e.g., the quiz was uploaded from another machine), every question is updated.
+    Returns the number of changes (write requests) that were made.
+    """
+
+    file_ids = upload_canvas_files(quiz, instance)
+    instance.context['file_ids'] = file_ids
+
+    old_state = load_sync_state(quiz, quiz_id, instance)
+    state = _new_sync_state()
+    changes = 0
+
+    data = _create_quiz_json(quiz, instance)
+    state['quiz'] = _hash_data(data)
+    if (state['quiz'] != old_state['quiz']):
+        _update_quiz(quiz_id, data, instance)
+        changes += 1
+
+    existing_questions = fetch_quiz_questions(quiz_id, instance)
+
+    # Groups can not be listed, so the groups that still exist are the ones that the existing questions are in.
+    reported_group_ids = set()
+    for question in existing_questions:
+        group_id = question.get('quiz_group_id', None)
+        if (group_id is not None):
+            reported_group_ids.add(str(group_id))
+
+    # Groups are matched by their position.
+    # Stored groups that Canvas no longer reports are treated as missing (new groups are created in their positions).
+    # Groups without any stored hashes can only be found through their questions (and are taken in the order they were created).
+    old_group_ids = []
+    stale_group_ids = []
+    for group in old_state['groups']:
+        if (group['id'] in reported_group_ids):
+            old_group_ids.append(group['id'])
+        else:
+            old_group_ids.append(None)
+            stale_group_ids.append(group['id'])
+
+    old_group_ids += sorted(reported_group_ids - set(old_group_ids), key = _id_sort_key)
+
+    old_group_hashes = {group['id']: group['hash'] for group in old_state['groups']}
+
+    questions_data = []
+    for i in range(len(quiz.groups)):
+        question_group = quiz.groups[i]
+        group_data = _create_group_json(question_group)
+        group_hash = _hash_data(group_data)
+
+        group_id = None
+        if (i < len(old_group_ids)):
+            group_id = old_group_ids[i]
+
+        if (group_id is not None):
+            if (old_group_hashes.get(group_id, None) != group_hash):
+                group_id = _update_group(quiz_id, group_id, question_group, instance)
+                changes += 1
+        else:
+            group_id = _create_group(quiz_id, question_group, instance)
+            changes += 1
+
+        state['groups'].append({'id': group_id, 'hash': group_hash})
+        questions_data += _create_group_questions_json(group_id, question_group, instance)
+
+    # Only trust the stored hashes of questions that still exist.
+    existing_ids = [str(question['id']) for question in existing_questions]
+    old_question_hashes = old_state['questions']
+
+    # Questions with the same content (including their group and position) are left alone.
+    # {hash: [question id, ...], ...}
+    unchanged_ids = {}
+    for question_id in existing_ids:
+        question_hash = old_question_hashes.get(question_id, None)
+        if (question_hash is not None):
+            unchanged_ids.setdefault(question_hash, []).append(question_id)
+
+    changed_data = []
+    for data in questions_data:
+        question_hash = _hash_data(data)
+        matching_ids = unchanged_ids.get(question_hash, [])
+
+        if (len(matching_ids) > 0):
+            state['questions'][matching_ids.pop(0)] = question_hash
+        else:
+            changed_data.append(data)
+
+    # The remaining existing questions are reused for the changed ones, and any extras are deleted.
+    free_ids = [question_id for question_id in existing_ids if (question_id not in state['questions'])]
+    writes = []
+    for data in changed_data:
+        question_id = None
+        if (len(free_ids) > 0):
+            question_id = free_ids.pop(0)
+
+        writes.append((question_id, data))
+
+    def _write(write):
+        question_id, data = write
+        if (question_id is None):
+            return _post_question(quiz_id, data, instance)
+
+        _put_question(quiz_id, question_id, data, instance)
+        return question_id
+
+    question_ids = _run_parallel(_write, writes, instance.jobs)
+    for (question_id, (_, data)) in zip(question_ids, writes):
+        state['questions'][question_id] = _hash_data(data)
+
+    _run_parallel(lambda question_id: _delete_question(quiz_id, question_id, instance), free_ids, instance.jobs)
+    changes += len(writes) + len(free_ids)
+
+    # Stale groups are usually already gone, but may also just be empty.
+    for group_id in old_group_ids[len(quiz.groups):] + stale_group_ids:
+        if (group_id is None):
+            continue
+
+        _delete_group(quiz_id, group_id, instance)
+        changes += 1
+
+    save_sync_state(quiz, quiz_id, state, instance)
+
+    logging.info("Synced quiz '%s' (%s) with %d change(s).", quiz.title, quiz_id, changes)
+    return changes
+
+def fetch_quiz_questions(quiz_id, instance):
+    url = "%s/api/v1/courses/%s/quizzes/%s/questions" % (instance.base_url, instance.course_id, quiz_id)
+    return fetch_all_pages(url, instance)
+
+def _update_quiz(quiz_id, data, instance):
+    response = instance.request(
+        method = "PUT",
+        url = "%s/api/v1/courses/%s/quizzes/%s" % (instance.base_url, instance.course_id, quiz_id),
         headers = instance.base_headers(),
         data = data)
     response.raise_for_status()
 
-    quiz_id = response.json()['id']
+def _update_group(quiz_id, group_id, group, instance):
+    """
+    Update a group, and return its id.
+    Group ids from stored hashes may be for groups that were since deleted (groups can not be listed),
+    so a missing group is created again.
+    """
 
-    for question_group in quiz.groups:
-        create_question_group(quiz_id, question_group, instance)
+    response = instance.request(
+        method = "PUT",
+        url = "%s/api/v1/courses/%s/quizzes/%s/groups/%s" % (instance.base_url, instance.course_id, quiz_id, group_id),
+        headers = instance.base_headers(),
+        data = _create_group_json(group))
 
-def create_question_group(quiz_id, group, instance):
-    data = {
-        'quiz_groups[][name]': group.name,
-        'quiz_groups[][pick_count]': group.pick_count,
-        'quiz_groups[][question_points]': group.points,
+    if (response.status_code == 404):
+        return _create_group(quiz_id, group, instance)
+
+    response.raise_for_status()
+
+    return group_id
+
+def _delete_group(quiz_id, group_id, instance):
+    response = instance.request(
+        method = "DELETE",
+        url = "%s/api/v1/courses/%s/quizzes/%s/groups/%s" % (instance.base_url, instance.course_id, quiz_id, group_id),
+        headers = instance.base_headers())
+
+    # The group may already be gone.
+    if (response.status_code != 404):
+        response.raise_for_status()
+
+def _put_question(quiz_id, question_id, data, instance):
+    response = instance.request(
+        method = "PUT",
+        url = "%s/api/v1/courses/%s/quizzes/%s/questions/%s" % (instance.base_url, instance.course_id, quiz_id, question_id),
+        headers = instance.base_headers(),
+        data = data)
+    response.raise_for_status()
+
+def _delete_question(quiz_id, question_id, instance):
+    response = instance.request(
+        method = "DELETE",
+        url = "%s/api/v1/courses/%s/quizzes/%s/questions/%s" % (instance.base_url, instance.course_id, quiz_id, question_id),
+        headers = instance.base_headers())
+    response.raise_for_status()
+
+def get_sync_state_path(quiz):
+    return os.path.join(quiz.base_dir, quizcomp.constants.CACHE_DIRNAME, SYNC_STATE_FILENAME)
+
+def load_sync_state(quiz, quiz_id, instance):
+    """
+    Get the content hashes stored for the last upload of a quiz:
+    {'quiz': <hash>, 'groups': [{'id': <group id>, 'hash': <hash>}, ...], 'questions': {<question id>: <hash>, ...}}.
+    A quiz without any stored hashes gets empty ones.
+    """
+
+    state = _new_sync_state()
+    state.update(_load_sync_states(get_sync_state_path(quiz)).get(_get_sync_state_key(quiz_id, instance), {}))
+
+    return state
+
+def save_sync_state(quiz, quiz_id, state, instance):
+    path = get_sync_state_path(quiz)
+
+    # Several quizzes (in the same dir) may be uploaded at the same time.
+    with _sync_state_lock:
+        states = _load_sync_states(path)
+        states[_get_sync_state_key(quiz_id, instance)] = state
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            quizcomp.util.json.dump_path(states, path, sort_keys = True)
+        except OSError as ex:
+            logging.debug("Could not save Canvas sync state '%s': '%s'.", path, ex)
+
+def _load_sync_states(path):
+    if (not os.path.exists(path)):
+        return {}
+
+    try:
+        return quizcomp.util.json.load_path(path)
+    except Exception as ex:
+        logging.debug("Ignoring unreadable Canvas sync state '%s': '%s'.", path, ex)
+        return {}
+
+def _get_sync_state_key(quiz_id, instance):
+    return "%s/courses/%s/quizzes/%s" % (instance.base_url, instance.course_id, quiz_id)
+
+def _new_sync_state():
+    return {
+        'quiz': None,
+        'groups': [],
+        'questions': {},
     }
 
-    response = requests.request(
+def _id_sort_key(id):
+    # Canvas ids are increasing numbers (but are handled as strings).
+    if (id.isdigit()):
+        return (0, int(id))
+
+    return (1, id)
+
+def _hash_data(data):
+    return quizcomp.util.hash.sha256(quizcomp.util.json.dumps(data, sort_keys = True))
+
+def create_question_group(quiz_id, group, instance):
+    group_id = _create_group(quiz_id, group, instance)
+
+    questions_data = _create_group_questions_json(group_id, group, instance)
+    _run_parallel(lambda data: _post_question(quiz_id, data, instance), questions_data, instance.jobs)
+
+def _create_group(quiz_id, group, instance):
+    response = instance.request(
         method = "POST",
         url = "%s/api/v1/courses/%s/quizzes/%s/groups" % (instance.base_url, instance.course_id, quiz_id),
         headers = instance.base_headers(),
-        data = data)
+        data = _create_group_json(group))
     response.raise_for_status()
 
-    group_id = response.json()['quiz_groups'][0]['id']
+    return response.json()['quiz_groups'][0]['id']
+
+def _create_group_json(group):
+    return {
+        'quiz_groups[][name]': group.name,
+        'quiz_groups[][pick_count]': group.pick_count,
+        'quiz_groups[][question_points]': group.points,
+    }
 
-    for i in range(len(group.questions)):
-        create_question(quiz_id, group_id, group.questions[i], i, instance)
+def _create_group_questions_json(group_id, group, instance):
+    # Questions are rendered up-front (in order), and only their requests are made in parallel.
+    return [_create_question_json(group_id, group.questions[i], i, instance = instance) for i in range(len(group.questions))]
 
 def create_question(quiz_id, group_id, question, index, instance):
     data = _create_question_json(group_id, question, index, instance = instance)
+    _post_question(quiz_id, data, instance)
 
-    response = requests.request(
+def _post_question(quiz_id, data, instance):
+    response = instance.request(
         method = "POST",
         url = "%s/api/v1/courses/%s/quizzes/%s/questions" % (instance.base_url, instance.course_id, quiz_id),
         headers = instance.base_headers(),
         data = data)
     response.raise_for_status()
 
+    return str(response.json()['id'])
+
 def _create_question_json(group_id, question, index, instance = None):
     question_type = QUESTION_TYPE_MAP[question.question_type]
 
@@ -422,10 +994,17 @@ def _serialize_numeric_answers(data, answers, instance):
             feedback_text = answer.feedback.document.to_canvas(canvas_instance = instance, pretty = False)
             data[f"question[answers][{i}][answer_comment_html]"] = feedback_text
 
-def upload_file(path, canvas_path, instance):
-    parent_id = ensure_folder(os.path.dirname(canvas_path), instance)
+def upload_file(path, canvas_path, instance, parent_id = None):
+    """
+    Upload a file to |canvas_path|.
+    If the id of the parent folder (|parent_id|) is not given, then the folder will be created if it does not exist.
+    """
+
+    if (parent_id is None):
+        parent_id = ensure_folder(os.path.dirname(canvas_path), instance)
+
     upload_url, upload_params = _init_file_upload(path, canvas_path, parent_id, instance)
-    file_id = _upload_file_contents(path, upload_url, upload_params)
+    file_id = _upload_file_contents(path, upload_url, upload_params, instance)
 
     return file_id
 
@@ -441,7 +1020,7 @@ def _init_file_upload(path, canvas_path, parent_id, instance):
         'on_duplicate': 'overwrite',
     }
 
-    response = requests.request(
+    response = instance.request(
         method = "POST",
         url = "%s/api/v1/courses/%s/files" % (instance.base_url, instance.course_id),
         headers = instance.base_headers(),
@@ -455,16 +1034,14 @@ def _init_file_upload(path, canvas_path, parent_id, instance):
 
     return upload_url, upload_params
 
-def _upload_file_contents(path, upload_url, upload_params):
-    files = {
-        'file': open(path, 'rb'),
-    }
-
-    response = requests.request(
-        method = "POST",
-        url = upload_url,
-        data = upload_params,
-        files = files)
+def _upload_file_contents(path, upload_url, upload_params, instance):
+    # The upload URL may be on another host, so the Canvas auth headers are not sent.
+    with open(path, 'rb') as file:
+        response = instance.request(
+            method = "POST",
+            url = upload_url,
+            data = upload_params,
+            files = {'file': file})
     response.raise_for_status()
 
     location = response.headers.get('Location', None)
@@ -476,30 +1053,39 @@ def _upload_file_contents(path, upload_url, upload_params):
     return file_id
 
 def ensure_folder(canvas_path, instance):
-    folder_id = get_folder(canvas_path, instance)
-    if (folder_id is not None):
-        return folder_id
+    # Hold the folder listing's lock, so concurrent uploads don't create the same (parent) folders at the same time.
+    with instance.get_listing_lock(LISTING_FOLDERS):
+        folder_id = get_folder(canvas_path, instance)
+        if (folder_id is not None):
+            return folder_id
 
-    folder_id = create_folder(canvas_path, instance)
+        folder_id = create_folder(canvas_path, instance)
 
-    # Canvas will not hide created parents.
-    hide_folder(CANVAS_QUIZCOMP_BASEDIR, instance)
+        # Canvas will not hide created parents.
+        hide_folder(CANVAS_QUIZCOMP_BASEDIR, instance)
 
     return folder_id
 
 def get_folder(canvas_path, instance):
-    # The canvas path should be absolute.
-    response = requests.request(
-        method = "GET",
-        url = "%s/api/v1/courses/%s/folders/by_path%s" % (instance.base_url, instance.course_id, canvas_path),
-        headers = instance.base_headers())
+    """
+    Get the id of a folder (or None if it does not exist) using the (cached) folder listing.
+    The canvas path should be absolute.
+    """
 
-    if (response.status_code == 404):
+    folders = get_listing(LISTING_FOLDERS, instance)
+
+    # Canvas gives full names relative to the course's root folder (the only folder without a parent).
+    root_names = [folder['full_name'] for folder in folders if (folder.get('parent_folder_id', None) is None)]
+    if (len(root_names) == 0):
         return None
 
-    response.raise_for_status()
+    full_name = root_names[0] + canvas_path.rstrip('/')
+
+    for folder in folders:
+        if (folder['full_name'] == full_name):
+            return folder['id']
 
-    return response.json()[-1]['id']
+    return None
 
 def create_folder(canvas_path, instance):
     name = os.path.basename(canvas_path)
@@ -512,7 +1098,7 @@ def create_folder(canvas_path, instance):
         'hidden': 'true',
     }
 
-    response = requests.request(
+    response = instance.request(
         method = "POST",
         url = "%s/api/v1/courses/%s/folders" % (instance.base_url, instance.course_id),
         headers = instance.base_headers(),
@@ -521,6 +1107,9 @@ def create_folder(canvas_path, instance):
 
     folder_id = response.json()['id']
 
+    # Canvas may have also created parent folders, so the folder listing has to be fetched again.
+    clear_listing(LISTING_FOLDERS, instance)
+
     return folder_id
 
 def hide_folder(canvas_path, instance):
@@ -534,9 +1123,53 @@ def hide_folder_id(folder_id, instance):
         'hidden': 'true',
     }
 
-    response = requests.request(
+    response = instance.request(
         method = "PUT",
         url = "%s/api/v1/folders/%s" % (instance.base_url, folder_id),
         headers = instance.base_headers(),
         data = data)
     response.raise_for_status()
+
+def _run_parallel(function, items, jobs):
+    """
+    Call |function| on each item (using up to |jobs| threads),
+    and return the results in the same order as the items.
+    """
+
+    if ((jobs <= 1) or (len(items) <= 1)):
+        return [function(item) for item in items]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = min(jobs, len(items))) as executor:
+        return list(executor.map(function, items))
+
+def _get_upload_files(files):
+    """
+    Get the file objects in the |files| argument of a request (see requests.request()),
+    along with their current positions: [(file, position), ...].
+    """
+
+    if (files is None):
+        return []
+
+    if (isinstance(files, dict)):
+        values = files.values()
+    else:
+        values = [value for (_, value) in files]
+
+    upload_files = []
+    for value in values:
+        # Files may be given as a tuple: (filename, file, ...).
+        if (isinstance(value, (tuple, list)) and (len(value) > 1)):
+            value = value[1]
+
+        if (hasattr(value, 'seek') and hasattr(value, 'tell')):
+            upload_files.append((value, value.tell()))
+
+    return upload_files
+
+def _is_rate_limited(response):
+    # Canvas uses a 403 (with a message in the body) when the rate limit is exceeded.
+    if (response.status_code == 429):
+        return True
+
+    return ((response.status_code == 403) and ('rate limit exceeded' in response.text.lower()))
@@ -0,0 +1,150 @@
+"""
+A simple persistent on-disk cache.
+
+Entries are stored as individual files named by the SHA-256 of their key,
+so the cache can be safely shared between processes
+(writes are atomic, and a missing entry is always just a miss).
+When the cache grows past its size limit, the least recently used entries are evicted
+(an entry's modification time is updated every time it is read).
+"""
+
+import logging
+import os
+import threading
+import uuid
+
+import quizcomp.util.hash
+import quizcomp.util.json
+
+DEFAULT_MAX_SIZE_BYTES = 64 * 1024 * 1024
+
+# When evicting, evict down to this fraction of the max size (to avoid evicting on every write).
+EVICTION_TARGET_FRACTION = 0.9
+
+ENCODING = 'utf-8'
+
+class DiskCache(object):
+    def __init__(self, base_dir, max_size_bytes = DEFAULT_MAX_SIZE_BYTES):
+        self.base_dir = os.path.abspath(base_dir)
+        self.max_size_bytes = max_size_bytes
+
+        # The (approximate) size of the cache, lazily computed.
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get(self, key, binary = False):
+        """
+        Get the value for a key, or None if the key is not in the cache.
+        """
+
+        path = self._get_path(key)
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        if (binary):
+            return data
+
+        return data.decode(ENCODING)
+
+    def put(self, key, value):
+        if (isinstance(value, str)):
+            value = value.encode(ENCODING)
+
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        # Write to a temp file and then move into place so readers never see a partial entry.
+        temp_path = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+        with open(temp_path, 'wb') as file:
+            file.write(value)
+
+        # An existing entry is replaced, so its size no longer counts.
+        try:
+            old_size = os.stat(path).st_size
+        except FileNotFoundError:
+            old_size = 0
+
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if (self._size is None):
+                self._size = self._compute_size()
+            else:
+                self._size += len(value) - old_size
+
+            if (self._size > self.max_size_bytes):
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            for (path, _, _) in self._list_entries():
+                _remove(path)
+
+            self._size = 0
+
+    def _get_path(self, key):
+        """
+        Keys may be any JSON-serializable value.
+        """
+
+        if (not isinstance(key, str)):
+            key = quizcomp.util.json.dumps(key, sort_keys = True)
+
+        digest = quizcomp.util.hash.sha256(key)
+        return os.path.join(self.base_dir, digest[0:2], digest)
+
+    def _list_entries(self):
+        """
+        Get all the entries in the cache as: [(path, size, mtime), ...].
+        """
+
+        entries = []
+
+        if (not os.path.isdir(self.base_dir)):
+            return entries
+
+        for dirent in os.scandir(self.base_dir):
+            if (not dirent.is_dir()):
+                continue
+
+            for entry in os.scandir(dirent.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _compute_size(self):
+        return sum([size for (_, size, _) in self._list_entries()])
+
+    def _evict(self):
+        entries = sorted(self._list_entries(), key = lambda entry: entry[2])
+        size = sum([size for (_, size, _) in entries])
+        target_size = self.max_size_bytes * EVICTION_TARGET_FRACTION
+
+        count = 0
+        for (path, entry_size, _) in entries:
+            if (size <= target_size):
+                break
+
+            _remove(path)
+            size -= entry_size
+            count += 1
+
+        logging.debug("Evicted %d entries from cache '%s'.", count, self.base_dir)
+        self._size = size
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,9 +1,39 @@
 import hashlib
+import os
 
 ENCODING = 'utf-8'
+BLOCK_SIZE = 64 * 1024
 
 def sha256(data):
     if (isinstance(data, str)):
         data = data.encode(ENCODING)
 
     return hashlib.sha256(data).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(BLOCK_SIZE), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def sha256_dir(path):
+    """
+    Hash the relative paths and contents of all the files in a directory (recursively).
+    """
+
+    digest = hashlib.sha256()
+
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        dirnames.sort()
+
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(file_path, path).replace(os.sep, '/')
+
+            digest.update(relpath.encode(ENCODING))
+            digest.update(sha256_file(file_path).encode(ENCODING))
+
+    return digest.hexdigest()
@@ -2,31 +2,57 @@
 This file standardizes how we write and read JSON files.
 Specifically, we try to be flexible when reading (using JSON5),
 and strict when writing (using vanilla JSON).
+
+Since JSON5 is a superset of JSON and most of our input is vanilla JSON,
+reading will first try the (much faster) standard JSON parser,
+and only fall back to JSON5 when the standard parser fails.
 """
 
 import json
 
 import json5
 
-def load(file_obj, **kwargs):
-    return json5.load(file_obj, **kwargs)
+def load(file_obj, strict = False, **kwargs):
+    return loads(file_obj.read(), strict = strict, **kwargs)
+
+def loads(text, strict = False, **kwargs):
+    """
+    Load JSON5 text.
+    If |strict| is true, then only vanilla JSON will be allowed.
+    """
+
+    try:
+        return json.loads(text, **kwargs)
+    except json.JSONDecodeError:
+        if (strict):
+            raise
 
-def loads(text, **kwargs):
     return json5.loads(text, **kwargs)
 
-def load_path(path, **kwargs):
+def load_path(path, strict = False, **kwargs):
     try:
         with open(path, 'r') as file:
-            return load(file, **kwargs)
+            return load(file, strict = strict, **kwargs)
     except Exception as ex:
         raise ValueError(f"Failed to read JSON file '{path}'.") from ex
 
-def dump(data, file_obj, **kwargs):
+def dump(data, file_obj, strict = False, **kwargs):
+    """
+    Write vanilla JSON.
+    If |strict| is true, then non-standard values (NaN and infinities) will raise an error instead of being written.
+    """
+
+    if (strict):
+        kwargs['allow_nan'] = False
+
     return json.dump(data, file_obj, **kwargs)
 
-def dumps(data, **kwargs):
+def dumps(data, strict = False, **kwargs):
+    if (strict):
+        kwargs['allow_nan'] = False
+
     return json.dumps(data, **kwargs)
 
-def dump_path(data, path, **kwargs):
+def dump_path(data, path, strict = False, **kwargs):
     with open(path, 'w') as file:
-        dump(data, file, **kwargs)
+        dump(data, file, strict = strict, **kwargs)
@@ -0,0 +1,220 @@
+"""
+Watch a quiz's files and keep the loaded quiz up-to-date as they change.
+
+Changes are found by polling (stat'ing every file the quiz was loaded from),
+so no platform-specific file notification support is needed.
+Files that only belong to a question (its JSON file, prompt, and images) only cause that question to be reloaded,
+while any other change (the quiz file, its description, or a question being added to or removed from a group's dirs)
+reloads the whole quiz (which is still fast for unchanged questions when the question cache is enabled).
+Only the files that a quiz is loaded from are watched,
+so other files in the same dirs (e.g., editor swap files and backups) do not cause any reloads.
+"""
+
+import logging
+import os
+import time
+
+import quizcomp.constants
+import quizcomp.index
+import quizcomp.question.base
+import quizcomp.quiz
+import quizcomp.util.json
+
+DEFAULT_INTERVAL_SECS = 1.0
+
+class QuizWatcher(object):
+    def __init__(self, path, **kwargs):
+        """
+        Load the quiz at |path| (any |kwargs| are passed to quizcomp.quiz.Quiz.from_path()).
+        """
+
+        self.path = os.path.abspath(path)
+        self._kwargs = kwargs
+
+        self.quiz = None
+
+        # {path: (mtime_ns, size) or None, ...}
+        self._stats = {}
+
+        # The files that only affect specific questions.
+        # {path: [(group index, question index), ...], ...}
+        self._question_files = {}
+
+        # All the question files in the dirs that groups look for questions in (to notice added/removed questions).
+        # [path, ...]
+        self._group_question_paths = []
+
+        self.quiz = quizcomp.quiz.Quiz.from_path(self.path, **self._kwargs)
+        self._update_files()
+
+    def poll(self):
+        """
+        Check for changes and reload whatever they affect.
+        Returns True if the quiz changed.
+        Load errors are logged (and the last good quiz is kept), since they are usually fixed by a later change.
+        """
+
+        changed_paths = []
+        for (path, old_stat) in self._stats.items():
+            new_stat = _get_stat(path)
+            if (new_stat != old_stat):
+                changed_paths.append(path)
+                self._stats[path] = new_stat
+
+        group_question_paths = self._find_group_question_paths()
+        questions_changed = (group_question_paths != self._group_question_paths)
+        self._group_question_paths = group_question_paths
+
+        if ((len(changed_paths) == 0) and (not questions_changed)):
+            return False
+
+        for path in changed_paths:
+            logging.info("Detected change: '%s'.", path)
+
+        if (questions_changed):
+            logging.info("Detected added or removed questions.")
+
+        try:
+            if (questions_changed or any([(path not in self._question_files) for path in changed_paths])):
+                self._reload_quiz()
+            else:
+                self._reload_questions(changed_paths)
+        except Exception as ex:
+            logging.error("Failed to reload quiz '%s'.", self.path, exc_info = ex)
+            return False
+
+        return True
+
+    def _reload_quiz(self):
+        logging.info("Reloading quiz '%s'.", self.path)
+
+        self.quiz = quizcomp.quiz.Quiz.from_path(self.path, **self._kwargs)
+        self._update_files()
+
+    def _reload_questions(self, changed_paths):
+        locations = set()
+        for path in changed_paths:
+            locations |= set(self._question_files[path])
+
+        for (group_index, question_index) in sorted(locations):
+            group = self.quiz.groups[group_index]
+            path = group.questions[question_index]._path
+
+            logging.info("Reloading question '%s'.", path)
+
+            question = quizcomp.question.base.Question.from_path(path)
+            question.inherit_from_group(group)
+
+            group.questions[question_index] = question
+
+        self._update_files()
+
+    def _update_files(self):
+        """
+        Collect (and stat) all the files that the current quiz depends on.
+        """
+
+        quiz_paths = [self.path, os.path.splitext(self.path)[0] + '.md']
+        quiz_paths += self.quiz.description.document.collect_file_paths(self.quiz.base_dir)
+        self._group_question_paths = self._find_group_question_paths()
+
+        question_files = {}
+        for group_index in range(len(self.quiz.groups)):
+            questions = self.quiz.groups[group_index].questions
+            for question_index in range(len(questions)):
+                question = questions[question_index]
+
+                paths = [question._path, question._prompt_path]
+                paths += question.collect_file_paths()
+
+                for path in paths:
+                    if (path is None):
+                        continue
+
+                    question_files.setdefault(os.path.abspath(path), []).append((group_index, question_index))
+
+        stats = {}
+        for path in quiz_paths + list(question_files.keys()):
+            path = os.path.abspath(path)
+            stats[path] = _get_stat(path)
+
+            # Files shared with the quiz itself always reload the whole quiz.
+            if (path in quiz_paths):
+                question_files.pop(path, None)
+
+        self._stats = stats
+        self._question_files = question_files
+
+    def _find_group_question_paths(self):
+        """
+        Find all the question files in the dirs that groups look for questions in
+        (the same way that groups find them, see quizcomp.index.find_resources()),
+        so that adding or removing a question reloads the quiz.
+        """
+
+        try:
+            data = quizcomp.util.json.load_path(self.path)
+        except Exception:
+            return []
+
+        paths = []
+        for group_info in data.get('groups', []):
+            for path in group_info.get('questions', []):
+                path = os.path.abspath(os.path.join(self.quiz.base_dir, path))
+                if (not os.path.isdir(path)):
+                    continue
+
+                paths += quizcomp.index.find_resources(path, quizcomp.constants.TYPE_QUESTION)
+
+        return paths
+
+def watch(path, callback, interval = DEFAULT_INTERVAL_SECS, max_polls = None, **kwargs):
+    """
+    Load the quiz at |path| and call |callback| with it,
+    then poll for changes every |interval| seconds and call |callback| again with the updated quiz after each change.
+    Runs until interrupted (or until |max_polls| polls have been done).
+    Errors from |callback| are logged and do not stop watching.
+    """
+
+    watcher = QuizWatcher(path, **kwargs)
+    _run_callback(callback, watcher.quiz)
+
+    logging.info("Watching quiz '%s' for changes (Ctrl-C to stop).", watcher.path)
+
+    poll_count = 0
+    try:
+        while ((max_polls is None) or (poll_count < max_polls)):
+            time.sleep(interval)
+            poll_count += 1
+
+            if (watcher.poll()):
+                _run_callback(callback, watcher.quiz)
+    except KeyboardInterrupt:
+        pass
+
+    return watcher
+
+def _run_callback(callback, quiz):
+    try:
+        callback(quiz)
+    except Exception as ex:
+        logging.error("Failed to process quiz '%s'.", quiz.title, exc_info = ex)
+
+def _get_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+def set_cli_args(parser):
+    parser.add_argument('--watch', dest = 'watch',
+        action = 'store_true', default = False,
+        help = 'Keep running and redo the output whenever the quiz (or any of its files) changes (default: %(default)s).')
+
+    parser.add_argument('--watch-interval', dest = 'watch_interval',
+        action = 'store', type = float, default = DEFAULT_INTERVAL_SECS,
+        help = 'The number of seconds between checks for changes when watching (default: %(default)s).')
+
+    return parser
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Compare the time to load all the JSON files in the test corpus
+using only JSON5 against quizcomp.util.json (which tries the standard JSON parser first).
+"""
+
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+import json5
+
+THIS_DIR = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+ROOT_DIR = os.path.join(THIS_DIR, '..')
+sys.path.insert(0, ROOT_DIR)
+
+import quizcomp.util.json
+
+DEFAULT_DIR = os.path.join(ROOT_DIR, 'tests')
+
+def run(args):
+    paths = list(sorted(glob.glob(os.path.join(args.dir, '**', '*.json'), recursive = True)))
+    if (len(paths) == 0):
+        print(f"No JSON files found in '{args.dir}'.")
+        return 1
+
+    texts = []
+    for path in paths:
+        with open(path, 'r') as file:
+            texts.append(file.read())
+
+    size = sum([len(text) for text in texts])
+    print("Loading %d files (%d characters), best of %d runs." % (len(texts), size, args.runs))
+
+    loaders = [
+        ('json5', json5.loads),
+        ('quizcomp.util.json', quizcomp.util.json.loads),
+    ]
+
+    times = []
+    for (name, loader) in loaders:
+        seconds = min(timeit.repeat(lambda: [loader(text) for text in texts], number = 1, repeat = args.runs))
+        times.append(seconds)
+
+        print("    %-20s %10.4f s" % (name, seconds))
+
+    print("Speedup: %.1fx" % (times[0] / times[1]))
+
+    return 0
+
+def _get_parser():
+    parser = argparse.ArgumentParser(description = __doc__.strip())
+
+    parser.add_argument('dir', metavar = 'DIR',
+        type = str, nargs = '?', default = DEFAULT_DIR,
+        help = 'The directory to (recursively) load JSON files from (default: %(default)s).')
+
+    parser.add_argument('--runs', dest = 'runs',
+        action = 'store', type = int, default = 3,
+        help = 'The number of times to load the files (the best time is reported) (default: %(default)s).')
+
+    return parser
+
+def main():
+    return run(_get_parser().parse_args())
+
+if (__name__ == '__main__'):
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import os
+import time
+
+import quizcomp.util.cache
+import quizcomp.util.dirent
+import tests.base
+
+class TestDiskCache(tests.base.BaseTest):
+    def setUp(self):
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-cache-')
+
+    def test_get_put(self):
+        cache = quizcomp.util.cache.DiskCache(self._temp_dir)
+
+        self.assertIsNone(cache.get('a'))
+
+        cache.put('a', 'A')
+        cache.put(['html', True, '1.0', 'x'], 'X')
+        cache.put('binary', b'\x00\x01')
+
+        self.assertEqual('A', cache.get('a'))
+        self.assertEqual('X', cache.get(['html', True, '1.0', 'x']))
+        self.assertIsNone(cache.get(['html', False, '1.0', 'x']))
+        self.assertEqual(b'\x00\x01', cache.get('binary', binary = True))
+
+    def test_persistent(self):
+        quizcomp.util.cache.DiskCache(self._temp_dir).put('a', 'A')
+        self.assertEqual('A', quizcomp.util.cache.DiskCache(self._temp_dir).get('a'))
+
+    def test_clear(self):
+        cache = quizcomp.util.cache.DiskCache(self._temp_dir)
+        cache.put('a', 'A')
+        cache.clear()
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_eviction(self):
+        cache = quizcomp.util.cache.DiskCache(self._temp_dir, max_size_bytes = 35)
+
+        for key in ['a', 'b']:
+            cache.put(key, '0123456789')
+            _age(cache, key)
+
+        # Use 'a', so 'b' is the least recently used.
+        cache.get('a')
+
+        cache.put('c', '0123456789')
+        cache.put('d', '0123456789')
+
+        self.assertEqual('0123456789', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('0123456789', cache.get('d'))
+
+    def test_overwrite_size(self):
+        cache = quizcomp.util.cache.DiskCache(self._temp_dir, max_size_bytes = 35)
+
+        cache.put('a', '0123456789')
+        cache.put('b', '0123456789')
+
+        # Replacing an entry does not grow the cache.
+        for i in range(5):
+            cache.put('a', '9876543210')
+
+        self.assertEqual(20, cache._size)
+        self.assertEqual('9876543210', cache.get('a'))
+        self.assertEqual('0123456789', cache.get('b'))
+
+def _age(cache, key):
+    # Push the access time into the past so that ordering does not depend on timestamp resolution.
+    path = cache._get_path(key)
+    past = time.time() - 100
+    os.utime(path, (past, past))
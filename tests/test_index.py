@@ -0,0 +1,108 @@
+import glob
+import os
+import shutil
+
+import quizcomp.constants
+import quizcomp.index
+import quizcomp.util.dirent
+import tests.base
+
+class TestIndex(tests.base.BaseTest):
+    def setUp(self):
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-index-')
+        self._base_dir = os.path.join(self._temp_dir, 'tests')
+
+        # Quizzes reference questions relative to themselves, so keep the same layout.
+        for dir in [tests.base.QUESTIONS_DIR, tests.base.QUIZZES_DIR]:
+            shutil.copytree(dir, os.path.join(self._base_dir, os.path.basename(dir)))
+
+    def _glob(self, filename, dir = None):
+        if (dir is None):
+            dir = self._base_dir
+
+        return list(sorted(glob.glob(os.path.join(dir, '**', filename), recursive = True)))
+
+    def test_refresh(self):
+        index = quizcomp.index.ResourceIndex(self._base_dir)
+        self.assertGreater(index.refresh(), 0)
+
+        self.assertEqual(self._glob(quizcomp.constants.QUIZ_FILENAME), index.find(quizcomp.constants.TYPE_QUIZ))
+        self.assertEqual(self._glob(quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+
+        # A new index is loaded from disk, and nothing has changed.
+        index = quizcomp.index.ResourceIndex(self._base_dir)
+        self.assertEqual(0, index.refresh())
+        self.assertEqual(self._glob(quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+
+        # Only the dirs that changed are listed again.
+        question_dir = os.path.dirname(self._glob(quizcomp.constants.QUESTION_FILENAME)[0])
+        new_dir = os.path.join(os.path.dirname(question_dir), 'new-question')
+        shutil.copytree(question_dir, new_dir)
+
+        index = quizcomp.index.ResourceIndex(self._base_dir)
+        self.assertEqual(2, index.refresh())
+        self.assertIn(os.path.join(new_dir, quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+
+        shutil.rmtree(new_dir)
+        index.refresh()
+        self.assertEqual(self._glob(quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+
+    def test_find_dir(self):
+        index = quizcomp.index.ResourceIndex(self._base_dir, path = False)
+        index.refresh()
+
+        dir = os.path.dirname(self._glob(quizcomp.constants.QUIZ_FILENAME)[0])
+        self.assertEqual(self._glob(quizcomp.constants.QUESTION_FILENAME, dir = dir), index.find(quizcomp.constants.TYPE_QUESTION, dir = dir))
+
+        self.assertIsNone(index.find(quizcomp.constants.TYPE_QUESTION, dir = self._temp_dir))
+
+    def test_entry(self):
+        index = quizcomp.index.ResourceIndex(self._base_dir, path = False)
+        index.refresh()
+
+        path = os.path.join(self._base_dir, 'quizzes', 'good', 'all-basic-questions', quizcomp.constants.QUIZ_FILENAME)
+        entry = index.get(path)
+
+        self.assertEqual(quizcomp.constants.TYPE_QUIZ, entry['type'])
+        self.assertEqual(os.path.getsize(path), entry['size'])
+        self.assertGreater(len(entry['dependencies']), 0)
+
+        for dependency in entry['dependencies']:
+            self.assertTrue(os.path.exists(os.path.join(self._base_dir, dependency)))
+
+    def test_find_resources_registered(self):
+        index = quizcomp.index.ResourceIndex(self._base_dir)
+
+        dir = os.path.join(self._base_dir, 'questions', 'good')
+        expected = self._glob(quizcomp.constants.QUESTION_FILENAME, dir = dir)
+
+        quizcomp.index.register(index)
+        try:
+            self.assertEqual(expected, quizcomp.index.find_resources(dir, quizcomp.constants.TYPE_QUESTION))
+
+            # Lookups notice changes.
+            shutil.rmtree(os.path.dirname(expected[0]))
+            self.assertEqual(expected[1:], quizcomp.index.find_resources(dir, quizcomp.constants.TYPE_QUESTION))
+        finally:
+            quizcomp.index.unregister(index)
+
+        # Lookups do not store the index.
+        self.assertFalse(os.path.exists(index.path))
+
+    def test_refresh_dir(self):
+        index = quizcomp.index.ResourceIndex(self._base_dir, path = False)
+        index.refresh()
+
+        quizzes = self._glob(quizcomp.constants.QUIZ_FILENAME)
+        question_dir = os.path.dirname(self._glob(quizcomp.constants.QUESTION_FILENAME)[0])
+        shutil.rmtree(question_dir)
+
+        # Only the refreshed part of the index changes.
+        quizzes_dir = os.path.join(self._base_dir, 'quizzes')
+        self.assertEqual(0, index.refresh(dir = quizzes_dir))
+        self.assertIn(os.path.join(question_dir, quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+        self.assertEqual(quizzes, index.find(quizcomp.constants.TYPE_QUIZ))
+
+        index.refresh(dir = os.path.join(self._base_dir, 'questions'))
+        self.assertEqual(self._glob(quizcomp.constants.QUESTION_FILENAME), index.find(quizcomp.constants.TYPE_QUESTION))
+        self.assertEqual(quizzes, index.find(quizcomp.constants.TYPE_QUIZ))
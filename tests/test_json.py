@@ -0,0 +1,30 @@
+import io
+import math
+
+import quizcomp.util.json
+import tests.base
+
+class TestJSON(tests.base.BaseTest):
+    def test_loads(self):
+        cases = [
+            ('{"a": [1, 2.5, "x", null, true]}', {'a': [1, 2.5, 'x', None, True]}),
+            # JSON5 (which uses the fallback parser).
+            ("{a: 1, // Comment.\n 'b': [1, 2,],}", {'a': 1, 'b': [1, 2]}),
+        ]
+
+        for (text, expected) in cases:
+            with self.subTest(text = text):
+                self.assertEqual(expected, quizcomp.util.json.loads(text))
+                self.assertEqual(expected, quizcomp.util.json.load(io.StringIO(text)))
+
+    def test_loads_strict(self):
+        self.assertEqual({'a': 1}, quizcomp.util.json.loads('{"a": 1}', strict = True))
+
+        with self.assertRaises(ValueError):
+            quizcomp.util.json.loads('{a: 1}', strict = True)
+
+    def test_dumps_strict(self):
+        self.assertEqual('NaN', quizcomp.util.json.dumps(math.nan))
+
+        with self.assertRaises(ValueError):
+            quizcomp.util.json.dumps(math.nan, strict = True)
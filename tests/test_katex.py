@@ -0,0 +1,140 @@
+import os
+import shutil
+import unittest.mock
+
+import quizcomp.constants
+import quizcomp.katex
+import quizcomp.parser.math
+import quizcomp.parser.public
+import quizcomp.util.dirent
+import tests.base
+
+# A stand-in for the `katex` NodeJS package.
+# The real package is not required to test the worker protocol.
+FAKE_KATEX_SOURCE = r"""
+module.exports = {
+    version: '0.0.0-test',
+    renderToString: function(text, options) {
+        if (text === 'crash') {
+            process.exit(1);
+        }
+
+        if (text === 'bad') {
+            throw new Error('Bad expression.');
+        }
+
+        return '<math>' + text + '</math>';
+    },
+};
+"""
+
+class TestKatex(tests.base.BaseTest):
+    """
+    Test the KaTeX worker using a fake `katex` package.
+    """
+
+    def setUp(self):
+        if (shutil.which('node') is None):
+            self.skipTest("NodeJS is not available.")
+
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-katex-')
+
+        package_dir = os.path.join(self._temp_dir, 'node_modules', 'katex')
+        os.makedirs(package_dir)
+        quizcomp.util.dirent.write_file(os.path.join(package_dir, 'index.js'), FAKE_KATEX_SOURCE)
+        quizcomp.util.dirent.write_file(os.path.join(package_dir, 'package.json'), '{"version": "0.0.0-test"}')
+
+    def tearDown(self):
+        quizcomp.katex.shutdown()
+
+    def test_render(self):
+        self.assertEqual("<math>x^2</math>\n", quizcomp.katex.to_html('x^2', cwd = self._temp_dir))
+
+    def test_render_batch(self):
+        expected = ["<math>a</math>\n", "<math>b</math>\n", "<math>a</math>\n"]
+        self.assertEqual(expected, quizcomp.katex.to_html_batch(['a', 'b', 'a'], cwd = self._temp_dir))
+
+    def test_reuse_worker(self):
+        worker = quizcomp.katex.get_worker(self._temp_dir)
+        worker.render(['a'])
+        process = worker._process
+
+        worker.render(['b'])
+        self.assertIs(process, worker._process)
+        self.assertEqual('0.0.0-test', worker.get_version())
+
+    def test_installed_version(self):
+        # Like NodeJS, the package is also found from sub dirs.
+        sub_dir = os.path.join(self._temp_dir, 'a', 'b')
+        os.makedirs(sub_dir)
+
+        self.assertEqual('0.0.0-test', quizcomp.katex.get_installed_version(self._temp_dir))
+        self.assertEqual('0.0.0-test', quizcomp.katex.get_installed_version(sub_dir))
+
+    def test_render_error(self):
+        with self.assertRaises(ValueError):
+            quizcomp.katex.to_html('bad', cwd = self._temp_dir)
+
+        # The worker should still be usable.
+        self.assertEqual("<math>a</math>\n", quizcomp.katex.to_html('a', cwd = self._temp_dir))
+
+    def test_restart_on_crash(self):
+        worker = quizcomp.katex.get_worker(self._temp_dir)
+        worker.render(['a'])
+
+        # The crash expression kills the worker on every attempt.
+        with self.assertRaises(ValueError):
+            worker.render(['crash'])
+
+        # A new worker should be started.
+        self.assertEqual(["<math>a</math>\n"], worker.render(['a']))
+
+    def test_shutdown(self):
+        worker = quizcomp.katex.get_worker(self._temp_dir)
+        worker.render(['a'])
+        process = worker._process
+
+        quizcomp.katex.shutdown()
+
+        self.assertIsNone(worker._process)
+        self.assertIsNotNone(process.poll())
+
+class TestMathCache(tests.base.BaseTest):
+    """
+    Test rendering equations from the rendered equation cache (which does not need NodeJS).
+    """
+
+    def setUp(self):
+        quizcomp.katex.set_cache_dir(quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-math-cache-'))
+        self._reset_version()
+
+    def tearDown(self):
+        quizcomp.katex.set_cache_dir(None)
+        self._reset_version()
+
+    def _reset_version(self):
+        quizcomp.parser.math._katex_version = None
+        quizcomp.parser.math._katex_installed_version_checked = False
+
+    def test_cached_render(self):
+        cache = quizcomp.katex.get_cache()
+        cache.put([quizcomp.constants.FORMAT_HTML, True, '0.0.0-test', 'x^2'], '<math>cached</math>')
+
+        # KaTeX is never needed when every equation is cached.
+        with unittest.mock.patch.object(quizcomp.katex, 'get_installed_version', return_value = '0.0.0-test'), \
+                unittest.mock.patch.object(quizcomp.katex, 'get_worker', side_effect = AssertionError("KaTeX worker was used.")):
+            document = quizcomp.parser.public.parse_text('Text $ x^2 $.').document
+            self.assertIn('<math>cached</math>', document.to_format(quizcomp.constants.FORMAT_HTML))
+
+    def test_cached_render_upgrade(self):
+        cache = quizcomp.katex.get_cache()
+        cache.put([quizcomp.constants.FORMAT_HTML, True, '0.0.0-old', 'x^2'], '<math>cached</math>')
+
+        # Equations rendered by an older version of KaTeX are not used.
+        with unittest.mock.patch.object(quizcomp.katex, 'get_installed_version', return_value = '0.0.1-new'):
+            self.assertIsNone(quizcomp.parser.math._get_cached_html([('x^2', True)]))
+
+        # Without an installed version, the cache is not used without starting KaTeX.
+        self._reset_version()
+        with unittest.mock.patch.object(quizcomp.katex, 'get_installed_version', return_value = None):
+            self.assertIsNone(quizcomp.parser.math._get_cached_html([('x^2', True)]))
@@ -0,0 +1,274 @@
+import os
+import stat
+import sys
+
+import quizcomp.latex
+import quizcomp.pdf
+import quizcomp.util.dirent
+import tests.base
+
+# A stand-in for `pdflatex` that records each pass (next to itself) and writes .aux, .pdf, and .pos files.
+# Normally the .aux file is the same on every pass (so it converges after it is first written),
+# but a document containing 'unstable' will get a new .aux file on every pass.
+FAKE_PDFLATEX_SOURCE = r"""#!/usr/bin/env python3
+import os
+import sys
+
+PASSES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'passes.txt')
+
+tex_filename = sys.argv[-1]
+job = os.path.splitext(tex_filename)[0]
+
+with open(tex_filename, 'r') as file:
+    tex = file.read()
+
+with open(PASSES_PATH, 'a') as file:
+    file.write("%s\n" % (job))
+
+aux = 'positions'
+if ('unstable' in tex):
+    aux = str(len(open(PASSES_PATH, 'r').read()))
+
+with open(job + '.aux', 'w') as file:
+    file.write(aux)
+
+with open(job + '.pdf', 'w') as file:
+    file.write('PDF')
+
+with open(job + '.pos', 'w') as file:
+    file.write('')
+"""
+
+# A stand-in for `docker` that records each call and runs pdflatex (from $PATH) on the host.
+# Container mounts are recorded so that `docker exec` can map the container's work dir back to the host.
+FAKE_DOCKER_SOURCE = r"""#!/usr/bin/env python3
+import json
+import os
+import subprocess
+import sys
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+LOG_PATH = os.path.join(THIS_DIR, 'docker.txt')
+USERS_PATH = os.path.join(THIS_DIR, 'docker-users.txt')
+MOUNT_PATH = os.path.join(THIS_DIR, 'docker-mount.json')
+
+args = sys.argv[1:]
+
+with open(LOG_PATH, 'a') as file:
+    file.write(args[0] + "\n")
+
+if (args[0] in ['run', 'exec']):
+    user = ''
+    if ('--user' in args):
+        user = args[args.index('--user') + 1]
+
+    with open(USERS_PATH, 'a') as file:
+        file.write(user + "\n")
+
+def get_mount(args):
+    host, container = args[args.index('-v') + 1].split(':')
+    return host, container
+
+if (args[0] == 'run'):
+    host, container = get_mount(args)
+
+    if ('--detach' in args):
+        with open(MOUNT_PATH, 'w') as file:
+            json.dump([host, container], file)
+
+        print('fake-container')
+        sys.exit(0)
+
+    for _ in range(2):
+        subprocess.run(['pdflatex', '-interaction=nonstopmode', args[-1]], cwd = host, check = True)
+elif (args[0] == 'exec'):
+    with open(MOUNT_PATH, 'r') as file:
+        host, container = json.load(file)
+
+    work_dir = args[args.index('--workdir') + 1]
+    cwd = os.path.join(host, os.path.relpath(work_dir, container))
+
+    result = subprocess.run(args[(args.index('--workdir') + 3):], cwd = cwd)
+    sys.exit(result.returncode)
+"""
+
+class TestLatex(tests.base.BaseTest):
+    """
+    Test local compilation using a fake pdflatex.
+    """
+
+    def setUp(self):
+        if (sys.platform.startswith("win")):
+            self.skipTest('Skipping fake pdflatex tests on Windows.')
+
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-latex-')
+
+        self._bin_path = os.path.join(self._temp_dir, 'pdflatex')
+        _write_executable(self._bin_path, FAKE_PDFLATEX_SOURCE)
+
+        self._tex_path = os.path.join(self._temp_dir, 'quiz.tex')
+        quizcomp.util.dirent.write_file(self._tex_path, 'quiz')
+
+        self._old_bin_path = quizcomp.latex._pdflatex_bin_path
+        self._old_use_docker = quizcomp.latex._pdflatex_use_docker
+
+        quizcomp.latex.set_pdflatex_bin_path(self._bin_path)
+        quizcomp.latex.set_pdflatex_use_docker(False)
+
+    def tearDown(self):
+        quizcomp.latex.set_pdflatex_bin_path(self._old_bin_path)
+        quizcomp.latex.set_pdflatex_use_docker(self._old_use_docker)
+
+    def _count_passes(self):
+        path = os.path.join(self._temp_dir, 'passes.txt')
+        if (not os.path.exists(path)):
+            return 0
+
+        return len(quizcomp.util.dirent.read_file(path).splitlines())
+
+    def test_compile_converge(self):
+        quizcomp.latex.compile(self._tex_path)
+        self.assertEqual(2, self._count_passes())
+
+        # The .aux file is already up-to-date, so only one more pass is needed.
+        quizcomp.latex.compile(self._tex_path)
+        self.assertEqual(3, self._count_passes())
+
+    def test_compile_max_passes(self):
+        quizcomp.util.dirent.write_file(self._tex_path, 'unstable')
+
+        quizcomp.latex.compile(self._tex_path, max_passes = 4)
+        self.assertEqual(4, self._count_passes())
+
+    def test_compile_no_positions(self):
+        quizcomp.latex.compile(self._tex_path, positions = False)
+        self.assertEqual(1, self._count_passes())
+
+    def test_incremental_build(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'image-questions', 'quiz.json')
+        out_dir = os.path.join(self._temp_dir, 'out')
+
+        quiz, variants, _ = quizcomp.pdf.make_with_path(path, base_out_dir = out_dir, seed = 12345, num_variants = 2)
+
+        # Each variant takes two passes, and each key takes one.
+        self.assertEqual(6, self._count_passes())
+
+        quiz_dir = os.path.join(out_dir, quiz.title)
+        tex_path = os.path.join(quiz_dir, "%s.tex" % (variants[0].title))
+        tex_mtime = os.path.getmtime(tex_path)
+
+        # Nothing changed, so nothing should be rebuilt.
+        quizcomp.pdf.make_with_path(path, base_out_dir = out_dir, seed = 12345, num_variants = 2)
+        self.assertEqual(6, self._count_passes())
+        self.assertEqual(tex_mtime, os.path.getmtime(tex_path))
+
+        # Only the missing PDF should be rebuilt (its .aux file is still up-to-date).
+        os.remove(os.path.join(quiz_dir, "%s.pdf" % (variants[1].title)))
+        quizcomp.pdf.make_with_path(path, base_out_dir = out_dir, seed = 12345, num_variants = 2)
+        self.assertEqual(7, self._count_passes())
+
+        # Only the new variant (and its key) should be built.
+        quizcomp.pdf.make_with_path(path, base_out_dir = out_dir, seed = 12345, num_variants = 3)
+        self.assertEqual(10, self._count_passes())
+
+        # A forced rebuild remakes everything (the .aux files are still up-to-date).
+        quizcomp.pdf.make_with_path(path, base_out_dir = out_dir, seed = 12345, num_variants = 3, rebuild = True)
+        self.assertEqual(16, self._count_passes())
+
+class TestLatexDocker(tests.base.BaseTest):
+    """
+    Test Docker compilation using fake docker and pdflatex executables.
+    """
+
+    def setUp(self):
+        if (sys.platform.startswith("win")):
+            self.skipTest('Skipping fake docker tests on Windows.')
+
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-latex-docker-')
+
+        self._bin_dir = os.path.join(self._temp_dir, 'bin')
+        _write_executable(os.path.join(self._bin_dir, 'docker'), FAKE_DOCKER_SOURCE)
+        _write_executable(os.path.join(self._bin_dir, 'pdflatex'), FAKE_PDFLATEX_SOURCE)
+
+        self._old_path = os.environ.get('PATH', '')
+        self._old_use_docker = quizcomp.latex._pdflatex_use_docker
+        self._old_persistent = quizcomp.latex._pdflatex_docker_persistent
+
+        os.environ['PATH'] = os.pathsep.join([self._bin_dir, self._old_path])
+        quizcomp.latex.set_pdflatex_use_docker(True)
+        quizcomp.latex.set_pdflatex_docker_persistent(True)
+
+    def tearDown(self):
+        quizcomp.latex.stop_docker_container()
+
+        os.environ['PATH'] = self._old_path
+        quizcomp.latex.set_pdflatex_use_docker(self._old_use_docker)
+        quizcomp.latex.set_pdflatex_docker_persistent(self._old_persistent)
+
+    def _get_docker_calls(self):
+        path = os.path.join(self._bin_dir, 'docker.txt')
+        if (not os.path.exists(path)):
+            return []
+
+        return quizcomp.util.dirent.read_file(path).splitlines()
+
+    def test_persistent_container(self):
+        root_dir = os.path.join(self._temp_dir, 'out')
+
+        paths = []
+        for name in ['a', 'b']:
+            path = os.path.join(root_dir, name, "%s.tex" % (name))
+            os.makedirs(os.path.dirname(path))
+            quizcomp.util.dirent.write_file(path, name)
+            paths.append(path)
+
+        with quizcomp.latex.docker_session(root_dir):
+            for path in paths:
+                quizcomp.latex.compile(path)
+
+            self.assertIsNotNone(quizcomp.latex.get_docker_container())
+
+        self.assertIsNone(quizcomp.latex.get_docker_container())
+
+        # One container, two passes per file, and then the container is removed.
+        self.assertEqual(['run', 'exec', 'exec', 'exec', 'exec', 'rm'], self._get_docker_calls())
+
+        # Everything in the container runs as the current user (so output files are not owned by root).
+        users = quizcomp.util.dirent.read_file(os.path.join(self._bin_dir, 'docker-users.txt')).splitlines()
+        self.assertEqual(["%d:%d" % (os.getuid(), os.getgid())] * 5, users)
+
+        for path in paths:
+            self.assertTrue(os.path.exists(os.path.splitext(path)[0] + '.pdf'))
+
+    def test_outside_container(self):
+        root_dir = os.path.join(self._temp_dir, 'out')
+        path = os.path.join(self._temp_dir, 'other', 'quiz.tex')
+        os.makedirs(os.path.dirname(path))
+        quizcomp.util.dirent.write_file(path, 'quiz')
+
+        # Files outside of the mounted dir fall back to a new container.
+        with quizcomp.latex.docker_session(root_dir):
+            quizcomp.latex.compile(path)
+
+        self.assertEqual(['run', 'run', 'rm'], self._get_docker_calls())
+
+    def test_pdf_parallel(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'image-questions', 'quiz.json')
+        out_dir = os.path.join(self._temp_dir, 'out')
+
+        quiz, variants, _ = quizcomp.pdf.make_with_path(path, base_out_dir = out_dir,
+                num_variants = 2, jobs = 2)
+
+        calls = self._get_docker_calls()
+        self.assertEqual(1, calls.count('run'))
+        self.assertIn('exec', calls)
+        self.assertEqual(1, calls.count('rm'))
+        self.assertEqual('rm', calls[-1])
+
+        for variant in variants:
+            self.assertTrue(os.path.exists(os.path.join(out_dir, quiz.title, "%s.pdf" % (variant.title))))
+
+def _write_executable(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    quizcomp.util.dirent.write_file(path, content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
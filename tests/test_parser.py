@@ -3,6 +3,7 @@ import re
 
 import quizcomp.constants
 import quizcomp.parser.common
+import quizcomp.parser.parse
 import quizcomp.parser.public
 import quizcomp.util.json
 import tests.base
@@ -17,7 +18,61 @@ class TestParser(tests.base.BaseTest):
     Good and bad situations will be loaded below into individual test cases.
     """
 
-    pass
+    def test_shared_parser(self):
+        text = "**a** $x$\n\n| b |\n|---|\n| c |"
+        expected = quizcomp.parser.public.parse_text(text).document.to_json()
+
+        parser, options = quizcomp.parser.parse._get_parser()
+        self.assertIs(parser, quizcomp.parser.parse._get_parser()[0])
+        self.assertIs(options, quizcomp.parser.parse._get_parser()[1])
+
+        quizcomp.parser.parse._reset_parser()
+
+        new_parser, _ = quizcomp.parser.parse._get_parser()
+        self.assertIsNot(parser, new_parser)
+
+        # A fresh parser should behave the same.
+        self.assertEqual(expected, quizcomp.parser.public.parse_text(text).document.to_json())
+
+    def test_parse_cache(self):
+        text = "::: block\n<style>{\"text-align\": \"center\"}</style>\n**a**\n:::"
+
+        quizcomp.parser.public.clear_parse_cache()
+
+        first = quizcomp.parser.public.parse_text(text).document
+        second = quizcomp.parser.public.parse_text(text, base_dir = 'other').document
+
+        stats = quizcomp.parser.public.get_parse_cache_stats()
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['size'])
+
+        # The tokens are shared, but the documents are not.
+        self.assertIs(first._tokens, second._tokens)
+        self.assertIsNot(first, second)
+
+        # Renderers that modify tokens should not affect other documents (or later renders).
+        expected_html = first.to_html()
+        expected_json = first.to_json(include_metadata = False)
+
+        self.assertEqual(expected_html, second.to_html())
+        self.assertEqual(expected_html, first.to_html())
+        self.assertEqual(expected_json, second.to_json(include_metadata = False))
+
+    def test_cached_ast(self):
+        document = quizcomp.parser.public.parse_text('**a**').document
+
+        ast = document.get_ast()
+        self.assertIs(ast, document.get_ast())
+
+        document.to_tex()
+        document.to_text()
+        self.assertIs(ast, document.get_ast())
+
+        # Changing the tokens should invalidate the AST.
+        document.set_tokens(quizcomp.parser.public.parse_text('_b_').document._tokens)
+        self.assertIsNot(ast, document.get_ast())
+        self.assertEqual('\\textit{b}', document.to_tex())
 
 def _add_good_parse_questions():
     for path in tests.base.discover_good_document_files():
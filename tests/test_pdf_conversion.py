@@ -1,9 +1,14 @@
 import os
+import re
 import sys
+import unittest.mock
 
+import quizcomp.constants
 import quizcomp.latex
 import quizcomp.pdf
+import quizcomp.quiz
 import quizcomp.util.dirent
+import quizcomp.util.json
 
 import tests.base
 
@@ -15,7 +20,154 @@ class PDFConversionTest(tests.base.BaseTest):
     Tests cover both local and Docker-based PDF generation.
     """
 
-    pass
+    def test_parallel_variants(self):
+        """
+        Making variants in parallel should produce the same output as making them sequentially.
+        """
+
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'image-questions', 'quiz.json')
+
+        results = []
+        for jobs in [1, 3]:
+            temp_dir = quizcomp.util.dirent.get_temp_path(prefix = "quizcomp_pdf_test_")
+            quiz, variants, options = quizcomp.pdf.make_with_path(path, base_out_dir = temp_dir,
+                    seed = 12345, num_variants = 3, skip_pdf = True, jobs = jobs, write_options = False)
+
+            out_dir = os.path.join(temp_dir, quiz.title)
+
+            contents = {}
+            for filename in sorted(os.listdir(out_dir)):
+                if (filename.endswith('.tex') or filename.endswith('.json')):
+                    contents[filename] = quizcomp.util.dirent.read_file(os.path.join(out_dir, filename))
+
+            # Each variant and key gets its own image dir.
+            image_dirs = sorted(os.listdir(os.path.join(out_dir, 'images')))
+
+            results.append((options['variants'], [variant.title for variant in variants], contents, image_dirs))
+
+        self.assertEqual(results[0], results[1])
+
+        # For each variant: a JSON file, a TeX file, and an answer key TeX file (plus the build manifest).
+        self.assertEqual(10, len(results[0][2]))
+        self.assertEqual(6, len(results[0][3]))
+        self.assertTrue(all([variant['has_key'] for variant in results[0][0]]))
+
+    def test_keys_match_variants(self):
+        """
+        Each answer key should have the same questions as its variant (even when questions are picked without replacement).
+        """
+
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = "quizcomp_pdf_test_")
+
+        for i in range(6):
+            question_dir = os.path.join(temp_dir, 'questions', "q%d" % (i))
+            os.makedirs(question_dir)
+
+            quizcomp.util.dirent.write_file(os.path.join(question_dir, quizcomp.constants.PROMPT_FILENAME), "Prompt Q%d" % (i))
+            quizcomp.util.json.dump_path({'question_type': 'essay'}, os.path.join(question_dir, quizcomp.constants.QUESTION_FILENAME))
+
+        path = os.path.join(temp_dir, quizcomp.constants.QUIZ_FILENAME)
+        quizcomp.util.json.dump_path({
+            'title': 'No Replacement',
+            'description': 'No Replacement',
+            'version': 'test',
+            'pick_with_replacement': False,
+            'groups': [{'name': 'questions', 'pick_count': 2, 'questions': ['questions']}],
+        }, path)
+
+        results = []
+        for jobs in [1, 3]:
+            out_dir = os.path.join(temp_dir, "out-%d" % (jobs))
+            quiz, variants, _ = quizcomp.pdf.make_with_path(path, base_out_dir = out_dir,
+                    seed = 12345, num_variants = 3, skip_pdf = True, jobs = jobs)
+
+            questions = []
+            for variant in variants:
+                variant_questions = []
+                for title in [variant.title, "%s -- Answer Key" % (variant.title)]:
+                    content = quizcomp.util.dirent.read_file(os.path.join(out_dir, quiz.title, "%s.tex" % (title)))
+                    variant_questions.append(re.findall(r'Prompt Q\d', content))
+
+                self.assertEqual(2, len(variant_questions[0]))
+                self.assertEqual(variant_questions[0], variant_questions[1])
+
+                questions.append(variant_questions[0])
+
+            # Without replacement, the first three variants get all six questions.
+            self.assertEqual(6, len(set(sum(questions, []))))
+
+            results.append(questions)
+
+        self.assertEqual(results[0], results[1])
+
+    def test_stream_variants(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'single-question', 'quiz.json')
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = "quizcomp_pdf_test_")
+
+        quiz = quizcomp.quiz.Quiz.from_path(path)
+        create_variant = quiz.create_variant
+        make_variant = quizcomp.pdf._make_variant
+
+        # The number of variants that were created when each task was made.
+        created_count = [0]
+        task_counts = []
+
+        def _create_variant(**kwargs):
+            created_count[0] += 1
+            return create_variant(**kwargs)
+
+        def _make_variant(**kwargs):
+            task_counts.append(created_count[0])
+            return make_variant(**kwargs)
+
+        with unittest.mock.patch.object(quiz, 'create_variant', _create_variant), \
+                unittest.mock.patch('quizcomp.pdf._make_variant', _make_variant):
+            _, variants, options = quizcomp.pdf.make(quiz, base_out_dir = temp_dir,
+                    seed = 12345, num_variants = 3, skip_pdf = True, keep_variants = False)
+
+        # Variants are created as they are needed, and not kept.
+        self.assertEqual([1, 1, 2, 2, 3, 3], task_counts)
+        self.assertEqual([], variants)
+
+        self.assertEqual(['A', 'B', 'C'], [variant['id'] for variant in options['variants']])
+        self.assertEqual(["%s - %s" % (quiz.title, id) for id in ['A', 'B', 'C']], [variant['title'] for variant in options['variants']])
+        self.assertTrue(all([variant['has_key'] for variant in options['variants']]))
+
+    def test_many_variants(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'single-question', 'quiz.json')
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = "quizcomp_pdf_test_")
+
+        quiz, variants, options = quizcomp.pdf.make_with_path(path, base_out_dir = temp_dir,
+                seed = 12345, num_variants = 30, skip_key = True, skip_pdf = True, jobs = 2)
+
+        ids = [variant['id'] for variant in options['variants']]
+        self.assertEqual(30, len(set(ids)))
+        self.assertEqual(['A', 'Z', 'AA', 'AD'], [ids[0], ids[25], ids[26], ids[29]])
+
+        # All variants are in a single options file and manifest.
+        out_dir = os.path.join(temp_dir, quiz.title)
+        self.assertEqual(options, quizcomp.util.json.load_path(os.path.join(out_dir, quizcomp.pdf.OPTIONS_FILENAME)))
+        self.assertEqual(30, len(quizcomp.util.json.load_path(os.path.join(out_dir, quizcomp.pdf.MANIFEST_FILENAME))))
+
+    def test_roster(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'single-question', 'quiz.json')
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = "quizcomp_pdf_test_")
+
+        roster_path = os.path.join(temp_dir, 'roster.txt')
+        quizcomp.util.dirent.write_file(roster_path, "# Student IDs\ns001\n\ns002\ns003\n")
+
+        ids = quizcomp.pdf.load_roster(roster_path)
+        self.assertEqual(['s001', 's002', 's003'], ids)
+
+        quiz, variants, options = quizcomp.pdf.make_with_path(path, base_out_dir = temp_dir,
+                seed = 12345, variant_ids = ids, skip_key = True, skip_pdf = True)
+
+        self.assertEqual(["%s - %s" % (quiz.title, id) for id in ids], [variant.title for variant in variants])
+
+        for content in ["s001\ns001\n", "bad/id\n", "# Nothing\n"]:
+            quizcomp.util.dirent.write_file(roster_path, content)
+            with self.assertRaises(ValueError):
+                quizcomp.pdf.load_roster(roster_path)
 
 def _add_pdf_tests():
     quiz_files = tests.base.discover_good_quiz_files()
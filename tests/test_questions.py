@@ -1,8 +1,14 @@
 import os
+import random
+import shutil
+import unittest.mock
 
 import quizcomp.common
+import quizcomp.constants
 import quizcomp.question.base
+import quizcomp.question.matching
 import quizcomp.uploader.canvas
+import quizcomp.util.dirent
 import quizcomp.util.json
 import tests.base
 
@@ -21,7 +27,133 @@ class QuestionsTest(tests.base.BaseTest):
     Test that questions in 'tests/questions/bad' do not parse.
     """
 
-    pass
+    def test_copy_for_variant(self):
+        for name in ['mcq-basic', 'mdd-basic', 'matching-basic']:
+            path = os.path.join(tests.base.GOOD_QUESTIONS_DIR, name, quizcomp.constants.QUESTION_FILENAME)
+            question = quizcomp.question.base.Question.from_path(path)
+            expected = question.to_dict()
+
+            variant_question = question.copy_for_variant()
+            variant_question.name = 'renamed'
+            variant_question.add_hints({'new-hint': True})
+            variant_question.shuffle(random.Random(12345))
+
+            # The parsed content is shared.
+            self.assertIs(question.prompt, variant_question.prompt)
+
+            # Changes to the copy do not affect the original.
+            self.assertJSONDictEqual(expected, question.to_dict())
+            self.assertNotEqual(expected, variant_question.to_dict())
+
+    def test_answer_order(self):
+        for name in ['mcq-basic', 'ma-basic', 'tf-true', 'mdd-basic', 'matching-basic']:
+            path = os.path.join(tests.base.GOOD_QUESTIONS_DIR, name, quizcomp.constants.QUESTION_FILENAME)
+            question = quizcomp.question.base.Question.from_path(path)
+            self.assertIs(question.answers, question.get_ordered_answers())
+
+            answers = question.to_dict()['answers']
+            question.shuffle(random.Random(12345))
+            self.assertIsNotNone(question.answer_order)
+
+            # Shuffling only sets the order, the answers are untouched.
+            self.assertEqual(answers, question.to_dict()['answers'])
+
+            # The order survives serialization.
+            new_question = quizcomp.question.base.Question.from_dict(question.to_dict())
+            self.assertEqual(question.answer_order, new_question.answer_order)
+
+        with self.assertRaises(quizcomp.common.QuizValidationError):
+            path = os.path.join(tests.base.GOOD_QUESTIONS_DIR, 'mcq-basic', quizcomp.constants.QUESTION_FILENAME)
+            data = quizcomp.util.json.load_path(path)
+            data['answer_order'] = [0, 0]
+            quizcomp.question.base.Question.from_dict(data, base_dir = os.path.dirname(path))
+
+    def test_matching_legacy_shuffle(self):
+        path = os.path.join(tests.base.GOOD_QUESTIONS_DIR, 'matching-basic', quizcomp.constants.QUESTION_FILENAME)
+        data = quizcomp.util.json.load_path(path)
+        data['answers']['shuffle'] = True
+        data['answers']['shuffle_seed'] = 12345
+
+        expected = quizcomp.util.json.loads(quizcomp.util.json.dumps(data['answers']))
+        question = quizcomp.question.base.Question.from_dict(data, base_dir = os.path.dirname(path))
+
+        # The legacy seed is turned into an answer order (without changing the passed data).
+        self.assertEqual(expected, data['answers'])
+        self.assertIsNotNone(question.answer_order)
+        self.assertNotIn('shuffle', question.answers)
+        self.assertNotIn('shuffle_seed', question.answers)
+
+        # Validation has no side effects.
+        question_dict = question.to_dict()
+        question.validate()
+        self.assertJSONDictEqual(question_dict, question.to_dict())
+
+        new_question = quizcomp.question.base.Question.from_dict(question.to_dict())
+        self.assertEqual(question.answer_order, new_question.answer_order)
+
+        # The answers given to the constructor are not changed.
+        answers = quizcomp.util.json.loads(quizcomp.util.json.dumps(expected))
+        new_question = quizcomp.question.matching.Matching(**dict(data, answers = answers))
+        self.assertEqual(expected, answers)
+        self.assertEqual(question.answer_order, new_question.answer_order)
+
+    def test_question_cache(self):
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-question-cache-')
+
+        question_dir = os.path.join(temp_dir, 'question')
+        shutil.copytree(os.path.join(tests.base.GOOD_QUESTIONS_DIR, 'prompt-alt-name'), question_dir)
+
+        path = os.path.join(question_dir, quizcomp.constants.QUESTION_FILENAME)
+        prompt_path = os.path.join(question_dir, 'alt-prompt.md')
+
+        quizcomp.question.base.set_cache_dir(os.path.join(temp_dir, 'cache'))
+
+        try:
+            question = quizcomp.question.base.Question.from_path(path)
+            expected = question.to_dict()
+
+            # A warm load comes from the cache (which does not need the parser).
+            with unittest.mock.patch('quizcomp.parser.public.parse_text', side_effect = RuntimeError('Parsed.')):
+                cached_question = quizcomp.question.base.Question.from_path(path)
+
+            self.assertIsNot(question, cached_question)
+            self.assertJSONDictEqual(expected, cached_question.to_dict())
+
+            # Changing any file the question was loaded from will reload it.
+            quizcomp.util.dirent.write_file(prompt_path, 'A new prompt.')
+            new_question = quizcomp.question.base.Question.from_path(path)
+            self.assertEqual('A new prompt.', new_question.prompt.text)
+        finally:
+            quizcomp.question.base.set_cache_dir(None)
+
+    def test_load_paths_parallel(self):
+        good_paths, bad_paths = tests.base.discover_question_tests()
+        good_paths = good_paths[0:10]
+        bad_paths = bad_paths[0:2]
+
+        expected = [question.to_dict() for question in quizcomp.question.base.load_paths(good_paths)]
+
+        quizcomp.question.base.set_load_jobs(2)
+
+        try:
+            questions = quizcomp.question.base.load_paths(good_paths)
+            self.assertEqual(expected, [question.to_dict() for question in questions])
+
+            # The same pool is used for every load.
+            executor = quizcomp.question.base._get_load_executor()
+            quizcomp.question.base.load_paths(good_paths[0:2])
+            self.assertIs(executor, quizcomp.question.base._get_load_executor())
+
+            # All the errors are reported together.
+            with self.assertRaises(quizcomp.common.QuestionLoadErrors) as context:
+                quizcomp.question.base.load_paths(good_paths[0:2] + bad_paths)
+
+            self.assertEqual(bad_paths, [path for (path, _) in context.exception.errors])
+            for path in bad_paths:
+                self.assertIn(path, str(context.exception))
+        finally:
+            quizcomp.question.base.set_load_jobs(1)
+            quizcomp.question.base.shutdown_load_executor()
 
 def _add_question_tests():
     good_paths, bad_paths = tests.base.discover_question_tests()
@@ -0,0 +1,66 @@
+import os
+import types
+
+import quizcomp.constants
+import quizcomp.quiz
+import quizcomp.variant
+import tests.base
+
+class TestQuiz(tests.base.BaseTest):
+    def setUp(self):
+        path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'all-basic-questions', quizcomp.constants.QUIZ_FILENAME)
+        self._quiz = quizcomp.quiz.Quiz.from_path(path)
+
+    def test_iter_variants(self):
+        variants = self._quiz.iter_variants(3, seed = 12345)
+        self.assertIsInstance(variants, types.GeneratorType)
+
+        variants = list(variants)
+        self.assertEqual(3, len(variants))
+        self.assertEqual(["%s - %s" % (self._quiz.title, id) for id in ['A', 'B', 'C']], [variant.title for variant in variants])
+
+        # The same seed gives the same variants, and each variant can be recreated from its own seed.
+        expected = [variant.to_json() for variant in variants]
+        self.assertEqual(expected, [variant.to_json() for variant in self._quiz.iter_variants(3, seed = 12345)])
+
+        infos = list(quizcomp.quiz.iter_variant_infos(3, 12345))
+        for i in range(len(infos)):
+            (identifier, seed) = infos[i]
+            self.assertEqual(seed, variants[i].seed)
+            self.assertEqual(expected[i], self._quiz.create_variant(identifier = identifier, seed = seed).to_json())
+
+    def test_iter_variants_single(self):
+        variants = list(self._quiz.iter_variants(1, seed = 12345))
+        self.assertEqual([self._quiz.title], [variant.title for variant in variants])
+
+    def test_variant_shared_groups(self):
+        variant = next(self._quiz.iter_variants(2, seed = 12345))
+
+        for (group, variant_group) in zip(self._quiz.groups, variant.groups):
+            self.assertIsNot(group, variant_group)
+            self.assertIs(group.hints, variant_group.hints)
+            self.assertEqual(group.pick_count, len(variant_group.questions))
+
+    def test_iter_variants_identifiers(self):
+        variants = list(self._quiz.iter_variants(3, seed = 12345, identifiers = ['s001', 's002']))
+        self.assertEqual(["%s - %s" % (self._quiz.title, id) for id in ['s001', 's002']], [variant.title for variant in variants])
+
+        # Identifiers do not change the seeds.
+        self.assertEqual([seed for (_, seed) in quizcomp.quiz.iter_variant_infos(2, 12345)], [variant.seed for variant in variants])
+
+    def test_variant_identifier(self):
+        cases = [
+            (0, 'A'),
+            (25, 'Z'),
+            (26, 'AA'),
+            (27, 'AB'),
+            (51, 'AZ'),
+            (52, 'BA'),
+            (701, 'ZZ'),
+            (702, 'AAA'),
+        ]
+
+        for (index, expected) in cases:
+            with self.subTest(index = index):
+                self.assertEqual(expected, quizcomp.quiz.get_variant_identifier(index))
+
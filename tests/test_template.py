@@ -1,9 +1,13 @@
+import gc
 import os
 import re
+import zipfile
 
 import quizcomp.constants
 import quizcomp.converter.convert
+import quizcomp.converter.qti
 import quizcomp.quiz
+import quizcomp.util.dirent
 import quizcomp.util.json
 import tests.base
 
@@ -27,6 +31,48 @@ class TestTemplateConversion(tests.base.BaseTest):
 
         return value
 
+    def test_render_cache(self):
+        quiz_path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'all-basic-questions', quizcomp.constants.QUIZ_FILENAME)
+        variant = quizcomp.quiz.Quiz.from_path(quiz_path).create_variant()
+
+        converter = quizcomp.converter.convert.get_converter(format = quizcomp.constants.FORMAT_HTML, answer_key = True)
+        expected = converter.convert_variant(variant)
+
+        stats = converter.get_render_cache_stats()
+        self.assertGreater(stats['hits'], 0)
+        # Documents that only live for the conversion (e.g., parsed solutions) are not kept.
+        self.assertGreaterEqual(stats['misses'], stats['size'])
+
+        # Converting again (e.g., a blank quiz after its key) reuses all the renders.
+        self.assertEqual(expected, converter.convert_variant(variant))
+
+        new_stats = converter.get_render_cache_stats()
+        self.assertEqual(stats['size'], new_stats['size'])
+        self.assertGreaterEqual(new_stats['hits'] - stats['hits'], stats['size'])
+
+        # Entries go away with their documents.
+        del variant
+        gc.collect()
+        self.assertEqual(0, converter.get_render_cache_stats()['size'])
+
+    def test_render_cache_images(self):
+        quiz_path = os.path.join(tests.base.GOOD_QUIZZES_DIR, 'image-questions', quizcomp.constants.QUIZ_FILENAME)
+        quiz = quizcomp.quiz.Quiz.from_path(quiz_path)
+
+        # Each conversion with the same converter stores its own images (renders that store images are not cached).
+        converter = quizcomp.converter.qti.QTITemplateConverter(canvas = True)
+        for i in range(2):
+            out_path = os.path.join(quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-template-'), 'quiz.qti.zip')
+            converter.convert_quiz(quiz, out_path = out_path)
+
+            with zipfile.ZipFile(out_path) as archive:
+                names = archive.namelist()
+                quiz_text = archive.read("%s/quiz/quiz.xml" % (quiz.title)).decode()
+
+            image_names = [name for name in names if (name.startswith("%s/images/" % (quiz.title)) and (not name.endswith('/')))]
+            self.assertEqual(1, len(image_names))
+            self.assertIn(image_names[0], quiz_text)
+
 def _add_good_convert_questions():
     for quiz_path in tests.base.discover_good_quiz_files():
         test_name = _make_name('good_convert', quiz_path)
@@ -0,0 +1,755 @@
+import contextlib
+import http.server
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import unittest.mock
+import urllib.parse
+
+import quizcomp.cli.canvas.upload
+import quizcomp.constants
+import quizcomp.quiz
+import quizcomp.uploader.canvas
+import quizcomp.util.dirent
+import quizcomp.util.hash
+import quizcomp.util.json
+import tests.base
+
+TEST_COURSE = '100001'
+TEST_TOKEN = 'abc123'
+
+class FakeCanvas(object):
+    """
+    A minimal in-memory Canvas (only the API endpoints that the uploader uses) served over HTTP on localhost.
+    Every request is recorded, along with how many requests were being handled at the same time.
+    """
+
+    def __init__(self, delay_secs = 0.0):
+        self.delay_secs = delay_secs
+
+        self._next_id = 1
+
+        # The number of upcoming requests to reject for going over the rate limit.
+        self.rate_limited_count = 0
+        # The number of upcoming file uploads (file contents) to reject with a 429 (Too Many Requests).
+        self.upload_rate_limited_count = 0
+        self.rate_limit_remaining = 700.0
+
+        # Quiz titles that will fail to be created.
+        self.failing_titles = set()
+
+        # [(method, path, status), ...]
+        self.requests = []
+
+        # {id: title, ...}
+        self.quizzes = {}
+        # [{'id': str, 'quiz_id': str, 'name': str}, ...]
+        self.groups = []
+        # [form data, ...] (in the order they were received).
+        self.questions = []
+        # {id: {'quiz_id': str, 'form': form data}, ...}
+        self.question_ids = {}
+        # {path: id, ...}
+        self.folders = {'/': self._new_id()}
+        # {id: {'name': str, 'size': int, 'folder_id': str, 'uploaded': bool}, ...}
+        self.files = {}
+        # {file id: request body (bytes), ...}
+        self.upload_bodies = {}
+
+        self.client_ports = set()
+        self.max_in_flight = 0
+
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _FakeCanvasHandler)
+        self._server.canvas = self
+        self.base_url = "http://127.0.0.1:%d" % (self._server.server_address[1])
+
+        # A short poll interval so that stopping the server is quick.
+        self._thread = threading.Thread(target = self._server.serve_forever, kwargs = {'poll_interval': 0.01}, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, method, raw_path, content_type, body, client_address):
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            self.client_ports.add(client_address[1])
+
+        try:
+            time.sleep(self.delay_secs)
+
+            url = urllib.parse.urlparse(raw_path)
+            path = urllib.parse.unquote(url.path)
+            query = {key: values[0] for (key, values) in urllib.parse.parse_qs(url.query).items()}
+
+            form = {}
+            if (content_type.startswith('application/x-www-form-urlencoded')):
+                form = {key: values[0] for (key, values) in urllib.parse.parse_qs(body.decode()).items()}
+
+            with self._lock:
+                if (self.rate_limited_count > 0):
+                    self.rate_limited_count -= 1
+                    status, data, headers = 403, '403 Forbidden (Rate Limit Exceeded)', {}
+                elif (path.startswith('/upload/') and (self.upload_rate_limited_count > 0)):
+                    self.upload_rate_limited_count -= 1
+                    status, data, headers = 429, {'errors': 'too many requests'}, {}
+                else:
+                    status, data, headers = self._route(method, path, query, form)
+
+                    if (path.startswith('/upload/')):
+                        self.upload_bodies[path.split('/')[-1]] = body
+
+                self.requests.append((method, path, status))
+                headers[quizcomp.uploader.canvas.RATE_LIMIT_HEADER] = str(self.rate_limit_remaining)
+
+            return status, data, headers
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def count(self, method, prefix):
+        return len([path for (request_method, path, _) in self.requests if ((request_method == method) and path.startswith(prefix))])
+
+    def _new_id(self):
+        id = str(self._next_id)
+        self._next_id += 1
+        return id
+
+    def _page(self, path, query, items):
+        """
+        Respond with one page of a listing (with a Link header to the next page, like Canvas).
+        """
+
+        per_page = int(query.get('per_page', 10))
+        page = int(query.get('page', 1))
+
+        headers = {}
+        if ((page * per_page) < len(items)):
+            headers['Link'] = '<%s%s?page=%d&per_page=%d>; rel="next"' % (self.base_url, path, page + 1, per_page)
+
+        return 200, items[((page - 1) * per_page):(page * per_page)], headers
+
+    def _route(self, method, path, query, form):
+        course_prefix = "/api/v1/courses/%s/" % (TEST_COURSE)
+
+        if (path.startswith('/upload/')):
+            file_id = path.split('/')[-1]
+            self.files[file_id]['uploaded'] = True
+            return 201, {}, {'Location': "%s/api/v1/files/%s" % (self.base_url, file_id)}
+
+        if (path.startswith('/api/v1/folders/')):
+            parts = path.split('/')
+            if ((method == 'GET') and (parts[-1] == 'files')):
+                files = [{'id': id, 'display_name': file['name'], 'size': file['size']}
+                        for (id, file) in self.files.items() if (file['uploaded'] and (file['folder_id'] == parts[-2]))]
+                return self._page(path, query, files)
+
+            return 200, {}, {}
+
+        if (not path.startswith(course_prefix)):
+            return 404, {'errors': 'not found'}, {}
+
+        parts = path[len(course_prefix):].split('/')
+
+        if (parts == ['quizzes']):
+            if (method == 'GET'):
+                return self._page(path, query, [{'id': id, 'title': title} for (id, title) in self.quizzes.items()])
+
+            if (form['quiz[title]'] in self.failing_titles):
+                return 500, {'errors': 'internal error'}, {}
+
+            id = self._new_id()
+            self.quizzes[id] = form['quiz[title]']
+            return 200, {'id': id}, {}
+
+        if ((len(parts) == 2) and (parts[0] == 'quizzes') and (method == 'DELETE')):
+            self.quizzes.pop(parts[1], None)
+            return 200, {}, {}
+
+        if ((len(parts) == 2) and (parts[0] == 'quizzes') and (method == 'PUT')):
+            self.quizzes[parts[1]] = form['quiz[title]']
+            return 200, {'id': parts[1]}, {}
+
+        if ((len(parts) == 3) and (parts[0] == 'quizzes') and (parts[2] == 'groups')):
+            id = self._new_id()
+            self.groups.append({'id': id, 'quiz_id': parts[1], 'name': form['quiz_groups[][name]']})
+            return 200, {'quiz_groups': [{'id': id}]}, {}
+
+        if ((len(parts) == 4) and (parts[0] == 'quizzes') and (parts[2] == 'groups')):
+            groups = [group for group in self.groups if (group['id'] == parts[3])]
+            if (len(groups) == 0):
+                return 404, {'errors': 'not found'}, {}
+
+            if (method == 'DELETE'):
+                self.groups.remove(groups[0])
+                return 200, {}, {}
+
+            groups[0]['name'] = form['quiz_groups[][name]']
+            return 200, {'quiz_groups': [{'id': parts[3]}]}, {}
+
+        if ((len(parts) == 3) and (parts[0] == 'quizzes') and (parts[2] == 'questions')):
+            if (method == 'GET'):
+                questions = [{
+                        'id': id,
+                        'quiz_group_id': question['form']['question[quiz_group_id]'],
+                        'position': int(question['form']['question[position]']),
+                    } for (id, question) in self.question_ids.items() if (question['quiz_id'] == parts[1])]
+                return self._page(path, query, questions)
+
+            id = self._new_id()
+            self.questions.append(form)
+            self.question_ids[id] = {'quiz_id': parts[1], 'form': form}
+            return 200, {'id': id}, {}
+
+        if ((len(parts) == 4) and (parts[0] == 'quizzes') and (parts[2] == 'questions')):
+            question = self.question_ids.get(parts[3], None)
+            if (question is None):
+                return 404, {'errors': 'not found'}, {}
+
+            if (method == 'DELETE'):
+                self.question_ids.pop(parts[3])
+                self.questions = [form for form in self.questions if (form is not question['form'])]
+                return 200, {}, {}
+
+            question['form'].clear()
+            question['form'].update(form)
+            return 200, {'id': parts[3]}, {}
+
+        if (parts == ['assignment_groups']):
+            return self._page(path, query, [{'id': '1', 'name': 'Quizzes'}])
+
+        if ((parts == ['folders']) and (method == 'GET')):
+            folders = []
+            for (folder_path, id) in sorted(self.folders.items()):
+                parent_id = None
+                if (folder_path != '/'):
+                    parent_id = self.folders[os.path.dirname(folder_path)]
+
+                folders.append({'id': id, 'full_name': 'course files' + folder_path.rstrip('/'), 'parent_folder_id': parent_id})
+
+            return self._page(path, query, folders)
+
+        if (parts == ['folders']):
+            folder_path = form['parent_folder_path'].rstrip('/') + '/' + form['name']
+
+            # Canvas creates any missing parents.
+            while (folder_path != '/'):
+                if (folder_path not in self.folders):
+                    self.folders[folder_path] = self._new_id()
+                folder_path = os.path.dirname(folder_path)
+
+            return 200, {'id': self.folders[form['parent_folder_path'].rstrip('/') + '/' + form['name']]}, {}
+
+        if (parts == ['files']):
+            id = self._new_id()
+            self.files[id] = {
+                'name': form['name'],
+                'size': int(form['size']),
+                'folder_id': form['parent_folder_id'],
+                'uploaded': False,
+            }
+            return 200, {'upload_url': "%s/upload/%s" % (self.base_url, id), 'upload_params': {'key': id}}, {}
+
+        return 404, {'errors': 'not found'}, {}
+
+class _FakeCanvasHandler(http.server.BaseHTTPRequestHandler):
+    # Allow keep-alive connections (without Nagle's algorithm delaying small responses).
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        status, data, headers = self.server.canvas.handle(method, self.path, self.headers.get('Content-Type', ''), body, self.client_address)
+
+        content = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for (key, value) in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        self.wfile.write(content)
+
+class TestUploaderCanvas(tests.base.BaseTest):
+    """
+    Test uploading Canvas quizzes against a local fake Canvas server.
+    """
+
+    _base_temp_dir = None
+
+    @classmethod
+    def setUpClass(cls):
+        # Uploads store sync state next to the quiz, so use a copy of the test quizzes (with the same layout).
+        TestUploaderCanvas._base_temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-canvas-')
+        _copy_test_dirs(TestUploaderCanvas._base_temp_dir)
+
+    def setUp(self):
+        self._canvases = []
+        self._instances = []
+
+    def tearDown(self):
+        for instance in self._instances:
+            instance.session.close()
+
+        for canvas in self._canvases:
+            canvas.stop()
+
+    def _make_canvas(self, delay_secs = 0.0):
+        canvas = FakeCanvas(delay_secs = delay_secs)
+        self._canvases.append(canvas)
+
+        return canvas
+
+    def _make_instance(self, canvas, jobs = quizcomp.uploader.canvas.DEFAULT_JOBS):
+        instance = quizcomp.uploader.canvas.InstanceInfo(canvas.base_url, TEST_COURSE, TEST_TOKEN,
+                jobs = jobs, rate_limit_wait_secs = 0.01)
+        self._instances.append(instance)
+
+        return instance
+
+    def _load_quiz(self, quiz_name):
+        path = os.path.join(TestUploaderCanvas._base_temp_dir, 'quizzes', 'good', quiz_name, quizcomp.constants.QUIZ_FILENAME)
+        return quizcomp.quiz.Quiz.from_path(path)
+
+    def _upload(self, quiz_name, jobs = quizcomp.uploader.canvas.DEFAULT_JOBS, delay_secs = 0.0, rate_limited_count = 0):
+        canvas = self._make_canvas(delay_secs = delay_secs)
+        canvas.rate_limited_count = rate_limited_count
+
+        instance = self._make_instance(canvas, jobs = jobs)
+        quiz = self._load_quiz(quiz_name)
+
+        uploader = quizcomp.uploader.canvas.CanvasUploader(instance)
+        self.assertTrue(uploader.upload_quiz(quiz))
+
+        return quiz, canvas
+
+    def _check_quiz(self, quiz, canvas):
+        self.assertEqual([quiz.title], list(canvas.quizzes.values()))
+        self.assertEqual([group.name for group in quiz.groups], [group['name'] for group in canvas.groups])
+
+        # Questions can arrive in any order, but each one keeps its group and position.
+        for (group, canvas_group) in zip(quiz.groups, canvas.groups):
+            questions = [question for question in canvas.questions if (question['question[quiz_group_id]'] == canvas_group['id'])]
+            questions.sort(key = lambda question: int(question['question[position]']))
+
+            self.assertEqual(list(range(len(group.questions))), [int(question['question[position]']) for question in questions])
+            self.assertEqual([quizcomp.uploader.canvas.QUESTION_TYPE_MAP[question.question_type] for question in group.questions],
+                    [question['question[question_type]'] for question in questions])
+
+    def test_upload_parallel(self):
+        quiz, canvas = self._upload('all-basic-questions', jobs = 4, delay_secs = 0.02)
+        self._check_quiz(quiz, canvas)
+
+        self.assertGreater(canvas.max_in_flight, 1)
+        self.assertLessEqual(canvas.max_in_flight, 4)
+
+        # Connections are reused.
+        self.assertLessEqual(len(canvas.client_ports), 4)
+        self.assertLess(len(canvas.client_ports), len(canvas.requests))
+
+    def test_upload_serial(self):
+        quiz, canvas = self._upload('all-basic-questions', jobs = 1)
+        self._check_quiz(quiz, canvas)
+
+        self.assertEqual(1, canvas.max_in_flight)
+        self.assertEqual(1, len(canvas.client_ports))
+
+        # The same questions are uploaded regardless of the number of jobs.
+        _, parallel_canvas = self._upload('all-basic-questions', jobs = 4)
+        key = lambda question: (int(question['question[quiz_group_id]']), int(question['question[position]']))
+        self.assertEqual(sorted(canvas.questions, key = key), sorted(parallel_canvas.questions, key = key))
+
+    def test_upload_files(self):
+        quiz, canvas = self._upload('image-questions')
+        self._check_quiz(quiz, canvas)
+
+        self.assertEqual(1, len(canvas.files))
+        self.assertEqual(1, canvas.count('POST', "/api/v1/courses/%s/folders" % (TEST_COURSE)))
+
+        # Files are named by their contents.
+        file_id, file = list(canvas.files.items())[0]
+        self.assertEqual(quizcomp.util.hash.sha256_file(os.path.join(tests.base.DATA_DIR, 'tiny.png')) + '.png', file['name'])
+        self.assertIn("/files/%s/preview" % (file_id), canvas.questions[0]['question[question_text]'])
+
+    def test_upload_files_retry(self):
+        canvas = self._make_canvas()
+        canvas.upload_rate_limited_count = 1
+
+        quiz = self._load_quiz('image-questions')
+        self.assertTrue(quizcomp.uploader.canvas.CanvasUploader(self._make_instance(canvas)).upload_quiz(quiz))
+
+        # The retried upload sends the whole file again.
+        self.assertEqual(2, canvas.count('POST', '/upload/'))
+
+        file_id = list(canvas.files.keys())[0]
+        with open(os.path.join(tests.base.DATA_DIR, 'tiny.png'), 'rb') as file:
+            self.assertIn(file.read(), canvas.upload_bodies[file_id])
+
+    def test_upload_files_existing(self):
+        quiz, canvas = self._upload('image-questions')
+        file_id = list(canvas.files.keys())[0]
+
+        # Existing files are not uploaded again (even when forcing a new quiz).
+        instance = self._make_instance(canvas)
+        quizcomp.uploader.canvas.CanvasUploader(instance, force = True).upload_quiz(quiz)
+
+        self.assertEqual(1, canvas.count('POST', "/api/v1/courses/%s/files" % (TEST_COURSE)))
+        self.assertIn("/files/%s/preview" % (file_id), canvas.questions[-1]['question[question_text]'])
+
+        # Files that never finished uploading are uploaded again.
+        canvas.files[file_id]['uploaded'] = False
+
+        instance = self._make_instance(canvas)
+        quizcomp.uploader.canvas.CanvasUploader(instance, force = True).upload_quiz(quiz)
+
+        self.assertEqual(2, canvas.count('POST', "/api/v1/courses/%s/files" % (TEST_COURSE)))
+
+    def test_upload_files_duplicate_contents(self):
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-canvas-')
+
+        question_info = {
+            'question_type': 'essay',
+        }
+
+        for name in ['a', 'b']:
+            question_dir = os.path.join(temp_dir, 'questions', name)
+            os.makedirs(question_dir)
+
+            shutil.copy(os.path.join(tests.base.DATA_DIR, 'tiny.png'), os.path.join(question_dir, "%s.png" % (name)))
+            quizcomp.util.dirent.write_file(os.path.join(question_dir, quizcomp.constants.PROMPT_FILENAME), "![%s](%s.png)" % (name, name))
+            quizcomp.util.json.dump_path(question_info, os.path.join(question_dir, quizcomp.constants.QUESTION_FILENAME))
+
+        quiz_info = {
+            'title': 'Duplicate Images',
+            'description': 'Duplicate Images',
+            'version': 'test',
+            'groups': [{'name': 'questions', 'pick_count': 2, 'questions': ['questions']}],
+        }
+
+        quiz_path = os.path.join(temp_dir, quizcomp.constants.QUIZ_FILENAME)
+        quizcomp.util.json.dump_path(quiz_info, quiz_path)
+        quiz = quizcomp.quiz.Quiz.from_path(quiz_path)
+
+        canvas = self._make_canvas()
+        instance = self._make_instance(canvas)
+        quizcomp.uploader.canvas.CanvasUploader(instance).upload_quiz(quiz)
+
+        # Both images are the same file in Canvas.
+        self.assertEqual(1, len(canvas.files))
+
+        file_id = list(canvas.files.keys())[0]
+        for question in canvas.questions:
+            self.assertIn("/files/%s/preview" % (file_id), question['question[question_text]'])
+
+    def test_rate_limit_retry(self):
+        quiz, canvas = self._upload('single-question', rate_limited_count = 2)
+        self._check_quiz(quiz, canvas)
+
+        self.assertEqual(2, len([request for request in canvas.requests if (request[2] == 403)]))
+
+    def test_listing_pagination(self):
+        canvas = self._make_canvas()
+        quiz = self._load_quiz('single-question')
+
+        # The matching quiz is on the last page.
+        for i in range(200):
+            canvas.quizzes[str(1000 + i)] = "Other Quiz %d" % (i)
+        canvas.quizzes['2000'] = quiz.title
+
+        instance = self._make_instance(canvas)
+        self.assertEqual(['2000'], quizcomp.uploader.canvas.get_matching_quiz_ids(quiz.title, instance))
+        self.assertEqual(3, canvas.count('GET', "/api/v1/courses/%s/quizzes" % (TEST_COURSE)))
+
+        self.assertFalse(quizcomp.uploader.canvas.CanvasUploader(instance).upload_quiz(quiz))
+
+    def test_listing_cache(self):
+        canvas = self._make_canvas()
+        instance = self._make_instance(canvas)
+        uploader = quizcomp.uploader.canvas.CanvasUploader(instance)
+
+        quizzes = [self._load_quiz(name) for name in ['all-basic-questions', 'image-questions', 'single-question']]
+        for quiz in quizzes:
+            self.assertTrue(uploader.upload_quiz(quiz))
+
+        self.assertEqual(sorted([quiz.title for quiz in quizzes]), sorted(canvas.quizzes.values()))
+
+        # Each listing is fetched once for all the uploads
+        # (except folders, which are fetched again after creating a folder).
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/quizzes" % (TEST_COURSE)))
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/assignment_groups" % (TEST_COURSE)))
+        self.assertEqual(2, canvas.count('GET', "/api/v1/courses/%s/folders" % (TEST_COURSE)))
+
+        # Created quizzes are in the cached listing.
+        self.assertFalse(uploader.upload_quiz(quizzes[0]))
+
+        # Deleted quizzes are removed from the cached listing.
+        uploader.force = True
+        self.assertTrue(uploader.upload_quiz(quizzes[0]))
+        self.assertEqual(1, sorted(canvas.quizzes.values()).count(quizzes[0].title))
+        self.assertEqual(1, len(quizcomp.uploader.canvas.get_matching_quiz_ids(quizzes[0].title, instance)))
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/quizzes" % (TEST_COURSE)))
+
+    def test_listing_locks(self):
+        canvas = self._make_canvas(delay_secs = 0.01)
+        instance = self._make_instance(canvas)
+
+        fetch_all_pages = quizcomp.uploader.canvas.fetch_all_pages
+        other_listings = []
+        finished = []
+
+        def _fetch_all_pages(url, instance):
+            # Other listings can be fetched while a listing is being fetched.
+            if (url.endswith('/' + quizcomp.uploader.canvas.LISTING_QUIZZES)):
+                thread = threading.Thread(target = lambda: other_listings.append(
+                        quizcomp.uploader.canvas.get_listing(quizcomp.uploader.canvas.LISTING_ASSIGNMENT_GROUPS, instance)))
+                thread.start()
+                thread.join(timeout = 5.0)
+                finished.append(not thread.is_alive())
+
+            return fetch_all_pages(url, instance)
+
+        with unittest.mock.patch('quizcomp.uploader.canvas.fetch_all_pages', _fetch_all_pages):
+            threads = [threading.Thread(target = quizcomp.uploader.canvas.get_listing,
+                    args = (quizcomp.uploader.canvas.LISTING_QUIZZES, instance.copy_for_quiz())) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([True], finished)
+        self.assertEqual(1, len(other_listings))
+
+        # Concurrent callers share a single fetch.
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/quizzes" % (TEST_COURSE)))
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/assignment_groups" % (TEST_COURSE)))
+
+    def test_upload_quizzes(self):
+        canvas = self._make_canvas(delay_secs = 0.01)
+        instance = self._make_instance(canvas, jobs = 4)
+        uploader = quizcomp.uploader.canvas.CanvasUploader(instance)
+
+        quizzes = [self._load_quiz(name) for name in ['all-basic-questions', 'image-questions', 'single-question']]
+        results = uploader.upload_quizzes(quizzes, jobs = 3)
+
+        self.assertEqual([quiz.title for quiz in quizzes], [result['title'] for result in results])
+        self.assertEqual([True] * 3, [result['uploaded'] for result in results])
+        self.assertEqual([None] * 3, [result['error'] for result in results])
+        self.assertEqual(sorted([quiz.title for quiz in quizzes]), sorted(canvas.quizzes.values()))
+
+        # All the quizzes share the listings and the limit on requests in flight.
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/quizzes" % (TEST_COURSE)))
+        self.assertEqual(1, canvas.count('GET', "/api/v1/courses/%s/assignment_groups" % (TEST_COURSE)))
+        self.assertLessEqual(canvas.max_in_flight, 4)
+        self.assertLessEqual(len(canvas.client_ports), 4)
+
+        # Existing quizzes are skipped.
+        results = uploader.upload_quizzes(quizzes, jobs = 3)
+        self.assertEqual([False] * 3, [result['uploaded'] for result in results])
+        self.assertEqual(3, len(canvas.quizzes))
+
+    def test_upload_quizzes_failure(self):
+        canvas = self._make_canvas()
+        instance = self._make_instance(canvas)
+        uploader = quizcomp.uploader.canvas.CanvasUploader(instance)
+
+        quizzes = [self._load_quiz(name) for name in ['all-basic-questions', 'image-questions', 'single-question']]
+        canvas.failing_titles.add(quizzes[1].title)
+
+        with self.assertLogs(level = 'ERROR'):
+            results = uploader.upload_quizzes(quizzes, jobs = 2)
+
+        self.assertEqual([True, False, True], [result['uploaded'] for result in results])
+        self.assertIsNone(results[0]['error'])
+        self.assertIsNotNone(results[1]['error'])
+        self.assertEqual(sorted([quizzes[0].title, quizzes[2].title]), sorted(canvas.quizzes.values()))
+
+    def test_cli_upload_project(self):
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-canvas-')
+        _copy_test_dirs(temp_dir)
+
+        canvas = self._make_canvas()
+
+        argv = ['upload.py', temp_dir,
+                '--course', TEST_COURSE, '--token', TEST_TOKEN, '--url', canvas.base_url,
+                '--quiz-jobs', '3', '--load-jobs', '2']
+
+        output = io.StringIO()
+        with unittest.mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(output):
+            # The bad quizzes fail to load (but the good ones are still uploaded).
+            self.assertEqual(1, quizcomp.cli.canvas.upload.main())
+
+        good_quizzes = [self._load_quiz(name) for name in os.listdir(tests.base.GOOD_QUIZZES_DIR)]
+        self.assertEqual(sorted([quiz.title for quiz in good_quizzes]), sorted(canvas.quizzes.values()))
+
+        lines = output.getvalue().strip().splitlines()
+        self.assertTrue(lines[0].startswith("Uploaded %d of %d quizzes" % (len(good_quizzes), len(lines) - 1)))
+        self.assertEqual(len(good_quizzes), len([line for line in lines if ('uploaded ' in line)]))
+        self.assertEqual(len(lines) - 1 - len(good_quizzes), len([line for line in lines if ('load-failed' in line)]))
+
+    def _write_sync_quiz(self, temp_dir, groups):
+        """
+        Write a quiz with essay questions: |groups| is {group name: {question name: prompt, ...}, ...}.
+        """
+
+        group_infos = []
+        for (group_name, prompts) in groups.items():
+            group_dir = os.path.join(temp_dir, group_name)
+            quizcomp.util.dirent.remove_dirent(group_dir)
+
+            for (name, prompt) in prompts.items():
+                question_dir = os.path.join(group_dir, name)
+                os.makedirs(question_dir)
+
+                quizcomp.util.dirent.write_file(os.path.join(question_dir, quizcomp.constants.PROMPT_FILENAME), prompt)
+                quizcomp.util.json.dump_path({'question_type': 'essay'}, os.path.join(question_dir, quizcomp.constants.QUESTION_FILENAME))
+
+            group_infos.append({'name': group_name, 'pick_count': 1, 'questions': [group_name]})
+
+        quiz_info = {
+            'title': 'Sync',
+            'description': 'Sync',
+            'version': 'test',
+            'groups': group_infos,
+        }
+
+        quiz_path = os.path.join(temp_dir, quizcomp.constants.QUIZ_FILENAME)
+        quizcomp.util.json.dump_path(quiz_info, quiz_path)
+
+        return quizcomp.quiz.Quiz.from_path(quiz_path)
+
+    def _sync(self, canvas, quiz):
+        """
+        Sync a quiz (with a new instance), and return the write requests that were made.
+        """
+
+        request_count = len(canvas.requests)
+
+        instance = self._make_instance(canvas)
+        self.assertTrue(quizcomp.uploader.canvas.CanvasUploader(instance, sync = True).upload_quiz(quiz))
+
+        return [(method, path) for (method, path, _) in canvas.requests[request_count:] if (method != 'GET')]
+
+    def _prompts(self, canvas):
+        questions = sorted(canvas.questions, key = lambda question: (int(question['question[quiz_group_id]']), int(question['question[position]'])))
+        return [re.sub(r'<[^>]+>', '', question['question[question_text]']).strip() for question in questions]
+
+    def test_sync_unchanged(self):
+        quiz, canvas = self._upload('all-basic-questions')
+        quiz_ids = list(canvas.quizzes.keys())
+        questions = list(canvas.questions)
+
+        self.assertEqual([], self._sync(canvas, quiz))
+
+        self.assertEqual(quiz_ids, list(canvas.quizzes.keys()))
+        self.assertEqual(questions, canvas.questions)
+        self._check_quiz(quiz, canvas)
+
+    def test_sync_changes(self):
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-canvas-')
+
+        canvas = self._make_canvas()
+        quiz = self._write_sync_quiz(temp_dir, {'a': {'q1': 'One', 'q2': 'Two', 'q3': 'Three'}, 'b': {'q1': 'Four'}})
+        self.assertTrue(quizcomp.uploader.canvas.CanvasUploader(self._make_instance(canvas)).upload_quiz(quiz))
+        quiz_id = list(canvas.quizzes.keys())[0]
+
+        # Only the changed question is updated.
+        quiz = self._write_sync_quiz(temp_dir, {'a': {'q1': 'One', 'q2': 'New Two', 'q3': 'Three'}, 'b': {'q1': 'Four'}})
+        writes = self._sync(canvas, quiz)
+
+        self.assertEqual(1, len(writes))
+        self.assertEqual('PUT', writes[0][0])
+        self.assertTrue(writes[0][1].startswith("/api/v1/courses/%s/quizzes/%s/questions/" % (TEST_COURSE, quiz_id)))
+        self.assertEqual(['One', 'New Two', 'Three', 'Four'], self._prompts(canvas))
+
+        # Removed questions and groups are deleted.
+        quiz = self._write_sync_quiz(temp_dir, {'a': {'q1': 'One', 'q2': 'New Two'}})
+        writes = self._sync(canvas, quiz)
+
+        self.assertEqual(['DELETE', 'DELETE', 'DELETE'], [method for (method, _) in writes])
+        self.assertEqual(['a'], [group['name'] for group in canvas.groups])
+        self.assertEqual(['One', 'New Two'], self._prompts(canvas))
+
+        # Added questions and groups are created.
+        quiz = self._write_sync_quiz(temp_dir, {'a': {'q1': 'One', 'q2': 'New Two', 'q3': 'Three'}, 'c': {'q1': 'Five'}})
+        writes = self._sync(canvas, quiz)
+
+        self.assertEqual(['POST', 'POST', 'POST'], [method for (method, _) in writes])
+        self.assertEqual(['a', 'c'], [group['name'] for group in canvas.groups])
+        self.assertEqual(['One', 'New Two', 'Three', 'Five'], self._prompts(canvas))
+
+        self.assertEqual([quiz_id], list(canvas.quizzes.keys()))
+        self.assertEqual([], self._sync(canvas, quiz))
+
+    def test_sync_deleted_group(self):
+        temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-canvas-')
+
+        canvas = self._make_canvas()
+        quiz = self._write_sync_quiz(temp_dir, {'a': {'q1': 'One', 'q2': 'Two'}, 'b': {'q1': 'Three'}})
+        self.assertTrue(quizcomp.uploader.canvas.CanvasUploader(self._make_instance(canvas)).upload_quiz(quiz))
+
+        # Delete a group outside of the sync (Canvas moves its questions out of the group).
+        group_id = canvas.groups[0]['id']
+        canvas.groups.pop(0)
+        for question in canvas.question_ids.values():
+            if (question['form']['question[quiz_group_id]'] == group_id):
+                question['form']['question[quiz_group_id]'] = None
+
+        # The group is created again (even though its hash matches), and its questions are moved into it.
+        writes = self._sync(canvas, quiz)
+        self.assertEqual(['DELETE', 'POST', 'PUT', 'PUT'], sorted([method for (method, _) in writes]))
+
+        self.assertEqual(['b', 'a'], [group['name'] for group in canvas.groups])
+        group_ids = set([group['id'] for group in canvas.groups])
+        self.assertEqual(group_ids, set([question['question[quiz_group_id]'] for question in canvas.questions]))
+
+        self.assertEqual([], self._sync(canvas, quiz))
+
+    def test_sync_without_state(self):
+        quiz, canvas = self._upload('all-basic-questions')
+        question_count = len(canvas.questions)
+
+        os.remove(quizcomp.uploader.canvas.get_sync_state_path(quiz))
+
+        # Every question is updated (instead of recreating the quiz).
+        writes = self._sync(canvas, quiz)
+        self.assertEqual(question_count + len(quiz.groups) + 1, len(writes))
+        self.assertEqual(['PUT'], list(set([method for (method, _) in writes])))
+
+        self.assertEqual(1, len(canvas.quizzes))
+        self._check_quiz(quiz, canvas)
+
+        self.assertEqual([], self._sync(canvas, quiz))
+
+def _copy_test_dirs(temp_dir):
+    for dir in [tests.base.QUESTIONS_DIR, tests.base.QUIZZES_DIR, tests.base.DATA_DIR]:
+        shutil.copytree(dir, os.path.join(temp_dir, os.path.basename(dir)))
@@ -0,0 +1,147 @@
+import os
+
+import quizcomp.constants
+import quizcomp.util.dirent
+import quizcomp.util.json
+import quizcomp.watch
+import tests.base
+
+class TestWatch(tests.base.BaseTest):
+    def setUp(self):
+        self._temp_dir = quizcomp.util.dirent.get_temp_path(prefix = 'quizcomp-test-watch-')
+
+        for name in ['a', 'b']:
+            self._write(os.path.join('questions', name, quizcomp.constants.QUESTION_FILENAME),
+                    quizcomp.util.json.dumps({'question_type': 'essay'}))
+            self._write(os.path.join('questions', name, quizcomp.constants.PROMPT_FILENAME), "Prompt %s" % (name))
+
+        quiz = {
+            'title': 'Watch',
+            'version': 'test',
+            'groups': [
+                {
+                    'name': 'questions',
+                    'pick_count': 2,
+                    'questions': ['questions'],
+                },
+            ],
+        }
+
+        self._quiz_path = self._write(quizcomp.constants.QUIZ_FILENAME, quizcomp.util.json.dumps(quiz))
+        self._write('quiz.md', 'Description')
+
+        self._watcher = quizcomp.watch.QuizWatcher(self._quiz_path)
+
+    def _write(self, relpath, text):
+        path = os.path.join(self._temp_dir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        # Make sure the mtime changes, even on filesystems with a coarse resolution.
+        old_mtime_ns = 0
+        if (os.path.exists(path)):
+            old_mtime_ns = os.stat(path).st_mtime_ns
+
+        quizcomp.util.dirent.write_file(path, text)
+
+        mtime_ns = max(os.stat(path).st_mtime_ns, old_mtime_ns + 1000000000)
+        os.utime(path, ns = (mtime_ns, mtime_ns))
+
+        return path
+
+    def _prompts(self):
+        return [question.prompt.document.to_text().strip() for question in self._watcher.quiz.groups[0].questions]
+
+    def test_no_change(self):
+        self.assertFalse(self._watcher.poll())
+
+    def test_question_change(self):
+        quiz = self._watcher.quiz
+        old_questions = list(quiz.groups[0].questions)
+
+        self._write(os.path.join('questions', 'b', quizcomp.constants.PROMPT_FILENAME), 'New Prompt')
+        self.assertTrue(self._watcher.poll())
+
+        # Only the changed question is reloaded.
+        self.assertIs(quiz, self._watcher.quiz)
+        self.assertIs(old_questions[0], quiz.groups[0].questions[0])
+        self.assertIsNot(old_questions[1], quiz.groups[0].questions[1])
+        self.assertEqual(['Prompt a', 'New Prompt'], self._prompts())
+
+        self.assertFalse(self._watcher.poll())
+
+    def test_quiz_change(self):
+        quiz = self._watcher.quiz
+
+        self._write('quiz.md', 'New Description')
+        self.assertTrue(self._watcher.poll())
+
+        self.assertIsNot(quiz, self._watcher.quiz)
+        self.assertEqual('New Description', self._watcher.quiz.description.document.to_text().strip())
+
+    def test_new_question(self):
+        self._write(os.path.join('questions', 'c', quizcomp.constants.QUESTION_FILENAME),
+                quizcomp.util.json.dumps({'question_type': 'essay', 'prompt': 'Prompt c'}))
+        self.assertTrue(self._watcher.poll())
+
+        self.assertEqual(['Prompt a', 'Prompt b', 'Prompt c'], self._prompts())
+
+    def test_other_files(self):
+        quiz = self._watcher.quiz
+        question_dir = os.path.join('questions', 'b')
+
+        # Files that the quiz is not loaded from (e.g., editor swap files and backups) are ignored.
+        self._write(os.path.join(question_dir, '.prompt.md.swp'), 'Swap')
+        self._write(os.path.join(question_dir, 'prompt.md~'), 'Backup')
+        self._write(os.path.join('questions', 'notes.txt'), 'Notes')
+        self.assertFalse(self._watcher.poll())
+
+        # Changing a question (even with other files around) only reloads that question.
+        old_question = quiz.groups[0].questions[0]
+        self._write(os.path.join(question_dir, quizcomp.constants.PROMPT_FILENAME), 'New Prompt')
+        self.assertTrue(self._watcher.poll())
+
+        self.assertIs(quiz, self._watcher.quiz)
+        self.assertIs(old_question, quiz.groups[0].questions[0])
+        self.assertEqual(['Prompt a', 'New Prompt'], self._prompts())
+
+    def test_linked_question(self):
+        self._write(os.path.join('other', 'c', quizcomp.constants.QUESTION_FILENAME),
+                quizcomp.util.json.dumps({'question_type': 'essay', 'prompt': 'Prompt c'}))
+
+        try:
+            os.symlink(os.path.join(self._temp_dir, 'other', 'c'), os.path.join(self._temp_dir, 'questions', 'c'))
+        except (OSError, NotImplementedError):
+            self.skipTest("Symlinks are not supported.")
+
+        # Questions are found the same way that groups find them (which follows links).
+        self.assertTrue(self._watcher.poll())
+        self.assertEqual(['Prompt a', 'Prompt b', 'Prompt c'], self._prompts())
+        self.assertFalse(self._watcher.poll())
+
+    def test_removed_question(self):
+        quizcomp.util.dirent.remove_dirent(os.path.join(self._temp_dir, 'questions', 'b'))
+        self.assertTrue(self._watcher.poll())
+
+        self.assertEqual(['Prompt a'], self._prompts())
+
+    def test_bad_change(self):
+        quiz = self._watcher.quiz
+        path = os.path.join('questions', 'a', quizcomp.constants.QUESTION_FILENAME)
+
+        with self.assertLogs(level = 'ERROR'):
+            self._write(path, '{')
+            self.assertFalse(self._watcher.poll())
+
+        # The last good quiz is kept until the error is fixed.
+        self.assertIs(quiz, self._watcher.quiz)
+
+        self._write(path, quizcomp.util.json.dumps({'question_type': 'essay', 'prompt': 'Fixed'}))
+        self.assertTrue(self._watcher.poll())
+        self.assertEqual(['Fixed', 'Prompt b'], self._prompts())
+
+    def test_watch(self):
+        quizzes = []
+        watcher = quizcomp.watch.watch(self._quiz_path, quizzes.append, interval = 0, max_polls = 1)
+
+        self.assertEqual(1, len(quizzes))
+        self.assertEqual('Watch', watcher.quiz.title)